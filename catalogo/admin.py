@@ -1,15 +1,30 @@
 from django.contrib import admin
 
-from .models import Autor, Genero, Libro, InstanciaDeLibro, Lenguaje
+from .models import Autor, Genero, Libro, InstanciaDeLibro, Lenguaje, Reserva, ResumenDeAtrasos
 
 admin.site.register(Genero)
 admin.site.register(Lenguaje)
 
 
-class LibroEnLinea(admin.TabularInline):
+class OpcionesCompartidasEnLinea(admin.TabularInline):
+    """Inline que consulta las opciones de sus campos de seleccion una sola vez para todas las filas"""
+
+    def formfield_for_dbfield(self, db_field, request, **kwargs):
+        formfield = super().formfield_for_dbfield(db_field, request, **kwargs)
+
+        if db_field.is_relation and hasattr(formfield, 'queryset'):
+            formfield.choices = [opcion for opcion in formfield.choices]
+
+        return formfield
+
+
+class LibroEnLinea(OpcionesCompartidasEnLinea):
     model = Libro
     extra = 0
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related('genero')
+
 
 @admin.register(Autor)
 class AdminAutor(admin.ModelAdmin):
@@ -23,10 +38,13 @@ class AdminAutor(admin.ModelAdmin):
     inlines = [LibroEnLinea]
 
 
-class InstanciaDeLibroEnLinea(admin.TabularInline):
+class InstanciaDeLibroEnLinea(OpcionesCompartidasEnLinea):
     model = InstanciaDeLibro
     extra = 0
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('libro', 'prestatario')
+
 
 @admin.register(Libro)
 class AdminLibro(admin.ModelAdmin):
@@ -36,8 +54,12 @@ class AdminLibro(admin.ModelAdmin):
         'desplegar_genero',
         'lenguaje'
     )
+    list_select_related = ('autor', 'lenguaje')
     inlines = [InstanciaDeLibroEnLinea]
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related('genero')
+
 
 @admin.register(InstanciaDeLibro)
 class AdminInstanciaDeLibro(admin.ModelAdmin):
@@ -49,6 +71,7 @@ class AdminInstanciaDeLibro(admin.ModelAdmin):
         'id',
     )
     list_filter = ('estatus', 'fecha_de_devolucion')
+    list_select_related = ('libro', 'prestatario')
 
     readonly_fields = ('id',)
     fieldsets = (
@@ -63,3 +86,17 @@ class AdminInstanciaDeLibro(admin.ModelAdmin):
             )
         }),
     )
+
+
+@admin.register(Reserva)
+class AdminReserva(admin.ModelAdmin):
+    list_display = ('libro', 'usuario', 'creada', 'asignada')
+    list_filter = ('asignada',)
+    list_select_related = ('libro', 'usuario')
+    raw_id_fields = ('libro', 'usuario', 'instancia')
+
+
+@admin.register(ResumenDeAtrasos)
+class AdminResumenDeAtrasos(admin.ModelAdmin):
+    list_display = ('prestatario', 'prestamos_atrasados', 'dias_de_atraso_maximo', 'fecha_mas_antigua', 'fecha_de_calculo')
+    list_select_related = ('prestatario',)
@@ -0,0 +1,172 @@
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.http import Http404, JsonResponse
+from django.urls import reverse
+from django.views.decorators.http import require_safe
+
+from catalogo.models import Libro, Autor, Genero, Lenguaje, InstanciaDeLibro
+from catalogo.replicas import en_replica
+from catalogo.versiones import condicional
+
+SAL_DEL_CURSOR = 'catalogo.api'
+LIMITE = 50
+LIMITE_MAXIMO = 500
+
+
+class Recurso:
+    """Describe un modelo expuesto en la API: nombre publico de cada campo -> campo para values()"""
+
+    def __init__(self, modelo, campos, dependencias=()):
+        self.modelo = modelo
+        self.campos = campos
+        # Modelos cuyo cambio modifica la respuesta (para ETag/Last-Modified)
+        self.modelos = (modelo,) + tuple(dependencias)
+
+    def leer_campos(self, valor):
+        if not valor:
+            return list(self.campos)
+
+        campos = [campo.strip() for campo in valor.split(',') if campo.strip()]
+        desconocidos = [campo for campo in campos if campo not in self.campos]
+        if desconocidos:
+            raise ValueError(f'Campos desconocidos: {", ".join(desconocidos)}')
+        return ['id'] + [campo for campo in campos if campo != 'id']
+
+    def filas(self, queryset, campos):
+        """Serializa con values(), sin crear instancias del modelo"""
+        columnas = {campo: self.campos[campo] for campo in campos if self.campos[campo]}
+        filas = list(queryset.values(*columnas.values()))
+        for fila in filas:
+            for campo, columna in columnas.items():
+                if campo != columna:
+                    fila[campo] = fila.pop(columna)
+        return filas
+
+
+class RecursoDeLibros(Recurso):
+    """Los generos de los libros de la pagina se consultan juntos solo si se piden"""
+
+    def filas(self, queryset, campos):
+        filas = super().filas(queryset, campos)
+        if 'generos' in campos:
+            generos = {}
+            relaciones = Libro.genero.through.objects.filter(
+                libro_id__in=[fila['id'] for fila in filas],
+            ).values_list('libro_id', 'genero_id')
+            for libro_id, genero_id in relaciones:
+                generos.setdefault(libro_id, []).append(genero_id)
+            for fila in filas:
+                fila['generos'] = generos.get(fila['id'], [])
+        return filas
+
+
+RECURSOS = {
+    'libros': RecursoDeLibros(Libro, {
+        'id': 'id',
+        'titulo': 'titulo',
+        'resumen': 'resumen',
+        'isbn': 'isbn',
+        'autor': 'autor_id',
+        'lenguaje': 'lenguaje_id',
+        'generos': None,
+        'num_copias': 'num_copias',
+        'num_disponibles': 'num_disponibles',
+    }, dependencias=(InstanciaDeLibro,)),
+    'autores': Recurso(Autor, {
+        'id': 'id',
+        'nombre': 'nombre',
+        'apellido': 'apellido',
+        'fecha_de_nacimiento': 'fecha_de_nacimiento',
+        'fecha_de_deceso': 'fecha_de_deceso',
+    }),
+    'generos': Recurso(Genero, {'id': 'id', 'nombre': 'nombre'}),
+    'lenguajes': Recurso(Lenguaje, {'id': 'id', 'nombre': 'nombre'}),
+    # Los prestatarios no se publican
+    'copias': Recurso(InstanciaDeLibro, {
+        'id': 'id',
+        'libro': 'libro_id',
+        'estatus': 'estatus',
+        'fecha_de_devolucion': 'fecha_de_devolucion',
+    }),
+}
+
+
+def _recurso(nombre):
+    if nombre not in RECURSOS:
+        raise Http404('Recurso desconocido')
+    return RECURSOS[nombre]
+
+
+def _error(mensaje):
+    return JsonResponse({'error': mensaje}, status=400)
+
+
+def _entero(valor, defecto, maximo):
+    try:
+        return min(max(int(valor), 1), maximo)
+    except (TypeError, ValueError):
+        return defecto
+
+
+@en_replica
+@require_safe
+def lista(request, recurso):
+    """View function con una pagina del recurso ordenada por id.
+
+    Parametros: 'campos' (separados por comas), 'limite' y 'cursor' (tomado de 'siguiente').
+    """
+    definicion = _recurso(recurso)
+    return condicional(*definicion.modelos)(_lista)(request, recurso, definicion)
+
+
+def _lista(request, recurso, definicion):
+    try:
+        campos = definicion.leer_campos(request.GET.get('campos'))
+    except ValueError as error:
+        return _error(str(error))
+
+    limite = _entero(request.GET.get('limite'), LIMITE, LIMITE_MAXIMO)
+    queryset = definicion.modelo.objects.order_by('pk')
+
+    cursor = request.GET.get('cursor')
+    if cursor:
+        try:
+            ultimo = definicion.modelo._meta.pk.to_python(signing.loads(cursor, salt=SAL_DEL_CURSOR))
+        except (signing.BadSignature, ValidationError):
+            return _error('Cursor inválido')
+        queryset = queryset.filter(pk__gt=ultimo)
+
+    # Se pide una fila de mas para saber si hay otra pagina sin hacer un COUNT
+    filas = definicion.filas(queryset[:limite + 1], campos)
+    siguiente = None
+    if len(filas) > limite:
+        filas = filas[:limite]
+        parametros = request.GET.copy()
+        parametros['cursor'] = signing.dumps(str(filas[-1]['id']), salt=SAL_DEL_CURSOR)
+        siguiente = request.build_absolute_uri(f'{reverse("api_lista", args=[recurso])}?{parametros.urlencode()}')
+
+    return JsonResponse({'resultados': filas, 'siguiente': siguiente})
+
+
+@en_replica
+@require_safe
+def detalle(request, recurso, pk):
+    """View function con un solo objeto del recurso; acepta 'campos' igual que la lista"""
+    definicion = _recurso(recurso)
+    return condicional(*definicion.modelos)(_detalle)(request, definicion, pk)
+
+
+def _detalle(request, definicion, pk):
+    try:
+        campos = definicion.leer_campos(request.GET.get('campos'))
+        pk = definicion.modelo._meta.pk.to_python(pk)
+    except ValueError as error:
+        return _error(str(error))
+    except ValidationError:
+        raise Http404('Objeto inexistente')
+
+    filas = definicion.filas(definicion.modelo.objects.filter(pk=pk), campos)
+    if not filas:
+        raise Http404('Objeto inexistente')
+
+    return JsonResponse(filas[0])
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class CatalogoConfig(AppConfig):
     name = 'catalogo'
+
+    def ready(self):
+        import catalogo.signals # Registra los receivers de las señales
@@ -0,0 +1,43 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+from catalogo.metricas import medir_consultas
+
+# El ORM es sincrono: las vistas asincronas lo ejecutan en un grupo de hilos de tamaño fijo,
+# de modo que las peticiones simultaneas esperan un hilo libre en lugar de abrir una conexion cada una
+ejecutor = ThreadPoolExecutor(
+    max_workers=settings.HILOS_DE_VISTAS_ASINCRONAS,
+    thread_name_prefix='vistas-asincronas',
+)
+
+
+def _en_hilo(vista):
+    def ejecutar(request, *args, **kwargs):
+        # Los hilos del grupo no reciben request_started/request_finished: se hace lo mismo aqui
+        close_old_connections()
+        try:
+            with medir_consultas():
+                response = vista(request, *args, **kwargs)
+                # Los templates evaluan consultas perezosas: se renderizan en el mismo hilo
+                if hasattr(response, 'render') and callable(response.render):
+                    response.render()
+            return response
+        finally:
+            close_old_connections()
+
+    return ejecutar
+
+
+def asincrona(vista):
+    """Convierte una vista sincrona en una corrutina que la ejecuta en el grupo de hilos"""
+    ejecutar = sync_to_async(_en_hilo(vista), thread_sensitive=False, executor=ejecutor)
+
+    @wraps(vista)
+    async def envoltura(request, *args, **kwargs):
+        return await ejecutar(request, *args, **kwargs)
+
+    return envoltura
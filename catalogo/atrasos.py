@@ -0,0 +1,46 @@
+from datetime import date
+from itertools import islice
+
+from django.db import transaction, DEFAULT_DB_ALIAS
+from django.db.models import Count, Min
+
+from catalogo.models import InstanciaDeLibro, ResumenDeAtrasos
+
+TAMANO_DE_LOTE = 1000
+
+
+def resumenes_de_atrasos(fecha, using=DEFAULT_DB_ALIAS):
+    """Agrupa los prestamos atrasados por usuario con una sola consulta"""
+    filas = InstanciaDeLibro.objects.using(using).atrasados(fecha).filter(
+        prestatario__isnull=False,
+    ).order_by().values('prestatario_id').annotate(
+        prestamos_atrasados=Count('pk'),
+        fecha_mas_antigua=Min('fecha_de_devolucion'),
+    ).iterator()
+
+    for fila in filas:
+        yield ResumenDeAtrasos(
+            prestatario_id=fila['prestatario_id'],
+            prestamos_atrasados=fila['prestamos_atrasados'],
+            dias_de_atraso_maximo=(fecha - fila['fecha_mas_antigua']).days,
+            fecha_mas_antigua=fila['fecha_mas_antigua'],
+            fecha_de_calculo=fecha,
+        )
+
+
+def calcular_resumenes(fecha=None, tamano_de_lote=TAMANO_DE_LOTE, using=DEFAULT_DB_ALIAS):
+    """Reemplaza los resumenes de atrasos en una transaccion; devuelve cuantos usuarios tienen atrasos"""
+    fecha = fecha or date.today()
+    resumenes = resumenes_de_atrasos(fecha, using=using)
+    total = 0
+
+    with transaction.atomic(using=using):
+        ResumenDeAtrasos.objects.using(using).all().delete()
+        while True:
+            lote = list(islice(resumenes, tamano_de_lote))
+            if not lote:
+                break
+            ResumenDeAtrasos.objects.using(using).bulk_create(lote)
+            total += len(lote)
+
+    return total
@@ -0,0 +1,227 @@
+import unicodedata
+from functools import lru_cache
+
+from django import forms
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.db.models import Q
+from django.urls import reverse
+
+from catalogo.models import Libro, Autor, Lenguaje
+from catalogo.versiones import version_de
+
+LIMITE_DE_SUGERENCIAS = 10
+TAMANO_DEL_LRU = 2048
+LARGO_DE_CLAVE = 100
+
+# Modelo, campos buscados y formato del texto mostrado (igual a str() del objeto)
+FUENTES = {
+    'libros': (Libro, ('titulo',), '{titulo}'),
+    'autores': (Autor, ('apellido', 'nombre'), '{apellido}, {nombre}'),
+    'lenguajes': (Lenguaje, ('nombre',), '{nombre}'),
+    'usuarios': (User, ('username',), '{username}'),
+}
+
+
+def normalizar(texto):
+    """Pasa el texto a minusculas y sin acentos"""
+    descompuesto = unicodedata.normalize('NFKD', texto.lower())
+    return ''.join(caracter for caracter in descompuesto if not unicodedata.combining(caracter)).strip()
+
+
+def claves(texto):
+    """Una clave por cada palabra del texto hasta el final, para sugerir desde cualquier palabra"""
+    palabras = normalizar(texto).split()
+    return {' '.join(palabras[inicio:])[:LARGO_DE_CLAVE] for inicio in range(len(palabras))}
+
+
+def textos(tipo, filas):
+    """Convierte filas (pk, *campos) en {pk: texto mostrado}"""
+    modelo, campos, formato = FUENTES[tipo]
+    return {fila[0]: formato.format(**dict(zip(campos, fila[1:]))) for fila in filas}
+
+
+class PrefijosSQLite:
+    """Tabla de claves ordenada (WITHOUT ROWID): cada prefijo es un rango contiguo de la clave primaria"""
+    tabla = 'catalogo_prefijos'
+
+    def crear_indice(self, cursor):
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS {self.tabla} ('
+            'tipo TEXT NOT NULL, clave TEXT NOT NULL, objeto_id INTEGER NOT NULL, texto TEXT NOT NULL, '
+            'PRIMARY KEY (tipo, clave, objeto_id)) WITHOUT ROWID'
+        )
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS {self.tabla}_objeto ON {self.tabla} (tipo, objeto_id)')
+
+    def indexar(self, cursor, tipo, textos):
+        self.eliminar(cursor, tipo, textos.keys())
+        cursor.executemany(
+            f'INSERT INTO {self.tabla} (tipo, clave, objeto_id, texto) VALUES (%s, %s, %s, %s)',
+            [(tipo, clave, pk, texto) for pk, texto in textos.items() for clave in claves(texto)],
+        )
+
+    def eliminar(self, cursor, tipo, ids):
+        cursor.executemany(f'DELETE FROM {self.tabla} WHERE tipo = %s AND objeto_id = %s', [(tipo, pk) for pk in ids])
+
+    def vaciar(self, cursor, tipo):
+        cursor.execute(f'DELETE FROM {self.tabla} WHERE tipo = %s', [tipo])
+
+    def buscar(self, cursor, tipo, texto, limite):
+        prefijo = normalizar(texto)[:LARGO_DE_CLAVE]
+        # Un objeto tiene varias claves: se leen algunas filas de mas para completar el limite
+        cursor.execute(
+            f'SELECT objeto_id, texto FROM {self.tabla} WHERE tipo = %s AND clave >= %s AND clave < %s '
+            'ORDER BY clave LIMIT %s',
+            [tipo, prefijo, prefijo + '\U0010ffff', limite * 4],
+        )
+        return list(dict(cursor.fetchall()).items())[:limite]
+
+
+class PrefijosSimple:
+    """Busca directamente en las tablas del modelo, sin indice especial"""
+
+    def crear_indice(self, cursor):
+        pass
+
+    def indexar(self, cursor, tipo, textos):
+        pass
+
+    def eliminar(self, cursor, tipo, ids):
+        pass
+
+    def vaciar(self, cursor, tipo):
+        pass
+
+    def buscar(self, cursor, tipo, texto, limite):
+        modelo, campos, formato = FUENTES[tipo]
+        filtro = Q()
+        for campo in campos:
+            filtro |= Q(**{f'{campo}__istartswith': texto}) | Q(**{f'{campo}__icontains': f' {texto}'})
+
+        filas = modelo.objects.using(cursor.db.alias).filter(filtro).order_by(*campos).values_list('pk', *campos)
+        return list(textos(tipo, filas[:limite]).items())
+
+
+class PrefijosPostgres(PrefijosSimple):
+    """Las mismas consultas, servidas por indices GIN de trigramas sobre UPPER(campo)"""
+
+    def crear_indice(self, cursor):
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for modelo, campos, formato in FUENTES.values():
+            tabla = modelo._meta.db_table
+            for campo in campos:
+                cursor.execute(
+                    f'CREATE INDEX IF NOT EXISTS {tabla}_{campo}_trgm '
+                    f'ON {tabla} USING gin ((UPPER({campo}::text)) gin_trgm_ops)'
+                )
+
+
+MOTORES = {
+    'sqlite': PrefijosSQLite,
+    'postgresql': PrefijosPostgres,
+}
+
+
+def motor(using=DEFAULT_DB_ALIAS):
+    return MOTORES.get(connections[using].vendor, PrefijosSimple)()
+
+
+def crear_indice(using=DEFAULT_DB_ALIAS):
+    with connections[using].cursor() as cursor:
+        motor(using).crear_indice(cursor)
+
+
+def indexar(tipo, ids, using=DEFAULT_DB_ALIAS):
+    """Actualiza las claves de los objetos indicados; los que ya no existen se eliminan"""
+    ids = set(ids)
+    if not ids:
+        return
+
+    modelo, campos, formato = FUENTES[tipo]
+    encontrados = textos(tipo, modelo.objects.using(using).filter(pk__in=ids).values_list('pk', *campos))
+
+    with connections[using].cursor() as cursor:
+        motor(using).eliminar(cursor, tipo, ids - encontrados.keys())
+        if encontrados:
+            motor(using).indexar(cursor, tipo, encontrados)
+
+
+def indexar_textos(tipo, textos, using=DEFAULT_DB_ALIAS):
+    """Agrega claves de objetos recien creados ({pk: texto}) sin volver a leerlos"""
+    with connections[using].cursor() as cursor:
+        motor(using).indexar(cursor, tipo, textos)
+
+
+def eliminar(tipo, ids, using=DEFAULT_DB_ALIAS):
+    with connections[using].cursor() as cursor:
+        motor(using).eliminar(cursor, tipo, list(ids))
+
+
+def reconstruir(tamano_de_lote=1000, using=DEFAULT_DB_ALIAS):
+    """Vuelve a generar las claves de todas las fuentes por lotes ordenados por id"""
+    total = 0
+    with connections[using].cursor() as cursor:
+        motor(using).crear_indice(cursor)
+
+    for tipo, (modelo, campos, formato) in FUENTES.items():
+        with connections[using].cursor() as cursor:
+            motor(using).vaciar(cursor, tipo)
+
+        ultimo_id = 0
+        while True:
+            filas = list(
+                modelo.objects.using(using).filter(pk__gt=ultimo_id).order_by('pk')
+                .values_list('pk', *campos)[:tamano_de_lote]
+            )
+            if not filas:
+                break
+            indexar_textos(tipo, textos(tipo, filas), using=using)
+            total += len(filas)
+            ultimo_id = filas[-1][0]
+
+    return total
+
+
+@lru_cache(maxsize=TAMANO_DEL_LRU)
+def _sugerencias(tipo, texto, limite, using, version):
+    # 'version' forma parte de la clave: al cambiar el modelo las entradas anteriores dejan de usarse
+    with connections[using].cursor() as cursor:
+        return tuple(motor(using).buscar(cursor, tipo, texto, limite))
+
+
+def sugerencias(tipo, texto, limite=LIMITE_DE_SUGERENCIAS, using=DEFAULT_DB_ALIAS):
+    """Devuelve [(pk, texto)] de los objetos con alguna palabra que empieza con 'texto'"""
+    texto = ' '.join(texto.split())[:LARGO_DE_CLAVE]
+    if not texto:
+        return []
+
+    return list(_sugerencias(tipo, texto.lower(), limite, using, version_de(FUENTES[tipo][0])))
+
+
+class SeleccionPerezosa(forms.Select):
+    """Select que solo incluye la opcion elegida; las demas se piden al endpoint de autocompletado"""
+
+    class Media:
+        js = ('js/autocompletar.js',)
+
+    def __init__(self, tipo, attrs=None):
+        super().__init__(attrs)
+        self.tipo = tipo
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget']['attrs']['data-autocompletar'] = reverse('autocompletar', args=[self.tipo])
+        return context
+
+    def optgroups(self, name, value, attrs=None):
+        campo = getattr(self.choices, 'field', None)
+        if campo is not None:
+            try:
+                elegidos = list(campo.queryset.filter(pk__in=[valor for valor in value if valor]))
+            except (ValueError, ValidationError):
+                elegidos = []
+            opciones = [('', campo.empty_label)] if campo.empty_label is not None else []
+            self.choices = opciones + [(campo.prepare_value(objeto), campo.label_from_instance(objeto)) for objeto in elegidos]
+
+        return super().optgroups(name, value, attrs)
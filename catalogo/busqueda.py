@@ -0,0 +1,202 @@
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.db.models import Q
+
+from catalogo.models import Libro
+
+LIMITE_DE_RESULTADOS = 50
+
+
+def documento_del_libro(libro):
+    """Crea los textos indexados de un libro (requiere 'autor' y 'genero' precargados)"""
+    return {
+        'titulo': libro.titulo,
+        'resumen': libro.resumen,
+        'autor': f'{libro.autor.nombre} {libro.autor.apellido}' if libro.autor else '',
+        'genero': ' '.join(genero.nombre for genero in libro.genero.all()),
+    }
+
+
+class BusquedaSQLite:
+    """Indice de texto completo usando una tabla virtual FTS5 cuyo rowid es el id del libro"""
+    tabla = 'catalogo_libro_fts'
+    # Pesos de bm25 por columna: titulo, resumen, autor, genero
+    pesos = (10.0, 1.0, 5.0, 2.0)
+
+    def crear_indice(self, cursor):
+        cursor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {self.tabla} USING fts5('
+            "titulo, resumen, autor, genero, tokenize='unicode61 remove_diacritics 2')"
+        )
+
+    def indexar(self, cursor, documentos):
+        self.eliminar(cursor, documentos.keys())
+        cursor.executemany(
+            f'INSERT INTO {self.tabla} (rowid, titulo, resumen, autor, genero) VALUES (%s, %s, %s, %s, %s)',
+            [(pk, d['titulo'], d['resumen'], d['autor'], d['genero']) for pk, d in documentos.items()],
+        )
+
+    def eliminar(self, cursor, ids):
+        cursor.executemany(f'DELETE FROM {self.tabla} WHERE rowid = %s', [(pk,) for pk in ids])
+
+    def vaciar(self, cursor):
+        cursor.execute(f'DELETE FROM {self.tabla}')
+
+    def consulta(self, texto):
+        """Convierte el texto del usuario en una consulta FTS5 segura (cada palabra como prefijo)"""
+        palabras = ['"{}"*'.format(palabra.replace('"', '""')) for palabra in texto.split()]
+        return ' '.join(palabras)
+
+    def buscar(self, cursor, texto, limite):
+        rango = 'bm25({}, {})'.format(self.tabla, ', '.join(str(peso) for peso in self.pesos))
+        cursor.execute(
+            f'SELECT rowid, -{rango} FROM {self.tabla} WHERE {self.tabla} MATCH %s ORDER BY {rango} LIMIT %s',
+            [self.consulta(texto), limite],
+        )
+        return cursor.fetchall()
+
+
+class BusquedaPostgres:
+    """Indice de texto completo con una columna tsvector ponderada y un indice GIN"""
+    tabla = 'catalogo_libro_busqueda'
+    configuracion = 'spanish'
+
+    def crear_indice(self, cursor):
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS {self.tabla} ('
+            'libro_id integer PRIMARY KEY, documento tsvector NOT NULL)'
+        )
+        cursor.execute(
+            f'CREATE INDEX IF NOT EXISTS {self.tabla}_documento_gin ON {self.tabla} USING GIN (documento)'
+        )
+
+    def indexar(self, cursor, documentos):
+        vector = ' || '.join(
+            f"setweight(to_tsvector('{self.configuracion}', %s), '{peso}')" for peso in 'ABCD'
+        )
+        cursor.executemany(
+            f'INSERT INTO {self.tabla} (libro_id, documento) VALUES (%s, {vector}) '
+            'ON CONFLICT (libro_id) DO UPDATE SET documento = EXCLUDED.documento',
+            [(pk, d['titulo'], d['autor'], d['genero'], d['resumen']) for pk, d in documentos.items()],
+        )
+
+    def eliminar(self, cursor, ids):
+        cursor.execute(f'DELETE FROM {self.tabla} WHERE libro_id = ANY(%s)', [list(ids)])
+
+    def vaciar(self, cursor):
+        cursor.execute(f'TRUNCATE {self.tabla}')
+
+    def buscar(self, cursor, texto, limite):
+        cursor.execute(
+            f"SELECT libro_id, ts_rank(documento, consulta) AS rango "
+            f"FROM {self.tabla}, plainto_tsquery('{self.configuracion}', %s) consulta "
+            "WHERE documento @@ consulta ORDER BY rango DESC LIMIT %s",
+            [texto, limite],
+        )
+        return cursor.fetchall()
+
+
+class BusquedaSimple:
+    """Busqueda sin indice para los demas motores de base de datos"""
+
+    def crear_indice(self, cursor):
+        pass
+
+    def indexar(self, cursor, documentos):
+        pass
+
+    def eliminar(self, cursor, ids):
+        pass
+
+    def vaciar(self, cursor):
+        pass
+
+    def buscar(self, cursor, texto, limite):
+        filtro = Q()
+        for palabra in texto.split():
+            filtro &= (
+                Q(titulo__icontains=palabra) | Q(resumen__icontains=palabra)
+                | Q(autor__nombre__icontains=palabra) | Q(autor__apellido__icontains=palabra)
+                | Q(genero__nombre__icontains=palabra)
+            )
+        ids = Libro.objects.filter(filtro).values_list('pk', flat=True).distinct()[:limite]
+        return [(pk, 0) for pk in ids]
+
+
+MOTORES = {
+    'sqlite': BusquedaSQLite,
+    'postgresql': BusquedaPostgres,
+}
+
+
+def motor(using=DEFAULT_DB_ALIAS):
+    return MOTORES.get(connections[using].vendor, BusquedaSimple)()
+
+
+def crear_indice(using=DEFAULT_DB_ALIAS):
+    with connections[using].cursor() as cursor:
+        motor(using).crear_indice(cursor)
+
+
+def indexar_libros(ids, using=DEFAULT_DB_ALIAS):
+    """Actualiza el indice de los libros indicados; los que ya no existen se eliminan del indice"""
+    ids = set(ids)
+    if not ids:
+        return
+
+    libros = Libro.objects.using(using).filter(pk__in=ids).select_related('autor').prefetch_related('genero')
+    documentos = {libro.pk: documento_del_libro(libro) for libro in libros}
+
+    with connections[using].cursor() as cursor:
+        motor(using).eliminar(cursor, ids - documentos.keys())
+        if documentos:
+            motor(using).indexar(cursor, documentos)
+
+
+def indexar_documentos(documentos, using=DEFAULT_DB_ALIAS):
+    """Agrega al indice documentos ya armados ({id del libro: documento}) sin volver a leer los libros"""
+    with connections[using].cursor() as cursor:
+        motor(using).indexar(cursor, documentos)
+
+
+def eliminar_libros(ids, using=DEFAULT_DB_ALIAS):
+    with connections[using].cursor() as cursor:
+        motor(using).eliminar(cursor, list(ids))
+
+
+def reconstruir_indice(tamano_de_lote=1000, using=DEFAULT_DB_ALIAS):
+    """Reconstruye todo el indice por lotes ordenados por id"""
+    with connections[using].cursor() as cursor:
+        motor(using).crear_indice(cursor)
+        motor(using).vaciar(cursor)
+
+    total = 0
+    ultimo_id = 0
+    while True:
+        ids = list(
+            Libro.objects.using(using).filter(pk__gt=ultimo_id).order_by('pk')
+            .values_list('pk', flat=True)[:tamano_de_lote]
+        )
+        if not ids:
+            return total
+        indexar_libros(ids, using=using)
+        total += len(ids)
+        ultimo_id = ids[-1]
+
+
+def buscar_libros(texto, limite=LIMITE_DE_RESULTADOS, using=DEFAULT_DB_ALIAS):
+    """Devuelve los libros que coinciden con el texto, ordenados por relevancia"""
+    texto = texto.strip()
+    if not texto:
+        return []
+
+    with connections[using].cursor() as cursor:
+        resultados = motor(using).buscar(cursor, texto, limite)
+
+    libros = Libro.objects.using(using).select_related('autor').in_bulk([pk for pk, rango in resultados])
+    encontrados = []
+    for pk, rango in resultados:
+        if pk in libros:
+            libros[pk].rango = rango
+            encontrados.append(libros[pk])
+
+    return encontrados
@@ -0,0 +1,273 @@
+import uuid
+from datetime import date, timedelta
+
+from django.db import IntegrityError, transaction
+
+from catalogo.models import InstanciaDeLibro, Reserva, actualizar_disponibilidad, registrar_prestamos
+from catalogo.reservas import asignar_a_reserva, cambios_para_apartar, marcar_asignada, siguiente_reserva
+from catalogo.signals import prestamos_actualizados
+
+MAXIMO_POR_LOTE = 1000
+
+OK = 'ok'
+NO_ENCONTRADO = 'no encontrado'
+ID_INVALIDO = 'id inválido'
+ESTADO_INVALIDO = 'estado inválido'
+
+# Estatus desde los que se permite cada transicion de una copia
+TRANSICIONES = {
+    'prestar': ('d', 'r'),
+    'devolver': ('p',),
+    'renovar': ('p',),
+    'mantenimiento': ('d', 'm'),
+    'reservar': ('d',),
+    'liberar': ('r',),
+}
+
+
+class TransicionInvalida(Exception):
+    """La copia no esta en un estatus desde el que se permita la transicion"""
+
+
+class ConflictoDeEstado(TransicionInvalida):
+    """Otra transaccion modifico la copia despues de leerla; el cambio no se aplico"""
+
+
+def _leer_ids(ids):
+    """Separa los ids validos de los que no son UUID, conservando el orden recibido"""
+    validos = {}
+    invalidos = []
+
+    for valor in ids:
+        try:
+            validos[str(valor)] = uuid.UUID(str(valor))
+        except ValueError:
+            invalidos.append(str(valor))
+
+    return validos, invalidos
+
+
+def _procesar_lote(ids, permitida, actualizar, campos):
+    """Bloquea las copias, aplica 'actualizar' a las que cumplen 'permitida' y las guarda juntas.
+
+    Devuelve un diccionario con el resultado de cada id recibido.
+    """
+    validos, invalidos = _leer_ids(ids)
+    resultados = {valor: ID_INVALIDO for valor in invalidos}
+
+    with transaction.atomic():
+        copias = InstanciaDeLibro.objects.select_for_update().in_bulk(list(validos.values()))
+        actualizadas = []
+        cambios = []
+        transiciones = []
+
+        for valor, pk in validos.items():
+            copia = copias.get(pk)
+            if copia is None:
+                resultados[valor] = NO_ENCONTRADO
+            elif not permitida(copia):
+                resultados[valor] = ESTADO_INVALIDO
+            else:
+                anterior = (copia.libro_id, copia.estatus)
+                prestatario_anterior = copia.prestatario_id
+                actualizar(copia)
+                actualizadas.append(copia)
+                cambios.append((anterior, (copia.libro_id, copia.estatus)))
+                transiciones.append((copia, anterior[1], prestatario_anterior))
+                resultados[valor] = OK
+
+        if actualizadas:
+            InstanciaDeLibro.objects.bulk_update(actualizadas, campos)
+            actualizar_disponibilidad(cambios)
+            registrar_prestamos(transiciones)
+            prestamos_actualizados.send(sender=InstanciaDeLibro, instancias=actualizadas)
+
+    return resultados
+
+
+def prestar_lote(ids, prestatario, fecha_de_devolucion=None):
+    """Presta al usuario indicado las copias disponibles y las que estan apartadas para el"""
+    fecha_de_devolucion = fecha_de_devolucion or date.today() + timedelta(weeks=3)
+
+    def permitida(copia):
+        return copia.estatus == 'd' or (copia.estatus == 'r' and copia.prestatario_id == prestatario.pk)
+
+    def prestar(copia):
+        copia.estatus = 'p'
+        copia.prestatario = prestatario
+        copia.fecha_de_devolucion = fecha_de_devolucion
+
+    return _procesar_lote(ids, permitida, prestar, ['estatus', 'prestatario', 'fecha_de_devolucion'])
+
+
+def devolver_lote(ids):
+    """Recibe las copias prestadas y las envia a mantenimiento o a la primera reserva, igual que devolver_libro"""
+    fecha_de_devolucion = date.today() + timedelta(weeks=2)
+
+    def devolver(copia):
+        copia.estatus = 'm'
+        copia.prestatario = None
+        copia.fecha_de_devolucion = fecha_de_devolucion
+        asignar_a_reserva(copia)
+
+    return _procesar_lote(ids, lambda copia: copia.estatus == 'p', devolver, ['estatus', 'prestatario', 'fecha_de_devolucion'])
+
+
+def renovar_lote(ids, fecha_de_devolucion):
+    """Aplaza la fecha de devolucion de las copias prestadas"""
+
+    def renovar(copia):
+        copia.fecha_de_devolucion = fecha_de_devolucion
+
+    return _procesar_lote(ids, lambda copia: copia.estatus == 'p', renovar, ['fecha_de_devolucion'])
+
+
+def _transicion(copia, accion, cambios):
+    """Aplica 'cambios' a la copia con un UPDATE condicionado a su estado leido.
+
+    Solo se escriben las columnas de 'cambios', y solo si el estatus, el libro
+    y el prestatario siguen siendo los que tenia 'copia'; si otra transaccion
+    los cambio se lanza ConflictoDeEstado en lugar de sobrescribir su trabajo.
+    """
+    if copia.estatus not in TRANSICIONES[accion]:
+        raise TransicionInvalida(f'No se puede {accion} una copia con estatus "{copia.get_estatus_display()}"')
+
+    with transaction.atomic():
+        actualizadas = InstanciaDeLibro.objects.filter(
+            pk=copia.pk,
+            estatus=copia.estatus,
+            libro_id=copia.libro_id,
+            prestatario_id=copia.prestatario_id,
+        ).update(**cambios)
+
+        if not actualizadas:
+            raise ConflictoDeEstado('La copia fue modificada por otra persona; vuelve a cargarla e intenta de nuevo')
+
+        anterior = (copia.libro_id, copia.estatus)
+        prestatario_anterior = copia.prestatario_id
+        for campo, valor in cambios.items():
+            setattr(copia, campo, valor)
+
+        actualizar_disponibilidad([(anterior, (copia.libro_id, copia.estatus))])
+        registrar_prestamos([(copia, anterior[1], prestatario_anterior)])
+        prestamos_actualizados.send(sender=InstanciaDeLibro, instancias=[copia])
+
+    return copia
+
+
+def prestar(copia, prestatario, fecha_de_devolucion=None):
+    """Presta una copia disponible, o la apartada para 'prestatario'"""
+    if copia.estatus == 'r' and copia.prestatario_id != prestatario.pk:
+        raise TransicionInvalida('La copia está apartada para otro usuario')
+
+    return _transicion(copia, 'prestar', {
+        'estatus': 'p',
+        'prestatario_id': prestatario.pk,
+        'fecha_de_devolucion': fecha_de_devolucion or date.today() + timedelta(weeks=3),
+    })
+
+
+def devolver(copia):
+    """Recibe una copia prestada: queda apartada para la primera reserva o pasa a mantenimiento.
+
+    Devuelve la reserva asignada, si la hay.
+    """
+    with transaction.atomic():
+        reserva = siguiente_reserva(copia.libro_id) if copia.libro_id else None
+        if reserva is not None:
+            cambios = cambios_para_apartar(reserva)
+        else:
+            cambios = {'estatus': 'm', 'prestatario_id': None, 'fecha_de_devolucion': date.today() + timedelta(weeks=2)}
+
+        _transicion(copia, 'devolver', cambios)
+
+        if reserva is not None:
+            marcar_asignada(reserva, copia)
+
+    return reserva
+
+
+def renovar(copia, fecha_de_devolucion):
+    return _transicion(copia, 'renovar', {'fecha_de_devolucion': fecha_de_devolucion})
+
+
+def enviar_a_mantenimiento(copia, fecha_de_devolucion=None):
+    return _transicion(copia, 'mantenimiento', {
+        'estatus': 'm',
+        'prestatario_id': None,
+        'fecha_de_devolucion': fecha_de_devolucion or date.today() + timedelta(weeks=2),
+    })
+
+
+def apartar(copia, reserva):
+    """Aparta una copia disponible para la persona de la reserva"""
+    with transaction.atomic():
+        _transicion(copia, 'reservar', cambios_para_apartar(reserva))
+        marcar_asignada(reserva, copia)
+
+    return copia
+
+
+def liberar(copia):
+    """Retira una copia apartada que no se recogio a tiempo: pasa a la siguiente reserva o queda disponible.
+
+    Devuelve la reserva asignada, si la hay.
+    """
+    with transaction.atomic():
+        reserva = siguiente_reserva(copia.libro_id) if copia.libro_id else None
+        if reserva is not None:
+            cambios = cambios_para_apartar(reserva)
+        else:
+            cambios = {'estatus': 'd', 'prestatario_id': None, 'fecha_de_devolucion': None}
+
+        _transicion(copia, 'liberar', cambios)
+
+        if reserva is not None:
+            marcar_asignada(reserva, copia)
+
+    return reserva
+
+
+def liberar_apartadas_vencidas(hoy=None):
+    """Libera las copias apartadas cuyo plazo para retirarlas ya paso. Devuelve cuantas se liberaron"""
+    hoy = hoy or date.today()
+    liberadas = 0
+
+    for copia in list(InstanciaDeLibro.objects.filter(estatus='r', fecha_de_devolucion__lt=hoy)):
+        try:
+            liberar(copia)
+        except ConflictoDeEstado:
+            # La persona la retiro (u otro proceso la libero) mientras se recorria la lista
+            continue
+        liberadas += 1
+
+    return liberadas
+
+
+def reservar(libro, usuario):
+    """Agrega al usuario al final de la fila y aparta las copias disponibles para las primeras reservas"""
+    with transaction.atomic():
+        reserva = Reserva.objects.filter(libro=libro, usuario=usuario, asignada__isnull=True).first()
+        if reserva is not None:
+            return reserva
+
+        try:
+            with transaction.atomic():
+                reserva = Reserva.objects.create(libro=libro, usuario=usuario)
+        except IntegrityError:
+            # Otra peticion del mismo usuario creo la reserva despues de la comprobacion anterior
+            return Reserva.objects.get(libro=libro, usuario=usuario, asignada__isnull=True)
+
+        # Se atiende la fila en orden: si habia alguien esperando con copias disponibles, recibe la primera
+        while True:
+            siguiente = siguiente_reserva(libro.pk)
+            copia = InstanciaDeLibro.objects.select_for_update(skip_locked=True).filter(
+                libro=libro,
+                estatus='d',
+            ).first() if siguiente is not None else None
+            if copia is None:
+                break
+            apartar(copia, siguiente)
+
+    reserva.refresh_from_db()
+    return reserva
@@ -0,0 +1,55 @@
+from django.core.cache import cache
+from django.db.models import CharField, Count, IntegerField, Q, Value
+
+from catalogo.models import Libro, Autor, InstanciaDeLibro
+
+CLAVE_CONTADORES = 'catalogo:contadores'
+TIEMPO_DE_VIDA = 60 * 5 # Respaldo por si la invalidacion no llega a otros procesos
+PALABRA_BUSCADA = 'Harry'
+
+
+def _conteos(queryset, tabla, filtrado):
+    """Crea un queryset de una sola fila con el total de la tabla y un conteo condicional"""
+    return queryset.order_by().values(
+        tabla=Value(tabla, output_field=CharField()),
+    ).annotate(
+        total=Count('pk'),
+        filtrado=filtrado,
+    )
+
+
+def consulta_de_contadores(palabra=PALABRA_BUSCADA):
+    """Crea la consulta unica (UNION ALL de agregados) de los contadores de la pagina principal"""
+    libros = _conteos(Libro.objects.all(), 'libros', Count('pk', filter=Q(titulo__icontains=palabra)))
+    instancias = _conteos(InstanciaDeLibro.objects.all(), 'instancias', Count('pk', filter=Q(estatus__exact='d')))
+    autores = _conteos(Autor.objects.all(), 'autores', Value(0, output_field=IntegerField()))
+
+    return libros.union(instancias, autores, all=True)
+
+
+def calcular_contadores(palabra=PALABRA_BUSCADA):
+    """Calcula los contadores de la pagina principal"""
+    filas = {fila['tabla']: fila for fila in consulta_de_contadores(palabra)}
+
+    return {
+        'num_libros': filas['libros']['total'],
+        'num_instancias': filas['instancias']['total'],
+        'num_autores': filas['autores']['total'],
+        'num_instancias_disponibles': filas['instancias']['filtrado'],
+        'num_libros_con_la_palabra': filas['libros']['filtrado'],
+    }
+
+
+def obtener_contadores():
+    """Devuelve los contadores desde la cache, calculandolos solo si no estan guardados"""
+    contadores = cache.get(CLAVE_CONTADORES)
+
+    if contadores is None:
+        contadores = calcular_contadores()
+        cache.set(CLAVE_CONTADORES, contadores, TIEMPO_DE_VIDA)
+
+    return contadores
+
+
+def invalidar_contadores():
+    cache.delete(CLAVE_CONTADORES)
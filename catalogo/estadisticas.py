@@ -0,0 +1,142 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time, timedelta
+
+from django.db import connection, transaction
+from django.db.models import Count, Max, Min, OuterRef, Q, Subquery, Sum
+from django.utils import timezone
+
+from catalogo.models import CirculacionDiaria, Prestamo
+
+DIAS_POR_LOTE = 7
+HILOS = 4
+
+
+def _inicio_del_dia(dia):
+    return timezone.make_aware(datetime.combine(dia, time.min))
+
+
+def resumir_dia(dia):
+    """Calcula la circulacion de cada libro en un dia a partir del historial de prestamos"""
+    eventos = Prestamo.objects.filter(
+        fecha__gte=_inicio_del_dia(dia),
+        fecha__lt=_inicio_del_dia(dia + timedelta(days=1)),
+        libro__isnull=False,
+    ).order_by()
+    resumenes = {}
+
+    def resumen(libro_id):
+        if libro_id not in resumenes:
+            resumenes[libro_id] = CirculacionDiaria(dia=dia, libro_id=libro_id, tiempo_prestado=timedelta(0))
+        return resumenes[libro_id]
+
+    prestamos = eventos.filter(estatus='p').exclude(estatus_anterior='p').values('libro_id').annotate(total=Count('pk'))
+    for fila in prestamos:
+        resumen(fila['libro_id']).prestamos = fila['total']
+
+    # Cada devolucion se une con el prestamo que cierra usando el indice (instancia, fecha)
+    inicio_del_prestamo = Prestamo.objects.filter(
+        instancia=OuterRef('instancia'),
+        estatus='p',
+        fecha__lt=OuterRef('fecha'),
+    ).exclude(estatus_anterior='p').order_by('-fecha').values('fecha')[:1]
+    devoluciones = eventos.filter(estatus_anterior='p').exclude(estatus='p').annotate(
+        inicio=Subquery(inicio_del_prestamo),
+    ).values_list('libro_id', 'fecha', 'inicio')
+
+    for libro_id, fecha, inicio in devoluciones:
+        fila = resumen(libro_id)
+        fila.devoluciones += 1
+        if inicio is not None:
+            fila.tiempo_prestado += fecha - inicio
+            fila.devoluciones_con_duracion += 1
+
+    return list(resumenes.values())
+
+
+def _resumir_lote(dias):
+    return dias, [fila for dia in dias for fila in resumir_dia(dia)]
+
+
+def _resumir_lote_en_hilo(dias):
+    try:
+        return _resumir_lote(dias)
+    finally:
+        # Cada hilo abre su propia conexion; se cierra al terminar el lote
+        connection.close()
+
+
+def _guardar_lote(dias, filas):
+    with transaction.atomic():
+        CirculacionDiaria.objects.filter(dia__gte=dias[0], dia__lte=dias[-1]).delete()
+        CirculacionDiaria.objects.bulk_create(filas, batch_size=1000)
+
+
+def pendientes():
+    """Dias desde el ultimo resumido (o el primer evento) hasta ayer"""
+    ultimo = CirculacionDiaria.objects.aggregate(ultimo=Max('dia'))['ultimo']
+    if ultimo is not None:
+        desde = ultimo + timedelta(days=1)
+    else:
+        primero = Prestamo.objects.aggregate(primero=Min('fecha'))['primero']
+        if primero is None:
+            return None, None
+        desde = timezone.localtime(primero).date()
+
+    return desde, timezone.localdate() - timedelta(days=1)
+
+
+def calcular_circulacion(desde, hasta, dias_por_lote=DIAS_POR_LOTE, hilos=HILOS, al_terminar_lote=None):
+    """Recalcula los resumenes diarios entre 'desde' y 'hasta', incluidos.
+
+    Los lotes de dias se leen en paralelo y se guardan uno a la vez, cada uno en
+    su transaccion, por lo que volver a calcular un periodo no duplica filas.
+    """
+    dias = [desde + timedelta(days=numero) for numero in range((hasta - desde).days + 1)]
+    lotes = [dias[inicio:inicio + dias_por_lote] for inicio in range(0, len(dias), dias_por_lote)]
+    total = 0
+
+    ejecutor = ThreadPoolExecutor(max_workers=hilos) if hilos > 1 else None
+    if ejecutor:
+        resultados = ejecutor.map(_resumir_lote_en_hilo, lotes)
+    else:
+        resultados = map(_resumir_lote, lotes)
+
+    try:
+        for dias_del_lote, filas in resultados:
+            _guardar_lote(dias_del_lote, filas)
+            total += len(filas)
+            if al_terminar_lote:
+                al_terminar_lote(dias_del_lote, len(filas))
+    finally:
+        if ejecutor:
+            ejecutor.shutdown()
+
+    return total
+
+
+def reportes(desde, hasta, limite=10):
+    """Reportes de circulacion leidos solo de los resumenes diarios"""
+    resumenes = CirculacionDiaria.objects.filter(dia__gte=desde, dia__lte=hasta).order_by()
+
+    totales = resumenes.aggregate(
+        prestamos=Sum('prestamos'),
+        devoluciones=Sum('devoluciones_con_duracion'),
+        tiempo_prestado=Sum('tiempo_prestado'),
+    )
+    duracion_promedio = None
+    if totales['devoluciones']:
+        duracion_promedio = totales['tiempo_prestado'] / totales['devoluciones']
+
+    return {
+        'prestamos': totales['prestamos'] or 0,
+        'duracion_promedio': duracion_promedio,
+        'libros_mas_prestados': resumenes.values('libro_id', 'libro__titulo').annotate(
+            total=Sum('prestamos'),
+        ).filter(total__gt=0).order_by('-total', 'libro_id')[:limite],
+        'autores_mas_solicitados': resumenes.filter(libro__autor__isnull=False).values(
+            'libro__autor_id', 'libro__autor__nombre', 'libro__autor__apellido',
+        ).annotate(total=Sum('prestamos')).filter(total__gt=0).order_by('-total', 'libro__autor_id')[:limite],
+        'prestamos_por_genero': resumenes.filter(Q(prestamos__gt=0), libro__genero__isnull=False).values(
+            'dia__year', 'dia__month', 'libro__genero__nombre',
+        ).annotate(total=Sum('prestamos')).order_by('dia__year', 'dia__month', '-total'),
+    }
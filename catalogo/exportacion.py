@@ -0,0 +1,76 @@
+import csv
+import json
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from catalogo.models import Libro, InstanciaDeLibro
+
+TAMANO_DE_BLOQUE = 2000
+
+COLUMNAS_DE_PRESTAMOS = ('id', 'titulo', 'prestatario', 'fecha_de_devolucion', 'estatus')
+COLUMNAS_DE_LIBROS = ('id', 'titulo', 'autor_apellido', 'autor_nombre', 'isbn', 'lenguaje', 'generos', 'resumen')
+
+
+class Eco:
+    """Objeto con la interfaz de un archivo que devuelve lo escrito en lugar de guardarlo"""
+
+    def write(self, valor):
+        return valor
+
+
+def filas_de_prestamos(tamano_de_bloque=TAMANO_DE_BLOQUE):
+    return InstanciaDeLibro.objects.order_by().values_list(
+        'id', 'libro__titulo', 'prestatario__username', 'fecha_de_devolucion', 'estatus',
+    ).iterator(chunk_size=tamano_de_bloque)
+
+
+def filas_de_libros(tamano_de_bloque=TAMANO_DE_BLOQUE):
+    """Recorre los libros por bloques y agrega los generos de cada bloque con una sola consulta"""
+    filas = Libro.objects.order_by().values_list(
+        'id', 'titulo', 'autor__apellido', 'autor__nombre', 'isbn', 'lenguaje__nombre', 'resumen',
+    ).iterator(chunk_size=tamano_de_bloque)
+
+    while True:
+        bloque = list(islice(filas, tamano_de_bloque))
+        if not bloque:
+            return
+
+        generos = {}
+        relaciones = Libro.genero.through.objects.filter(
+            libro_id__in=[fila[0] for fila in bloque],
+        ).values_list('libro_id', 'genero__nombre')
+        for libro_id, nombre in relaciones:
+            generos.setdefault(libro_id, []).append(nombre)
+
+        for pk, titulo, apellido, nombre, isbn, lenguaje, resumen in bloque:
+            yield (pk, titulo, apellido, nombre, isbn, lenguaje, ', '.join(generos.get(pk, [])), resumen)
+
+
+def como_csv(columnas, filas):
+    escritor = csv.writer(Eco())
+    yield escritor.writerow(columnas)
+    for fila in filas:
+        yield escritor.writerow(fila)
+
+
+def como_json(columnas, filas):
+    """Genera un arreglo JSON elemento por elemento"""
+    codificador = DjangoJSONEncoder()
+    yield '['
+    separador = ''
+    for fila in filas:
+        yield separador + codificador.encode(dict(zip(columnas, fila)))
+        separador = ',\n'
+    yield ']'
+
+
+FORMATOS = {
+    'csv': (como_csv, 'text/csv'),
+    'json': (como_json, 'application/json'),
+}
+
+EXPORTACIONES = {
+    'prestamos': (COLUMNAS_DE_PRESTAMOS, filas_de_prestamos),
+    'libros': (COLUMNAS_DE_LIBROS, filas_de_libros),
+}
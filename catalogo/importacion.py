@@ -0,0 +1,235 @@
+import csv
+import json
+from itertools import islice
+
+from django.db import connections, transaction, DEFAULT_DB_ALIAS
+
+from catalogo import autocompletar, busqueda
+from catalogo.contadores import invalidar_contadores
+from catalogo.models import Libro, Autor, Lenguaje, Genero
+from catalogo.versiones import incrementar_version, incrementar_version_de_objetos
+
+TAMANO_DE_LOTE = 1000
+SEPARADOR_DE_GENEROS = ';'
+
+
+def _registro(titulo, resumen='', isbn='', autor='', lenguaje='', generos=()):
+    """Normaliza un registro de entrada; 'autor' tiene el formato 'Apellido, Nombre'"""
+    apellido, _, nombre = (autor or '').partition(',')
+    return {
+        'titulo': (titulo or '').strip()[:200],
+        'resumen': (resumen or '').strip()[:1000],
+        'isbn': (isbn or '').replace('-', '').strip()[:13],
+        'autor': (nombre.strip()[:100], apellido.strip()[:100]) if apellido.strip() else None,
+        'lenguaje': (lenguaje or '').strip()[:200] or None,
+        'generos': [genero.strip()[:200] for genero in generos if genero and genero.strip()],
+    }
+
+
+def leer_csv(archivo):
+    """Lee un CSV con encabezados titulo, resumen, isbn, autor, lenguaje y generos (separados por ';')"""
+    for fila in csv.DictReader(archivo):
+        yield _registro(
+            fila.get('titulo'),
+            fila.get('resumen'),
+            fila.get('isbn'),
+            fila.get('autor'),
+            fila.get('lenguaje'),
+            (fila.get('generos') or '').split(SEPARADOR_DE_GENEROS),
+        )
+
+
+def leer_jsonl(archivo):
+    """Lee un objeto JSON por linea con las mismas claves que el CSV ('generos' es una lista)"""
+    for linea in archivo:
+        if linea.strip():
+            datos = json.loads(linea)
+            yield _registro(
+                datos.get('titulo'),
+                datos.get('resumen'),
+                datos.get('isbn'),
+                datos.get('autor'),
+                datos.get('lenguaje'),
+                datos.get('generos') or [],
+            )
+
+
+def _subcampos(dato):
+    """Separa un campo MARC en sus subcampos: {'a': [...], 'b': [...]}"""
+    subcampos = {}
+    for parte in dato.split('\x1f')[1:]:
+        if parte:
+            subcampos.setdefault(parte[0], []).append(parte[1:].strip(' /:;,.'))
+    return subcampos
+
+
+def leer_marc(archivo, tamano_de_bloque=64 * 1024):
+    """Lee registros MARC 21 (formato ISO 2709) de un archivo binario sin cargarlo completo.
+
+    Se usan los campos 245$a (titulo), 100$a (autor), 520$a (resumen),
+    020$a (ISBN), 041$a (lenguaje) y 650$a (generos).
+    """
+    pendiente = b''
+    while True:
+        bloque = archivo.read(tamano_de_bloque)
+        if not bloque:
+            break
+        pendiente += bloque
+        *registros, pendiente = pendiente.split(b'\x1d')
+        for registro in registros:
+            if registro.strip():
+                yield _registro_marc(registro)
+
+
+def _registro_marc(registro):
+    base = int(registro[12:17])
+    directorio = registro[24:base - 1]
+    campos = {}
+
+    for inicio in range(0, len(directorio), 12):
+        etiqueta = directorio[inicio:inicio + 3].decode()
+        largo = int(directorio[inicio + 3:inicio + 7])
+        posicion = int(directorio[inicio + 7:inicio + 12])
+        dato = registro[base + posicion:base + posicion + largo].decode('utf-8', 'replace').rstrip('\x1e')
+        campos.setdefault(etiqueta, []).append(_subcampos(dato))
+
+    def primero(etiqueta):
+        for subcampos in campos.get(etiqueta, []):
+            if subcampos.get('a'):
+                return subcampos['a'][0]
+        return ''
+
+    generos = [subcampos['a'][0] for subcampos in campos.get('650', []) if subcampos.get('a')]
+
+    return _registro(primero('245'), primero('520'), primero('020'), primero('100'), primero('041'), generos)
+
+
+LECTORES = {
+    'csv': (leer_csv, 'r'),
+    'jsonl': (leer_jsonl, 'r'),
+    'marc': (leer_marc, 'rb'),
+}
+
+
+class Importador:
+    """Crea libros por lotes con bulk_create, resolviendo autores, lenguajes y generos en memoria"""
+
+    def __init__(self, using=DEFAULT_DB_ALIAS):
+        self.using = using
+        self.autores = {(nombre, apellido): pk for pk, nombre, apellido in
+                        Autor.objects.using(using).values_list('pk', 'nombre', 'apellido').iterator()}
+        self.lenguajes = dict((nombre, pk) for pk, nombre in
+                              Lenguaje.objects.using(using).values_list('pk', 'nombre').iterator())
+        self.generos = dict((nombre, pk) for pk, nombre in
+                            Genero.objects.using(using).values_list('pk', 'nombre').iterator())
+
+    def _resolver(self, mapa, modelo, nombres):
+        """Crea los nombres que faltan; devuelve {pk: nombre} de los creados"""
+        faltantes = {nombre for nombre in nombres if nombre not in mapa}
+        creados = {}
+        if faltantes:
+            modelo.objects.using(self.using).bulk_create([modelo(nombre=nombre) for nombre in faltantes])
+            creados = dict(modelo.objects.using(self.using).filter(nombre__in=faltantes).values_list('pk', 'nombre'))
+            mapa.update((nombre, pk) for pk, nombre in creados.items())
+        return creados
+
+    def _resolver_autores(self, autores):
+        faltantes = {autor for autor in autores if autor not in self.autores}
+        if faltantes:
+            Autor.objects.using(self.using).bulk_create(
+                [Autor(nombre=nombre, apellido=apellido) for nombre, apellido in faltantes]
+            )
+            creados = Autor.objects.using(self.using).filter(
+                apellido__in={apellido for nombre, apellido in faltantes},
+                nombre__in={nombre for nombre, apellido in faltantes},
+            ).values_list('pk', 'nombre', 'apellido')
+            nuevos = {}
+            for pk, nombre, apellido in creados:
+                if self.autores.setdefault((nombre, apellido), pk) == pk and (nombre, apellido) in faltantes:
+                    nuevos[pk] = f'{apellido}, {nombre}'
+            autocompletar.indexar_textos('autores', nuevos, using=self.using)
+
+    def _ids_creados(self, libros):
+        if connections[self.using].features.can_return_rows_from_bulk_insert:
+            return [libro.pk for libro in libros]
+
+        # Dentro de la transaccion nadie mas puede escribir: los ultimos ids son los de este lote
+        ids = Libro.objects.using(self.using).order_by('-pk').values_list('pk', flat=True)[:len(libros)]
+        return sorted(ids)
+
+    def importar_lote(self, registros):
+        """Crea los libros de un lote y sus generos en una transaccion; devuelve los ids creados"""
+        registros = [registro for registro in registros if registro['titulo']]
+        if not registros:
+            return []
+
+        with transaction.atomic(using=self.using):
+            self._resolver_autores(registro['autor'] for registro in registros if registro['autor'])
+            lenguajes = self._resolver(self.lenguajes, Lenguaje, (r['lenguaje'] for r in registros if r['lenguaje']))
+            autocompletar.indexar_textos('lenguajes', lenguajes, using=self.using)
+            self._resolver(self.generos, Genero, (genero for r in registros for genero in r['generos']))
+
+            libros = [
+                Libro(
+                    titulo=registro['titulo'],
+                    resumen=registro['resumen'],
+                    isbn=registro['isbn'],
+                    autor_id=self.autores.get(registro['autor']),
+                    lenguaje_id=self.lenguajes.get(registro['lenguaje']),
+                )
+                for registro in registros
+            ]
+            Libro.objects.using(self.using).bulk_create(libros)
+            ids = self._ids_creados(libros)
+
+            LibroGenero = Libro.genero.through
+            LibroGenero.objects.using(self.using).bulk_create([
+                LibroGenero(libro_id=libro_id, genero_id=genero_id)
+                for libro_id, registro in zip(ids, registros)
+                for genero_id in {self.generos[genero] for genero in registro['generos']}
+            ])
+
+            autocompletar.indexar_textos(
+                'libros', {libro_id: registro['titulo'] for libro_id, registro in zip(ids, registros)}, using=self.using,
+            )
+            busqueda.indexar_documentos({
+                libro_id: {
+                    'titulo': registro['titulo'],
+                    'resumen': registro['resumen'],
+                    'autor': ' '.join(registro['autor']) if registro['autor'] else '',
+                    'genero': ' '.join(registro['generos']),
+                }
+                for libro_id, registro in zip(ids, registros)
+            }, using=self.using)
+
+        # bulk_create no envia post_save: la bibliografia guardada de los autores existentes cambio
+        incrementar_version_de_objetos(Autor, {libro.autor_id for libro in libros})
+        return ids
+
+
+def importar(registros, tamano_de_lote=TAMANO_DE_LOTE, omitir=0, al_terminar_lote=None, using=DEFAULT_DB_ALIAS):
+    """Importa un iterable de registros por lotes.
+
+    'omitir' salta los registros ya importados para reanudar una importacion,
+    y 'al_terminar_lote(total)' se llama despues de confirmar cada lote.
+    """
+    importador = Importador(using=using)
+    registros = islice(registros, omitir, None)
+    total = omitir
+
+    while True:
+        lote = list(islice(registros, tamano_de_lote))
+        if not lote:
+            break
+
+        importador.importar_lote(lote)
+        total += len(lote)
+
+        if al_terminar_lote:
+            al_terminar_lote(total)
+
+    invalidar_contadores()
+    for modelo in (Libro, Autor, Lenguaje, Genero):
+        incrementar_version(modelo)
+
+    return total
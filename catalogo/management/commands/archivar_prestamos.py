@@ -0,0 +1,104 @@
+import csv
+import gzip
+import os
+import shutil
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from catalogo.exportacion import TAMANO_DE_BLOQUE, como_csv
+from catalogo.models import Prestamo
+
+COLUMNAS = ('id', 'fecha', 'instancia_id', 'libro_id', 'prestatario_id', 'estatus_anterior', 'estatus', 'fecha_de_devolucion')
+
+
+def inicio_de_mes(fecha, meses_atras=0):
+    mes = fecha.year * 12 + fecha.month - 1 - meses_atras
+    return timezone.make_aware(datetime(mes // 12, mes % 12 + 1, 1))
+
+
+def ultimo_id_archivado(ruta):
+    """Mayor id de evento guardado en el archivo (0 si el archivo no existe)"""
+    if not os.path.exists(ruta):
+        return 0
+
+    with gzip.open(ruta, 'rt', encoding='utf-8', newline='') as archivo:
+        filas = csv.reader(archivo)
+        next(filas, None)
+        return max((int(fila[0]) for fila in filas if fila), default=0)
+
+
+class Command(BaseCommand):
+    help = 'Mueve los eventos de prestamos de los meses antiguos a archivos CSV comprimidos, un archivo por mes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('directorio', help='Directorio donde se guardan los archivos')
+        parser.add_argument('--conservar', type=int, default=12, help='Meses completos que se conservan en la base de datos')
+        parser.add_argument('--database', default='default', help='Alias de la base de datos')
+
+    def handle(self, *args, **options):
+        if options['conservar'] < 0:
+            raise CommandError('--conservar no puede ser negativo')
+        os.makedirs(options['directorio'], exist_ok=True)
+
+        using = options['database']
+        eventos = Prestamo.objects.using(using)
+        limite = inicio_de_mes(timezone.localtime(), options['conservar'])
+        primero = eventos.filter(fecha__lt=limite).order_by('fecha').values_list('fecha', flat=True).first()
+        if primero is None:
+            self.stdout.write('No hay eventos para archivar')
+            return
+
+        inicio = inicio_de_mes(timezone.localtime(primero))
+        while inicio < limite:
+            fin = inicio_de_mes(inicio, -1)
+            archivados = self.archivar_mes(eventos.filter(fecha__gte=inicio, fecha__lt=fin), inicio, options['directorio'], using)
+            if archivados:
+                self.stdout.write(f'{inicio:%Y-%m}: {archivados} eventos archivados')
+            inicio = fin
+
+    def archivar_mes(self, eventos, inicio, directorio, using):
+        """Escribe los eventos del mes y los elimina en la misma transaccion en que se leyeron.
+
+        El archivo se arma en una copia temporal que reemplaza al original justo antes de confirmar el
+        DELETE; si el DELETE falla el archivo no cambia. Si falla la confirmacion, los eventos ya
+        escritos se reconocen por su id en la siguiente ejecucion y no se agregan de nuevo.
+        """
+        ruta = os.path.join(directorio, f'prestamos-{inicio:%Y-%m}.csv.gz')
+        temporal = f'{ruta}.tmp'
+
+        with transaction.atomic(using=using):
+            ultimo_id = eventos.order_by('-id').values_list('id', flat=True).first()
+            if ultimo_id is None:
+                return 0
+
+            filas = eventos.filter(id__gt=ultimo_id_archivado(ruta), id__lte=ultimo_id).order_by('id').values_list(
+                *COLUMNAS,
+            ).iterator(chunk_size=TAMANO_DE_BLOQUE)
+            lineas = como_csv(COLUMNAS, filas)
+            encabezado = next(lineas)
+            nuevo = not os.path.exists(ruta)
+            archivados = 0
+
+            try:
+                if not nuevo:
+                    shutil.copyfile(ruta, temporal)
+
+                # Un archivo gzip puede tener varios miembros: si ya existe se agrega otro sin encabezado
+                with gzip.open(temporal, 'at', encoding='utf-8', newline='') as archivo:
+                    if nuevo:
+                        archivo.write(encabezado)
+                    for linea in lineas:
+                        archivo.write(linea)
+                        archivados += 1
+
+                # Sin relaciones ni señales, Django lo resuelve con un solo DELETE
+                eventos.filter(id__lte=ultimo_id).delete()
+                os.replace(temporal, ruta)
+            finally:
+                if os.path.exists(temporal):
+                    os.remove(temporal)
+
+        return archivados
@@ -0,0 +1,26 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalogo.atrasos import TAMANO_DE_LOTE, calcular_resumenes
+
+
+class Command(BaseCommand):
+    help = 'Calcula el resumen de prestamos atrasados de cada usuario (pensado para ejecutarse cada noche)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fecha', help='Fecha de referencia en formato AAAA-MM-DD (por defecto hoy)')
+        parser.add_argument('--lote', type=int, default=TAMANO_DE_LOTE, help='Cantidad de resumenes por INSERT')
+        parser.add_argument('--database', default='default', help='Alias de la base de datos')
+
+    def handle(self, *args, **options):
+        fecha = None
+        if options['fecha']:
+            try:
+                fecha = date.fromisoformat(options['fecha'])
+            except ValueError:
+                raise CommandError(f'Fecha inválida: {options["fecha"]}')
+
+        total = calcular_resumenes(fecha, tamano_de_lote=options['lote'], using=options['database'])
+
+        self.stdout.write(self.style.SUCCESS(f'{total} usuarios con préstamos atrasados'))
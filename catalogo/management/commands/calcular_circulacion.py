@@ -0,0 +1,47 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalogo.estadisticas import DIAS_POR_LOTE, HILOS, calcular_circulacion, pendientes
+
+
+def leer_fecha(valor):
+    try:
+        return date.fromisoformat(valor)
+    except ValueError:
+        raise CommandError(f'Fecha inválida: {valor}')
+
+
+class Command(BaseCommand):
+    help = ('Resume la circulacion de cada dia en CirculacionDiaria. Sin fechas continua desde el ultimo dia '
+            'resumido hasta ayer (pensado para ejecutarse cada noche); con --desde y --hasta recalcula el periodo')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', type=leer_fecha, help='Primer dia en formato AAAA-MM-DD')
+        parser.add_argument('--hasta', type=leer_fecha, help='Ultimo dia en formato AAAA-MM-DD')
+        parser.add_argument('--dias-por-lote', type=int, default=DIAS_POR_LOTE, help='Dias que calcula cada hilo a la vez')
+        parser.add_argument('--hilos', type=int, default=HILOS, help='Lotes que se calculan en paralelo')
+
+    def handle(self, *args, **options):
+        desde, hasta = pendientes()
+        desde = options['desde'] or desde
+        hasta = options['hasta'] or hasta
+
+        if desde is None or hasta is None or desde > hasta:
+            self.stdout.write('No hay días pendientes')
+            return
+        if options['dias_por_lote'] < 1 or options['hilos'] < 1:
+            raise CommandError('--dias-por-lote y --hilos deben ser mayores que cero')
+
+        def al_terminar_lote(dias, filas):
+            self.stdout.write(f'{dias[0]} a {dias[-1]}: {filas} resúmenes')
+
+        total = calcular_circulacion(
+            desde,
+            hasta,
+            dias_por_lote=options['dias_por_lote'],
+            hilos=options['hilos'],
+            al_terminar_lote=al_terminar_lote,
+        )
+
+        self.stdout.write(self.style.SUCCESS(f'{total} resúmenes entre {desde} y {hasta}'))
@@ -0,0 +1,72 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from catalogo.rendimiento import ESCRITURAS_DE_PRESTAMOS, LECTURAS_DE_PRESTAMOS
+
+PERFILES = (
+    ('estandar', ''),
+    ('optimizado', 'True'),
+)
+
+
+class Command(BaseCommand):
+    help = ('Ejecuta medir_rendimiento sobre las vistas de prestamos con la configuracion estandar de SQLite y con '
+            'el perfil DJANGO_SQLITE_OPTIMIZADO, y compara lecturas y escrituras concurrentes de ambos')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--libros', type=int, default=20000, help='Libros a generar')
+        parser.add_argument('--usuarios', type=int, default=2000, help='Usuarios a generar')
+        parser.add_argument('--peticiones', type=int, default=50, help='Peticiones por hilo')
+        parser.add_argument('--lectores', type=int, default=6, help='Hilos de lectura')
+        parser.add_argument('--escritores', type=int, default=2, help='Hilos de escritura')
+
+    def handle(self, *args, **options):
+        if settings.DATABASES['default']['ENGINE'] not in ('django.db.backends.sqlite3', 'catalogo.sqlite'):
+            raise CommandError('El perfil solo se aplica a SQLite')
+
+        resultados = {}
+        with tempfile.TemporaryDirectory() as directorio:
+            for perfil, valor in PERFILES:
+                salida = os.path.join(directorio, f'{perfil}.json')
+                argumentos = [
+                    sys.executable, 'manage.py', 'medir_rendimiento', '--mezcla', '--salida', salida,
+                    '--libros', str(options['libros']), '--usuarios', str(options['usuarios']),
+                    '--peticiones', str(options['peticiones']), '--concurrencia', str(options['lectores']),
+                    '--lectores', str(options['lectores']), '--escritores', str(options['escritores']),
+                ]
+                for nombre in LECTURAS_DE_PRESTAMOS + ESCRITURAS_DE_PRESTAMOS:
+                    argumentos += ['--url', nombre]
+
+                self.stdout.write(f'Perfil {perfil}...')
+                # Cada perfil en su propio proceso: el backend y los pragmas se eligen al cargar settings
+                proceso = subprocess.run(
+                    argumentos, cwd=settings.BASE_DIR, env={**os.environ, 'DJANGO_SQLITE_OPTIMIZADO': valor},
+                    capture_output=True, text=True,
+                )
+                if proceso.returncode:
+                    raise CommandError(f'medir_rendimiento fallo con el perfil {perfil}:\n{proceso.stderr}')
+                with open(salida) as archivo:
+                    resultados[perfil] = json.load(archivo)
+
+        self.stdout.write(f'{"perfil":<12}{"grupo":<12}{"pet/s":>9}{"p50 ms":>9}{"p95 ms":>9}{"errores":>9}')
+        for perfil, _ in PERFILES:
+            for grupo, resultado in resultados[perfil]['mezcla'].items():
+                latencia = resultado['latencia_ms']
+                self.stdout.write(
+                    f'{perfil:<12}{grupo:<12}{resultado["peticiones_por_segundo"]:>9.1f}{latencia["p50"]:>9.1f}'
+                    f'{latencia["p95"]:>9.1f}{resultado["errores"]:>9}'
+                )
+
+        self.stdout.write(f'{"perfil":<12}{"url":<20}{"pet/s":>9}{"p50 ms":>9}{"errores":>9}')
+        for perfil, _ in PERFILES:
+            for nombre, resultado in resultados[perfil]['urls'].items():
+                self.stdout.write(
+                    f'{perfil:<12}{nombre:<20}{resultado["peticiones_por_segundo"]:>9.1f}'
+                    f'{resultado["latencia_ms"]["p50"]:>9.1f}{resultado["errores"]:>9}'
+                )
@@ -0,0 +1,99 @@
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError, URLError
+from urllib.request import urlopen
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from catalogo.rendimiento import percentil
+
+RUTAS = (
+    '/catalogo/',
+    '/catalogo/libros/',
+    '/catalogo/autores/',
+    '/catalogo/api/libros/',
+    '/catalogo/api/autores/',
+)
+
+SERVIDORES = (
+    ('wsgi', ['librerialocal.wsgi']),
+    ('asgi', ['librerialocal.asgi', '--worker-class', 'uvicorn.workers.UvicornWorker']),
+)
+
+
+def esperar_puerto(puerto, limite):
+    fin = time.monotonic() + limite
+    while time.monotonic() < fin:
+        try:
+            with socket.create_connection(('127.0.0.1', puerto), timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def pedir(url):
+    inicio = time.perf_counter()
+    try:
+        with urlopen(url, timeout=30) as response:
+            response.read()
+            correcta = response.status == 200
+    except (HTTPError, URLError, OSError):
+        correcta = False
+    return time.perf_counter() - inicio, correcta
+
+
+class Command(BaseCommand):
+    help = ('Levanta el sitio con gunicorn en modo WSGI y en modo ASGI (uvicorn) con los mismos procesos '
+            'y compara latencia y peticiones por segundo de las vistas de solo lectura bajo carga concurrente')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--peticiones', type=int, default=500, help='Peticiones por ruta y servidor')
+        parser.add_argument('--concurrencia', type=int, default=32, help='Peticiones simultaneas')
+        parser.add_argument('--workers', type=int, default=2, help='Procesos de gunicorn de cada servidor')
+        parser.add_argument('--puerto', type=int, default=8100, help='Puerto del primer servidor')
+        parser.add_argument('--ruta', action='append', dest='rutas', help='Ruta a medir (se puede repetir)')
+
+    def handle(self, *args, **options):
+        if options['peticiones'] < 1 or options['concurrencia'] < 1:
+            raise CommandError('--peticiones y --concurrencia deben ser mayores que cero')
+
+        rutas = options['rutas'] or RUTAS
+        self.stdout.write(f'{"servidor":<9}{"ruta":<28}{"pet/s":>9}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}{"errores":>9}')
+
+        for desplazamiento, (nombre, argumentos) in enumerate(SERVIDORES):
+            puerto = options['puerto'] + desplazamiento
+            proceso = subprocess.Popen(
+                [sys.executable, '-m', 'gunicorn', *argumentos,
+                 '--bind', f'127.0.0.1:{puerto}', '--workers', str(options['workers']), '--log-level', 'warning'],
+                cwd=settings.BASE_DIR,
+            )
+            try:
+                if not esperar_puerto(puerto, limite=30):
+                    raise CommandError(f'El servidor {nombre} no respondió en el puerto {puerto}')
+
+                for ruta in rutas:
+                    self._medir(nombre, f'http://127.0.0.1:{puerto}{ruta}', ruta, options)
+            finally:
+                proceso.terminate()
+                proceso.wait()
+
+    def _medir(self, nombre, url, ruta, options):
+        # Una ronda previa llena las caches y abre las conexiones de cada proceso
+        with ThreadPoolExecutor(max_workers=options['concurrencia']) as hilos:
+            list(hilos.map(pedir, [url] * options['concurrencia']))
+
+            inicio = time.perf_counter()
+            resultados = list(hilos.map(pedir, [url] * options['peticiones']))
+            duracion = time.perf_counter() - inicio
+
+        tiempos = sorted(tiempo * 1000 for tiempo, correcta in resultados if correcta)
+        errores = len(resultados) - len(tiempos)
+        self.stdout.write(
+            f'{nombre:<9}{ruta:<28}{len(tiempos) / duracion:>9.1f}{percentil(tiempos, 50):>9.1f}'
+            f'{percentil(tiempos, 95):>9.1f}{percentil(tiempos, 99):>9.1f}{errores:>9}'
+        )
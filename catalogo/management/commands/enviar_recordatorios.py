@@ -0,0 +1,37 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalogo.recordatorios import DIAS_DE_ANTICIPACION, HILOS, MENSAJES_POR_LOTE, enviar_recordatorios
+
+
+class Command(BaseCommand):
+    help = 'Envia a cada usuario un correo con sus prestamos atrasados y los que vencen pronto'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=DIAS_DE_ANTICIPACION, help='Dias de anticipacion del aviso')
+        parser.add_argument('--fecha', help='Fecha de referencia en formato AAAA-MM-DD (por defecto hoy)')
+        parser.add_argument('--lote', type=int, default=MENSAJES_POR_LOTE, help='Mensajes por envio')
+        parser.add_argument('--hilos', type=int, default=HILOS, help='Cantidad de conexiones simultaneas')
+
+    def handle(self, *args, **options):
+        fecha = None
+        if options['fecha']:
+            try:
+                fecha = date.fromisoformat(options['fecha'])
+            except ValueError:
+                raise CommandError(f'Fecha inválida: {options["fecha"]}')
+        if options['hilos'] < 1 or options['lote'] < 1:
+            raise CommandError('--hilos y --lote deben ser mayores que cero')
+
+        inicio = time.monotonic()
+        enviados = enviar_recordatorios(
+            fecha,
+            dias_de_anticipacion=options['dias'],
+            mensajes_por_lote=options['lote'],
+            hilos=options['hilos'],
+        )
+        segundos = time.monotonic() - inicio
+
+        self.stdout.write(self.style.SUCCESS(f'{enviados} recordatorios enviados en {segundos:.1f} s'))
@@ -0,0 +1,85 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import RequestFactory
+
+from catalogo import views
+from catalogo.contadores import consulta_de_contadores
+from catalogo.paginacion import PaginacionPorCursorMixin
+
+VISTAS_DE_LISTA = [
+    views.VistaDeListaDeLibros,
+    views.VistaDeListaDeAutores,
+    views.VistaDeListaDeLibrosPrestados,
+    views.VistaDePrestamosStaff,
+    views.VistaDePrestamosAtrasados,
+]
+
+VISTAS_DE_DETALLE = [
+    views.VistaDeDetallesDeLibros,
+    views.VistaDeDetallesDeAutores,
+]
+
+# Fragmentos del plan que indican el uso de un indice en cada motor
+INDICADORES_DE_INDICE = {
+    'sqlite': ('USING INDEX', 'USING COVERING INDEX', 'USING INTEGER PRIMARY KEY', 'USING PRIMARY KEY'),
+    'postgresql': ('Index Scan', 'Index Only Scan', 'Bitmap Index Scan'),
+    'mysql': ('key=',),
+}
+
+
+def crear_vista(clase, usuario):
+    vista = clase()
+    vista.request = RequestFactory().get('/')
+    vista.request.user = usuario
+    vista.args = ()
+    vista.kwargs = {'pk': 1}
+    return vista
+
+
+def consultas_de_las_vistas(usuario):
+    """Devuelve (nombre, queryset) con la consulta principal que ejecuta cada vista"""
+    yield 'index', consulta_de_contadores()
+
+    for clase in VISTAS_DE_LISTA:
+        vista = crear_vista(clase, usuario)
+        queryset = vista.get_queryset()
+        if isinstance(vista, PaginacionPorCursorMixin):
+            vista._campos_del_modelo = [queryset.model._meta.get_field(campo) for campo in vista.campos_del_cursor]
+            queryset = vista._ordenar(queryset, False)
+        yield clase.__name__, queryset[:vista.paginate_by + 1]
+
+    for clase in VISTAS_DE_DETALLE:
+        vista = crear_vista(clase, usuario)
+        yield clase.__name__, vista.get_queryset().filter(pk=1)
+
+
+class Command(BaseCommand):
+    help = 'Ejecuta EXPLAIN sobre la consulta de cada vista e indica si usa un indice'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Alias de la base de datos')
+        parser.add_argument('--plan', action='store_true', help='Muestra el plan completo de cada consulta')
+
+    def handle(self, *args, **options):
+        using = options['database']
+        indicadores = INDICADORES_DE_INDICE.get(connections[using].vendor, ())
+        # El plan no depende de que el usuario exista
+        usuario = User.objects.using(using).order_by('pk').first() or User(pk=1)
+        sin_indice = 0
+
+        for nombre, queryset in consultas_de_las_vistas(usuario):
+            plan = queryset.using(using).explain()
+            usa_indice = any(indicador in plan for indicador in indicadores)
+
+            if usa_indice:
+                self.stdout.write(f'{nombre}: ' + self.style.SUCCESS('usa índice'))
+            else:
+                sin_indice += 1
+                self.stdout.write(f'{nombre}: ' + self.style.WARNING('no usa índice'))
+
+            if options['plan'] or not usa_indice:
+                for linea in plan.splitlines():
+                    self.stdout.write(f'    {linea}')
+
+        self.stdout.write(f'{sin_indice} consultas sin índice')
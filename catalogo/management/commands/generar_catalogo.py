@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalogo.sintetico import TAMANO_DE_LOTE, generar
+
+
+class Command(BaseCommand):
+    help = ('Agrega un catalogo sintetico reproducible (autores, libros, generos, lenguajes, copias y usuarios) '
+            'para probar el sitio con muchos datos')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--libros', type=int, default=10000, help='Libros a generar')
+        parser.add_argument('--copias', type=int, default=5, help='Copias por libro')
+        parser.add_argument('--usuarios', type=int, default=1000, help='Usuarios a generar (contraseña "usertest")')
+        parser.add_argument('--semilla', type=int, default=0, help='Semilla; la misma semilla genera los mismos datos')
+        parser.add_argument('--lote', type=int, default=TAMANO_DE_LOTE, help='Libros insertados por lote')
+        parser.add_argument('--sin-indices', action='store_true',
+                            help='No reconstruye los indices de busqueda y autocompletado (se puede hacer despues '
+                                 'con reconstruir_indice_de_busqueda)')
+        parser.add_argument('--database', default='default', help='Alias de la base de datos')
+
+    def handle(self, *args, **options):
+        if options['libros'] < 1 or options['copias'] < 0 or options['usuarios'] < 0 or options['lote'] < 1:
+            raise CommandError('--libros y --lote deben ser mayores que cero, y --copias y --usuarios no pueden ser negativos')
+
+        inicio = time.monotonic()
+        creados = generar(
+            options['libros'],
+            copias_por_libro=options['copias'],
+            usuarios=options['usuarios'],
+            semilla=options['semilla'],
+            tamano_de_lote=options['lote'],
+            indexar=not options['sin_indices'],
+            using=options['database'],
+        )
+        segundos = time.monotonic() - inicio
+
+        filas = sum(creados.values())
+        self.stdout.write(', '.join(f'{cantidad} {nombre}' for nombre, cantidad in creados.items()))
+        self.stdout.write(self.style.SUCCESS(f'{filas} filas en {segundos:.1f} s ({filas / max(segundos, 1e-6):.0f} filas/s)'))
@@ -0,0 +1,56 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalogo.importacion import LECTORES, TAMANO_DE_LOTE, importar
+
+
+class Command(BaseCommand):
+    help = 'Importa libros desde un archivo CSV, JSONL o MARC 21 por lotes, con la opcion de reanudar'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del archivo a importar')
+        parser.add_argument('--formato', choices=sorted(LECTORES), help='Formato del archivo (por defecto su extension)')
+        parser.add_argument('--lote', type=int, default=TAMANO_DE_LOTE, help='Cantidad de libros por lote')
+        parser.add_argument('--reanudar', action='store_true', help='Continua desde el ultimo lote confirmado')
+        parser.add_argument('--database', default='default', help='Alias de la base de datos')
+
+    def handle(self, *args, **options):
+        archivo = options['archivo']
+        formato = options['formato'] or os.path.splitext(archivo)[1].lstrip('.').lower()
+        if formato in ('mrc', 'marc21'):
+            formato = 'marc'
+        if formato not in LECTORES:
+            raise CommandError(f'Formato desconocido: {formato}')
+
+        # El progreso se guarda junto al archivo para poder reanudar despues de un error
+        archivo_de_progreso = f'{archivo}.progreso'
+        omitir = 0
+        if options['reanudar'] and os.path.exists(archivo_de_progreso):
+            with open(archivo_de_progreso) as progreso:
+                omitir = int(progreso.read().strip() or 0)
+            self.stdout.write(f'Reanudando después de {omitir} registros')
+
+        inicio = time.monotonic()
+
+        def al_terminar_lote(total):
+            with open(archivo_de_progreso, 'w') as progreso:
+                progreso.write(str(total))
+            por_segundo = (total - omitir) / max(time.monotonic() - inicio, 1e-6)
+            self.stdout.write(f'{total} registros ({por_segundo:.0f} registros/s)')
+
+        leer, modo = LECTORES[formato]
+        with open(archivo, modo, **({} if 'b' in modo else {'encoding': 'utf-8', 'newline': ''})) as entrada:
+            total = importar(
+                leer(entrada),
+                tamano_de_lote=options['lote'],
+                omitir=omitir,
+                al_terminar_lote=al_terminar_lote,
+                using=options['database'],
+            )
+
+        if os.path.exists(archivo_de_progreso):
+            os.remove(archivo_de_progreso)
+
+        self.stdout.write(self.style.SUCCESS(f'{total - omitir} registros importados'))
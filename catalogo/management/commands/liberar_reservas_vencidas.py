@@ -0,0 +1,24 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalogo.circulacion import liberar_apartadas_vencidas
+
+
+class Command(BaseCommand):
+    help = 'Libera las copias apartadas que no se retiraron a tiempo (pensado para ejecutarse cada noche)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fecha', help='Fecha de referencia en formato AAAA-MM-DD (por defecto hoy)')
+
+    def handle(self, *args, **options):
+        fecha = None
+        if options['fecha']:
+            try:
+                fecha = date.fromisoformat(options['fecha'])
+            except ValueError:
+                raise CommandError(f'Fecha inválida: {options["fecha"]}')
+
+        total = liberar_apartadas_vencidas(fecha)
+
+        self.stdout.write(self.style.SUCCESS(f'{total} copias apartadas liberadas'))
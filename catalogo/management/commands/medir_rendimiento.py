@@ -0,0 +1,120 @@
+import json
+import os
+import subprocess
+import tempfile
+from datetime import datetime
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from catalogo import sintetico
+from catalogo.rendimiento import medir, medir_mezcla
+
+
+def commit_actual():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = ('Genera un catalogo sintetico en una base de datos de pruebas y mide latencia, consultas y peticiones '
+            'por segundo de cada URL de catalogo/urls.py; el resultado en JSON se puede comparar entre commits')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--libros', type=int, default=10000, help='Libros a generar (por ejemplo 10000, 100000, 1000000)')
+        parser.add_argument('--copias', type=int, default=5, help='Copias por libro')
+        parser.add_argument('--usuarios', type=int, default=5000, help='Usuarios a generar')
+        parser.add_argument('--semilla', type=int, default=0, help='Semilla de los datos generados')
+        parser.add_argument('--peticiones', type=int, default=50, help='Peticiones por URL en cada fase')
+        parser.add_argument('--concurrencia', type=int, default=8, help='Hilos de la fase de carga')
+        parser.add_argument('--url', action='append', dest='urls', help='Nombre de la URL a medir (se puede repetir)')
+        parser.add_argument('--salida', default='rendimiento.json', help='Archivo JSON con los resultados')
+        parser.add_argument('--comparar', help='Resultados anteriores para mostrar las diferencias')
+        parser.add_argument('--mezcla', action='store_true',
+                            help='Mide tambien lecturas y escrituras de prestamos ejecutadas a la vez')
+        parser.add_argument('--lectores', type=int, default=6, help='Hilos de lectura de la fase --mezcla')
+        parser.add_argument('--escritores', type=int, default=2, help='Hilos de escritura de la fase --mezcla')
+
+    def handle(self, *args, **options):
+        if options['peticiones'] < 1 or options['concurrencia'] < 1 or options['libros'] < 1:
+            raise CommandError('--libros, --peticiones y --concurrencia deben ser mayores que cero')
+
+        anteriores = None
+        if options['comparar']:
+            with open(options['comparar']) as archivo:
+                anteriores = json.load(archivo)['urls']
+
+        # Igual que el test runner: una base aparte que se elimina al terminar
+        nombre_original = connection.settings_dict['NAME']
+        if connection.vendor == 'sqlite' and not connection.settings_dict['TEST']['NAME']:
+            # En memoria las escrituras simultaneas fallan con 'table is locked' en lugar de esperar
+            connection.settings_dict['TEST']['NAME'] = os.path.join(tempfile.gettempdir(), 'rendimiento.sqlite3')
+        nombre_de_prueba = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            def al_medir(nombre, resultado):
+                self.stdout.write(self._linea(nombre, resultado, anteriores and anteriores.get(nombre)))
+
+            with override_settings(DEBUG=False, ALLOWED_HOSTS=['testserver']):
+                escala = sintetico.generar(
+                    options['libros'], options['copias'], options['usuarios'], semilla=options['semilla'],
+                )
+                self.stdout.write(f'Datos generados: {escala}')
+                resultados = medir(options['peticiones'], options['concurrencia'], options['urls'], al_medir)
+                mezcla = None
+                if options['mezcla']:
+                    mezcla = medir_mezcla(options['peticiones'], options['lectores'], options['escritores'])
+                    for grupo, resultado in mezcla.items():
+                        self.stdout.write(self._linea_de_mezcla(grupo, resultado))
+        finally:
+            connection.creation.destroy_test_db(nombre_original, verbosity=0)
+            if connection.vendor == 'sqlite':
+                # Archivos que deja el modo WAL si algun hilo no cerro su conexion
+                for sufijo in ('-wal', '-shm'):
+                    if os.path.exists(nombre_de_prueba + sufijo):
+                        os.remove(nombre_de_prueba + sufijo)
+
+        with open(options['salida'], 'w') as archivo:
+            json.dump({
+                'commit': commit_actual(),
+                'fecha': datetime.now().isoformat(timespec='seconds'),
+                'django': django.get_version(),
+                'motor': connection.vendor,
+                'escala': escala,
+                'peticiones': options['peticiones'],
+                'concurrencia': options['concurrencia'],
+                'sqlite_optimizado': settings.SQLITE_OPTIMIZADO,
+                'urls': resultados,
+                'mezcla': mezcla,
+            }, archivo, indent=2, sort_keys=True)
+            archivo.write('\n')
+
+        self.stdout.write(self.style.SUCCESS(f'{len(resultados)} URLs medidas; resultados en {options["salida"]}'))
+
+    def _linea_de_mezcla(self, grupo, resultado):
+        latencia = resultado['latencia_ms']
+        linea = (f'mezcla: {grupo:<12} p50 {latencia["p50"]:>7.2f} ms  p95 {latencia["p95"]:>7.2f} ms  '
+                 f'{resultado["peticiones_por_segundo"]:>7.1f} pet/s')
+        if resultado['errores']:
+            linea += self.style.ERROR(f'  {resultado["errores"]} errores')
+        return linea
+
+    def _linea(self, nombre, resultado, anterior):
+        latencia = resultado['latencia_ms']
+        linea = (f'{nombre:<20} {resultado["estado"]} {resultado["consultas"]:>3} consultas  '
+                 f'p50 {latencia["p50"]:>7.2f} ms  p99 {latencia["p99"]:>7.2f} ms  '
+                 f'{resultado["peticiones_por_segundo"]:>7.1f} pet/s')
+        if resultado['errores']:
+            linea += self.style.ERROR(f'  {resultado["errores"]} errores')
+
+        if anterior:
+            cambio = (latencia['p50'] / anterior['latencia_ms']['p50'] - 1) * 100 if anterior['latencia_ms']['p50'] else 0
+            linea += f'  (p50 {cambio:+.0f}%, consultas {anterior["consultas"]} -> {resultado["consultas"]})'
+
+        return linea
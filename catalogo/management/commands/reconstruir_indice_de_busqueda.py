@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from catalogo import autocompletar
+from catalogo.busqueda import reconstruir_indice
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el indice de texto completo de los libros y el de prefijos del autocompletado'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000, help='Cantidad de libros indexados por lote')
+        parser.add_argument('--database', default='default', help='Alias de la base de datos')
+
+    def handle(self, *args, **options):
+        total = reconstruir_indice(tamano_de_lote=options['lote'], using=options['database'])
+        self.stdout.write(self.style.SUCCESS(f'{total} libros indexados'))
+
+        total = autocompletar.reconstruir(tamano_de_lote=options['lote'], using=options['database'])
+        self.stdout.write(self.style.SUCCESS(f'{total} sugerencias de autocompletado indexadas'))
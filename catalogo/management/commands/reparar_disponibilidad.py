@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q
+
+from catalogo.contadores import invalidar_contadores
+from catalogo.models import Libro, InstanciaDeLibro, CONTADORES_POR_ESTATUS
+from catalogo.versiones import incrementar_version, incrementar_version_de_objetos
+
+CAMPOS = ['num_copias'] + list(CONTADORES_POR_ESTATUS.values())
+
+
+def conteos_reales(ids, using):
+    """Cuenta las copias de cada libro por estatus con una sola consulta agrupada"""
+    conteos = InstanciaDeLibro.objects.using(using).filter(libro_id__in=ids).order_by().values('libro_id').annotate(
+        num_copias=Count('pk'),
+        **{campo: Count('pk', filter=Q(estatus=estatus)) for estatus, campo in CONTADORES_POR_ESTATUS.items()}
+    )
+    return {fila.pop('libro_id'): fila for fila in conteos}
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los contadores de copias de cada libro y corrige los que no coinciden'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=2000, help='Cantidad de libros revisados por lote')
+        parser.add_argument('--database', default='default', help='Alias de la base de datos')
+
+    def handle(self, *args, **options):
+        using = options['database']
+        ultimo_id = 0
+        revisados = 0
+        corregidos = 0
+
+        while True:
+            with transaction.atomic(using=using):
+                libros = list(
+                    Libro.objects.using(using).select_for_update().filter(pk__gt=ultimo_id)
+                    .order_by('pk').only(*CAMPOS)[:options['lote']]
+                )
+                if not libros:
+                    break
+
+                conteos = conteos_reales([libro.pk for libro in libros], using)
+                incorrectos = []
+                for libro in libros:
+                    reales = conteos.get(libro.pk, {})
+                    if any(getattr(libro, campo) != reales.get(campo, 0) for campo in CAMPOS):
+                        for campo in CAMPOS:
+                            setattr(libro, campo, reales.get(campo, 0))
+                        incorrectos.append(libro)
+
+                Libro.objects.using(using).bulk_update(incorrectos, CAMPOS)
+
+            revisados += len(libros)
+            corregidos += len(incorrectos)
+            ultimo_id = libros[-1].pk
+            incrementar_version_de_objetos(Libro, [libro.pk for libro in incorrectos])
+
+        # bulk_update no envia post_save: las paginas y los contadores en cache se invalidan aqui
+        if corregidos:
+            invalidar_contadores()
+            incrementar_version(Libro)
+
+        self.stdout.write(self.style.SUCCESS(f'{revisados} libros revisados, {corregidos} corregidos'))
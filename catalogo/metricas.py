@@ -0,0 +1,206 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed, PermissionDenied
+from django.db import connections
+from django.http import Http404, HttpResponse
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+from django.utils.crypto import constant_time_compare
+
+logger = logging.getLogger(__name__)
+
+# Medicion de la peticion en curso; se copia a los hilos de las vistas asincronas junto con el contexto
+_medicion = ContextVar('medicion', default=None)
+
+SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+CONSULTAS = (1, 2, 5, 10, 20, 50, 100)
+BYTES = (1024, 4096, 16384, 65536, 262144, 1048576)
+
+HISTOGRAMAS = (
+    ('catalogo_peticion_segundos', 'Duracion de la peticion', 'total', SEGUNDOS),
+    ('catalogo_consultas_segundos', 'Tiempo en la base de datos por peticion', 'tiempo_de_consultas', SEGUNDOS),
+    ('catalogo_consultas', 'Consultas SQL por peticion', 'consultas', CONSULTAS),
+    ('catalogo_plantillas_segundos', 'Tiempo de renderizado de templates por peticion', 'tiempo_de_plantillas', SEGUNDOS),
+    ('catalogo_respuesta_bytes', 'Tamaño del cuerpo de la respuesta', 'bytes', BYTES),
+)
+
+
+class Medicion:
+    def __init__(self):
+        self.consultas = 0
+        self.tiempo_de_consultas = 0.0
+        self.tiempo_de_plantillas = 0.0
+
+
+class Histograma:
+    def __init__(self, limites):
+        self.limites = limites
+        self.cuentas = [0] * (len(limites) + 1)
+        self.suma = 0
+        self.total = 0
+
+    def observar(self, valor):
+        self.cuentas[bisect_left(self.limites, valor)] += 1
+        self.suma += valor
+        self.total += 1
+
+
+class Registro:
+    """Histogramas por vista del proceso actual (cada worker de gunicorn tiene los suyos)"""
+
+    def __init__(self):
+        self._candado = threading.Lock()
+        self.histogramas = {}
+        self.sobre_presupuesto = {}
+
+    def observar(self, vista, valores, excedido):
+        with self._candado:
+            for nombre, _, clave, limites in HISTOGRAMAS:
+                if (nombre, vista) not in self.histogramas:
+                    self.histogramas[nombre, vista] = Histograma(limites)
+                self.histogramas[nombre, vista].observar(valores[clave])
+            if excedido:
+                self.sobre_presupuesto[vista] = self.sobre_presupuesto.get(vista, 0) + 1
+
+    def como_texto(self):
+        """Devuelve las metricas en el formato de texto de Prometheus"""
+        lineas = []
+        with self._candado:
+            for nombre, ayuda, _, _ in HISTOGRAMAS:
+                lineas += [f'# HELP {nombre} {ayuda}', f'# TYPE {nombre} histogram']
+                for (histograma_de, vista), histograma in sorted(self.histogramas.items()):
+                    if histograma_de != nombre:
+                        continue
+                    acumulado = 0
+                    for limite, cuenta in zip(histograma.limites + ('+Inf',), histograma.cuentas):
+                        acumulado += cuenta
+                        lineas.append(f'{nombre}_bucket{{vista="{vista}",le="{limite}"}} {acumulado}')
+                    lineas.append(f'{nombre}_sum{{vista="{vista}"}} {histograma.suma}')
+                    lineas.append(f'{nombre}_count{{vista="{vista}"}} {histograma.total}')
+
+            nombre = 'catalogo_peticiones_sobre_presupuesto_total'
+            lineas += [f'# HELP {nombre} Peticiones que superaron PRESUPUESTO_DE_CONSULTAS', f'# TYPE {nombre} counter']
+            for vista, cuenta in sorted(self.sobre_presupuesto.items()):
+                lineas.append(f'{nombre}{{vista="{vista}"}} {cuenta}')
+
+        return '\n'.join(lineas) + '\n'
+
+
+registro = Registro()
+
+
+def _registrar_consulta(execute, sql, params, many, context):
+    medicion = _medicion.get()
+    if medicion is None:
+        return execute(sql, params, many, context)
+
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        medicion.consultas += 1
+        medicion.tiempo_de_consultas += time.perf_counter() - inicio
+
+
+@contextmanager
+def medir_consultas():
+    """Cuenta las consultas de las conexiones del hilo actual si hay una medicion en curso"""
+    with ExitStack() as pila:
+        if _medicion.get() is not None:
+            for alias in connections:
+                pila.enter_context(connections[alias].execute_wrapper(_registrar_consulta))
+        yield
+
+
+class PlantillaMedida(Template):
+    def render(self, context=None, request=None):
+        medicion = _medicion.get()
+        if medicion is None:
+            return super().render(context, request)
+
+        inicio = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            medicion.tiempo_de_plantillas += time.perf_counter() - inicio
+
+
+class PlantillasMedidas(DjangoTemplates):
+    """Backend de templates de Django que suma el tiempo de renderizado a la medicion en curso"""
+
+    def from_string(self, template_code):
+        return PlantillaMedida(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return PlantillaMedida(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+class MiddlewareDeMetricas:
+    """Mide cada peticion y agrega el encabezado Server-Timing; solo se carga con METRICAS_ACTIVAS"""
+
+    def __init__(self, get_response):
+        if not settings.METRICAS_ACTIVAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        medicion = Medicion()
+        token = _medicion.set(medicion)
+        inicio = time.perf_counter()
+        try:
+            with medir_consultas():
+                response = self.get_response(request)
+        finally:
+            _medicion.reset(token)
+        total = time.perf_counter() - inicio
+
+        coincidencia = getattr(request, 'resolver_match', None)
+        vista = coincidencia.view_name if coincidencia else 'sin_ruta'
+        excedido = medicion.consultas > settings.PRESUPUESTO_DE_CONSULTAS
+        if excedido:
+            logger.warning(
+                '%s (%s) hizo %d consultas; el presupuesto es %d',
+                request.path, vista, medicion.consultas, settings.PRESUPUESTO_DE_CONSULTAS,
+            )
+
+        registro.observar(vista, {
+            'total': total,
+            'consultas': medicion.consultas,
+            'tiempo_de_consultas': medicion.tiempo_de_consultas,
+            'tiempo_de_plantillas': medicion.tiempo_de_plantillas,
+            'bytes': 0 if response.streaming else len(response.content),
+        }, excedido)
+
+        response['Server-Timing'] = ', '.join([
+            f'total;dur={total * 1000:.1f}',
+            f'db;dur={medicion.tiempo_de_consultas * 1000:.1f};desc="{medicion.consultas} consultas"',
+            f'tpl;dur={medicion.tiempo_de_plantillas * 1000:.1f}',
+        ])
+        return response
+
+
+def _puede_ver_metricas(request):
+    """El personal del sitio, o Prometheus con 'Authorization: Bearer <TOKEN_DE_METRICAS>'"""
+    if settings.TOKEN_DE_METRICAS and constant_time_compare(
+        request.headers.get('Authorization', ''), f'Bearer {settings.TOKEN_DE_METRICAS}',
+    ):
+        return True
+    return request.user.is_staff
+
+
+def metricas(request):
+    """View function que expone las metricas del proceso para Prometheus"""
+    if not settings.METRICAS_ACTIVAS:
+        raise Http404
+    if not _puede_ver_metricas(request):
+        raise PermissionDenied
+    return HttpResponse(registro.como_texto(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,71 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:21
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Autor',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100)),
+                ('apellido', models.CharField(max_length=100)),
+                ('fecha_de_nacimiento', models.DateField(blank=True, null=True)),
+                ('fecha_de_deceso', models.DateField(blank=True, null=True, verbose_name='Fallecimiento')),
+            ],
+            options={
+                'ordering': ['apellido', 'nombre'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Genero',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(help_text='Ingresa un género de libro (ejemplo: Ciencia Ficción)', max_length=200)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Lenguaje',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(help_text='Ingresa el Lenguaje natural de un libro (ejemplo: Español)', max_length=200)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Libro',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('titulo', models.CharField(max_length=200)),
+                ('resumen', models.TextField(help_text='Ingresa una breve descripción del libro', max_length=1000)),
+                ('isbn', models.CharField(help_text='Ingresa el <a href="https://www.isbn-international.org/es/content/¿que-es-un-isbn">número ISBN</a> de 13 carácteres', max_length=13, verbose_name='ISBN')),
+                ('autor', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='catalogo.Autor')),
+                ('genero', models.ManyToManyField(help_text='Selecciona un género para este libro', to='catalogo.Genero')),
+                ('lenguaje', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='catalogo.Lenguaje')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='InstanciaDeLibro',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, help_text='ID único para este libro en particular en toda la librería', primary_key=True, serialize=False)),
+                ('fecha_de_devolucion', models.DateField(blank=True, null=True)),
+                ('estatus', models.CharField(blank=True, choices=[('m', 'Mantenimiento'), ('p', 'Prestado'), ('d', 'Disponible'), ('r', 'Reservado')], default=' ', help_text='Disponibilidad del libro', max_length=1)),
+                ('libro', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='catalogo.Libro')),
+                ('prestatario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['fecha_de_devolucion'],
+                'permissions': (('can_mark_returned', 'Can set book as returned'),),
+            },
+        ),
+    ]
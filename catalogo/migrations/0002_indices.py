@@ -0,0 +1,41 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogo', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='autor',
+            index=models.Index(fields=['apellido', 'nombre', 'id'], name='autor_nombre_completo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='instanciadelibro',
+            index=models.Index(fields=['fecha_de_devolucion', 'id'], name='instancia_devolucion_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='instanciadelibro',
+            index=models.Index(fields=['estatus', 'fecha_de_devolucion', 'id'], name='instancia_estatus_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='instanciadelibro',
+            index=models.Index(fields=['prestatario', 'estatus', 'fecha_de_devolucion', 'id'], name='instancia_prestatario_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='instanciadelibro',
+            index=models.Index(condition=models.Q(estatus='p'), fields=['fecha_de_devolucion', 'id'], name='instancia_prestados_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='libro',
+            index=models.Index(fields=['titulo', 'id'], name='libro_titulo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='libro',
+            index=models.Index(fields=['isbn'], name='libro_isbn_idx'),
+        ),
+    ]
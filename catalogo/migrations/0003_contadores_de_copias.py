@@ -0,0 +1,64 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:29
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+CONTADORES_POR_ESTATUS = {
+    'd': 'num_disponibles',
+    'p': 'num_prestadas',
+    'm': 'num_en_mantenimiento',
+    'r': 'num_reservadas',
+}
+
+
+def calcular_contadores(apps, schema_editor):
+    """Llena los contadores de los libros existentes a partir de sus copias"""
+    Libro = apps.get_model('catalogo', 'Libro')
+    InstanciaDeLibro = apps.get_model('catalogo', 'InstanciaDeLibro')
+    using = schema_editor.connection.alias
+
+    conteos = InstanciaDeLibro.objects.using(using).filter(libro__isnull=False).order_by().values('libro_id').annotate(
+        num_copias=Count('pk'),
+        **{campo: Count('pk', filter=Q(estatus=estatus)) for estatus, campo in CONTADORES_POR_ESTATUS.items()}
+    )
+    libros = []
+    for fila in conteos:
+        libros.append(Libro(pk=fila.pop('libro_id'), **fila))
+
+    Libro.objects.using(using).bulk_update(libros, ['num_copias'] + list(CONTADORES_POR_ESTATUS.values()), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogo', '0002_indices'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='libro',
+            name='num_copias',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='libro',
+            name='num_disponibles',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='libro',
+            name='num_en_mantenimiento',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='libro',
+            name='num_prestadas',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='libro',
+            name='num_reservadas',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(calcular_contadores, migrations.RunPython.noop),
+    ]
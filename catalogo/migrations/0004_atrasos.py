@@ -0,0 +1,35 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:31
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('catalogo', '0003_contadores_de_copias'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenDeAtrasos',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prestamos_atrasados', models.PositiveIntegerField()),
+                ('dias_de_atraso_maximo', models.PositiveIntegerField()),
+                ('fecha_mas_antigua', models.DateField()),
+                ('fecha_de_calculo', models.DateField()),
+                ('prestatario', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='resumen_de_atrasos', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'resumenes de atrasos',
+                'ordering': ['-dias_de_atraso_maximo', 'prestatario'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='resumendeatrasos',
+            index=models.Index(fields=['-dias_de_atraso_maximo', 'prestatario'], name='resumen_atraso_idx'),
+        ),
+    ]
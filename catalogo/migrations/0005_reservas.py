@@ -0,0 +1,38 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:33
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('catalogo', '0004_atrasos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Reserva',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('creada', models.DateTimeField(auto_now_add=True)),
+                ('asignada', models.DateTimeField(blank=True, null=True)),
+                ('instancia', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='catalogo.InstanciaDeLibro')),
+                ('libro', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='catalogo.Libro')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['creada', 'id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='reserva',
+            index=models.Index(condition=models.Q(asignada__isnull=True), fields=['libro', 'creada', 'id'], name='reserva_fila_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reserva',
+            index=models.Index(fields=['usuario', 'creada'], name='reserva_usuario_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:37
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('catalogo', '0005_reservas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Prestamo',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('estatus_anterior', models.CharField(blank=True, max_length=1)),
+                ('estatus', models.CharField(max_length=1)),
+                ('fecha_de_devolucion', models.DateField(blank=True, null=True)),
+                ('instancia', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='catalogo.InstanciaDeLibro')),
+                ('libro', models.ForeignKey(db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='catalogo.Libro')),
+                ('prestatario', models.ForeignKey(db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='prestamo',
+            index=models.Index(fields=['fecha'], name='prestamo_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prestamo',
+            index=models.Index(fields=['instancia', 'fecha'], name='prestamo_instancia_idx'),
+        ),
+    ]
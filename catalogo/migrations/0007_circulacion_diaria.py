@@ -0,0 +1,31 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:39
+
+import datetime
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogo', '0006_historial_de_prestamos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CirculacionDiaria',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('prestamos', models.PositiveIntegerField(default=0)),
+                ('devoluciones', models.PositiveIntegerField(default=0)),
+                ('devoluciones_con_duracion', models.PositiveIntegerField(default=0)),
+                ('tiempo_prestado', models.DurationField(default=datetime.timedelta(0))),
+                ('libro', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='catalogo.Libro')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='circulaciondiaria',
+            constraint=models.UniqueConstraint(fields=('dia', 'libro'), name='circulacion_dia_libro_unica'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 3.2.25 on 2026-10-18 10:52
+
+from django.db import migrations, models
+
+
+def eliminar_reservas_duplicadas(apps, schema_editor):
+    """Conserva solo la reserva pendiente mas antigua de cada persona y libro"""
+    Reserva = apps.get_model('catalogo', 'Reserva')
+    vistas = set()
+    duplicadas = []
+
+    for pk, libro_id, usuario_id in Reserva.objects.filter(asignada__isnull=True).order_by(
+        'creada', 'id',
+    ).values_list('pk', 'libro_id', 'usuario_id').iterator():
+        if (libro_id, usuario_id) in vistas:
+            duplicadas.append(pk)
+        vistas.add((libro_id, usuario_id))
+
+    Reserva.objects.filter(pk__in=duplicadas).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogo', '0007_circulacion_diaria'),
+    ]
+
+    operations = [
+        migrations.RunPython(eliminar_reservas_duplicadas, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='reserva',
+            constraint=models.UniqueConstraint(condition=models.Q(('asignada__isnull', True)), fields=('libro', 'usuario'), name='reserva_pendiente_unica'),
+        ),
+    ]
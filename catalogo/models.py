@@ -1,8 +1,12 @@
+from collections import defaultdict
 from datetime import date, timedelta
 import uuid # Requerido para definir instancias unicas por libro
 
-from django.db import models
+from django.db import models, router, transaction
+from django.db.models import DateField, DurationField, ExpressionWrapper, F, Value
+from django.db.models.functions import Greatest
 from django.urls import reverse
+from django.utils import timezone
 from django.contrib.auth.models import User
 
 
@@ -22,6 +26,73 @@ class Lenguaje(models.Model):
         return self.nombre
 
 
+# Campo de Libro que cuenta las copias en cada estatus
+CONTADORES_POR_ESTATUS = {
+    'd': 'num_disponibles',
+    'p': 'num_prestadas',
+    'm': 'num_en_mantenimiento',
+    'r': 'num_reservadas',
+}
+
+
+def actualizar_disponibilidad(cambios, using=None):
+    """Aplica a los contadores de Libro los cambios de estado de sus copias.
+
+    'cambios' es un iterable de pares (anterior, nuevo), donde cada estado es
+    una tupla (libro_id, estatus) o None si la copia no existia o fue eliminada.
+    Los libros con el mismo cambio se actualizan con un solo UPDATE.
+    """
+    deltas = defaultdict(lambda: defaultdict(int))
+
+    for anterior, nuevo in cambios:
+        for estado, signo in ((anterior, -1), (nuevo, 1)):
+            if estado is None or estado[0] is None:
+                continue
+            libro_id, estatus = estado
+            deltas[libro_id]['num_copias'] += signo
+            if estatus in CONTADORES_POR_ESTATUS:
+                deltas[libro_id][CONTADORES_POR_ESTATUS[estatus]] += signo
+
+    libros_por_delta = defaultdict(list)
+    for libro_id, delta in deltas.items():
+        delta = tuple(sorted((campo, valor) for campo, valor in delta.items() if valor))
+        if delta:
+            libros_por_delta[delta].append(libro_id)
+
+    for delta, libros in libros_por_delta.items():
+        # Los contadores son PositiveIntegerField: si se desviaron hasta 0, restar violaria el CHECK
+        # y haria fallar el prestamo; reparar_disponibilidad corrige la desviacion
+        Libro.objects.using(using).filter(pk__in=libros).update(
+            **{campo: F(campo) + valor if valor > 0 else Greatest(F(campo) + valor, 0) for campo, valor in delta}
+        )
+
+
+def registrar_prestamos(transiciones, using=None):
+    """Agrega al historial un evento por cada copia que cambio de estatus, con un solo INSERT.
+
+    'transiciones' es un iterable de (instancia, estatus_anterior, prestatario_anterior_id)
+    con la instancia ya actualizada; estatus_anterior es None si la copia es nueva.
+    """
+    ahora = timezone.now()
+    eventos = [
+        Prestamo(
+            fecha=ahora,
+            instancia_id=instancia.pk,
+            libro_id=instancia.libro_id,
+            # Al devolver se conserva quien tenia la copia
+            prestatario_id=instancia.prestatario_id or prestatario_anterior_id,
+            estatus_anterior=estatus_anterior or '',
+            estatus=instancia.estatus,
+            fecha_de_devolucion=instancia.fecha_de_devolucion,
+        )
+        for instancia, estatus_anterior, prestatario_anterior_id in transiciones
+        if estatus_anterior != instancia.estatus
+    ]
+
+    if eventos:
+        Prestamo.objects.using(using).bulk_create(eventos)
+
+
 class Libro(models.Model):
     """Modelo que representa un libro (pero no una copia especifica del libro)"""
     titulo = models.CharField(max_length=200)
@@ -31,6 +102,12 @@ class Libro(models.Model):
     lenguaje = models.ForeignKey('Lenguaje', on_delete=models.SET_NULL, null=True)
     genero = models.ManyToManyField(Genero, help_text='Selecciona un género para este libro')
 
+    # Contadores de copias mantenidos por InstanciaDeLibro (ver actualizar_disponibilidad)
+    num_copias = models.PositiveIntegerField(default=0, editable=False)
+    num_disponibles = models.PositiveIntegerField(default=0, editable=False)
+    num_prestadas = models.PositiveIntegerField(default=0, editable=False)
+    num_en_mantenimiento = models.PositiveIntegerField(default=0, editable=False)
+    num_reservadas = models.PositiveIntegerField(default=0, editable=False)
     
     def desplegar_genero(self):
         """Crea un string para el Genero. Se requiere para desplegar genero en Admin"""
@@ -38,6 +115,27 @@ class Libro(models.Model):
     
     desplegar_genero.short_description = 'Genero'
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['titulo', 'id'], name='libro_titulo_idx'),
+            models.Index(fields=['isbn'], name='libro_isbn_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        """Guarda el libro sin sobrescribir los contadores de copias.
+
+        Los contadores solo los cambia actualizar_disponibilidad; escribir los valores leidos al
+        cargar el formulario desharia las actualizaciones confirmadas mientras tanto.
+        """
+        if not self._state.adding and not kwargs.get('force_insert') and kwargs.get('update_fields') is None:
+            contadores = {'num_copias', *CONTADORES_POR_ESTATUS.values()}
+            kwargs['update_fields'] = [
+                campo.name for campo in self._meta.concrete_fields
+                if not campo.primary_key and campo.name not in contadores
+            ]
+
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.titulo
 
@@ -45,6 +143,24 @@ class Libro(models.Model):
         return reverse('detalle_del_libro', args=[str(self.id)])
 
 
+class PrestamoQuerySet(models.QuerySet):
+    """Consultas de prestamos resueltas en la base de datos"""
+
+    def prestados(self):
+        return self.filter(estatus='p')
+
+    def atrasados(self, fecha=None):
+        """Prestamos cuya fecha de devolucion ya paso (usa el indice parcial de prestados)"""
+        return self.prestados().filter(fecha_de_devolucion__lt=fecha or date.today())
+
+    def con_dias_de_atraso(self, fecha=None):
+        """Agrega 'dias_de_atraso' como un timedelta calculado por la base de datos"""
+        return self.annotate(dias_de_atraso=ExpressionWrapper(
+            Value(fecha or date.today(), output_field=DateField()) - F('fecha_de_devolucion'),
+            output_field=DurationField(),
+        ))
+
+
 class InstanciaDeLibro(models.Model):
     """Modelo que representa una copia especifica de un libro (ejemplo: un libro prestado por la libreria)"""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, help_text='ID único para este libro en particular en toda la librería')
@@ -66,16 +182,55 @@ class InstanciaDeLibro(models.Model):
         default=' ',
         help_text='Disponibilidad del libro',
     )
-    
+
+    objects = PrestamoQuerySet.as_manager()
+
     @property
     def esta_atrasado(self):
         if self.fecha_de_devolucion and date.today() > self.fecha_de_devolucion:
             return True
         return False
 
+    def save(self, *args, **kwargs):
+        """Guarda la copia y actualiza los contadores de su libro y el historial en la misma transaccion"""
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+
+        with transaction.atomic(using=using):
+            anterior = None
+            if not self._state.adding:
+                anterior = type(self).objects.using(using).select_for_update().filter(
+                    pk=self.pk,
+                ).values_list('libro_id', 'estatus', 'prestatario_id').first()
+            self._libro_anterior = anterior and anterior[0]
+
+            # Una copia que queda disponible (nueva, desde mantenimiento o desde el admin) se aparta
+            # para la primera reserva pendiente de su libro; reservas importa este modulo
+            if self.estatus == 'd' and (anterior is None or anterior[1] != 'd'):
+                from catalogo.reservas import asignar_a_reserva
+                if asignar_a_reserva(self) is not None and kwargs.get('update_fields') is not None:
+                    kwargs['update_fields'] = {*kwargs['update_fields'], 'estatus', 'prestatario', 'fecha_de_devolucion'}
+
+            super().save(*args, **kwargs)
+
+            nuevo = (self.libro_id, self.estatus)
+            if anterior is None or anterior[:2] != nuevo:
+                actualizar_disponibilidad([(anterior and anterior[:2], nuevo)], using=using)
+                registrar_prestamos([(self, anterior and anterior[1], anterior and anterior[2])], using=using)
+
     class Meta:
         ordering = ['fecha_de_devolucion']
         permissions = (("can_mark_returned", "Can set book as returned"),)
+        indexes = [
+            models.Index(fields=['fecha_de_devolucion', 'id'], name='instancia_devolucion_idx'),
+            models.Index(fields=['estatus', 'fecha_de_devolucion', 'id'], name='instancia_estatus_idx'),
+            models.Index(fields=['prestatario', 'estatus', 'fecha_de_devolucion', 'id'], name='instancia_prestatario_idx'),
+            # Indice parcial para los prestamos activos (ignorado en los motores que no lo soportan)
+            models.Index(
+                fields=['fecha_de_devolucion', 'id'],
+                name='instancia_prestados_idx',
+                condition=models.Q(estatus='p'),
+            ),
+        ]
 
     def __str__(self):
         return f'{self.libro.titulo} ({self.id})'
@@ -90,9 +245,110 @@ class Autor(models.Model):
 
     class Meta:
         ordering = ['apellido', 'nombre']
+        indexes = [
+            models.Index(fields=['apellido', 'nombre', 'id'], name='autor_nombre_completo_idx'),
+        ]
 
     def get_absolute_url(self):
         return reverse('detalle_del_autor', args=[str(self.id)])
 
     def __str__(self):
         return f'{self.apellido}, {self.nombre}'
+
+
+class Prestamo(models.Model):
+    """Modelo que representa un cambio de estatus de una copia (historial de solo insercion).
+
+    Las relaciones no tienen restricciones ni cascadas en la base de datos: eliminar
+    una copia, un libro o un usuario no toca el historial, y cada insercion solo
+    mantiene los indices por fecha. Los meses antiguos se archivan con archivar_prestamos.
+    """
+    id = models.BigAutoField(primary_key=True)
+    fecha = models.DateTimeField(default=timezone.now)
+    instancia = models.ForeignKey(
+        'InstanciaDeLibro', on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, related_name='+',
+    )
+    libro = models.ForeignKey('Libro', on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, null=True, related_name='+')
+    prestatario = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, null=True, related_name='+')
+    estatus_anterior = models.CharField(max_length=1, blank=True)
+    estatus = models.CharField(max_length=1)
+    fecha_de_devolucion = models.DateField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['fecha'], name='prestamo_fecha_idx'),
+            models.Index(fields=['instancia', 'fecha'], name='prestamo_instancia_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.instancia_id}: {self.estatus_anterior or "-"} -> {self.estatus} ({self.fecha})'
+
+
+class CirculacionDiaria(models.Model):
+    """Modelo con la circulacion de un libro en un dia, resumida del historial por calcular_circulacion"""
+    dia = models.DateField()
+    libro = models.ForeignKey('Libro', on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, related_name='+')
+    prestamos = models.PositiveIntegerField(default=0)
+    devoluciones = models.PositiveIntegerField(default=0)
+    # Devoluciones cuyo prestamo esta en el historial y la suma de sus duraciones
+    devoluciones_con_duracion = models.PositiveIntegerField(default=0)
+    tiempo_prestado = models.DurationField(default=timedelta(0))
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['dia', 'libro'], name='circulacion_dia_libro_unica'),
+        ]
+
+    def __str__(self):
+        return f'{self.dia}: {self.libro_id} ({self.prestamos})'
+
+
+class Reserva(models.Model):
+    """Modelo que representa un lugar en la fila de espera de un libro"""
+    libro = models.ForeignKey('Libro', on_delete=models.CASCADE)
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE)
+    creada = models.DateTimeField(auto_now_add=True)
+    instancia = models.ForeignKey('InstanciaDeLibro', on_delete=models.SET_NULL, null=True, blank=True)
+    asignada = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['creada', 'id']
+        indexes = [
+            # La fila de cada libro: el primero pendiente se obtiene leyendo una sola entrada del indice
+            models.Index(
+                fields=['libro', 'creada', 'id'],
+                name='reserva_fila_idx',
+                condition=models.Q(asignada__isnull=True),
+            ),
+            models.Index(fields=['usuario', 'creada'], name='reserva_usuario_idx'),
+        ]
+        constraints = [
+            # Un solo lugar en la fila por persona y libro, aunque envie dos peticiones a la vez
+            models.UniqueConstraint(
+                fields=['libro', 'usuario'],
+                name='reserva_pendiente_unica',
+                condition=models.Q(asignada__isnull=True),
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.libro} ({self.usuario})'
+
+
+class ResumenDeAtrasos(models.Model):
+    """Modelo con los prestamos atrasados de cada usuario, calculado cada noche por calcular_atrasos"""
+    prestatario = models.OneToOneField(User, on_delete=models.CASCADE, related_name='resumen_de_atrasos')
+    prestamos_atrasados = models.PositiveIntegerField()
+    dias_de_atraso_maximo = models.PositiveIntegerField()
+    fecha_mas_antigua = models.DateField()
+    fecha_de_calculo = models.DateField()
+
+    class Meta:
+        ordering = ['-dias_de_atraso_maximo', 'prestatario']
+        verbose_name_plural = 'resumenes de atrasos'
+        indexes = [
+            models.Index(fields=['-dias_de_atraso_maximo', 'prestatario'], name='resumen_atraso_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.prestatario} ({self.prestamos_atrasados})'
@@ -0,0 +1,161 @@
+import hashlib
+import json
+
+from django.core import signing
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Q
+from django.http import Http404
+
+SAL_DEL_CURSOR = 'catalogo.paginacion'
+TIEMPO_DE_VIDA_DEL_TOTAL = 60 * 5
+
+
+class PaginaPorCursor:
+    """Pagina de resultados con tokens opacos para la pagina anterior y la siguiente"""
+
+    def __init__(self, object_list, token_anterior=None, token_siguiente=None, total_aproximado=None):
+        self.object_list = object_list
+        self.token_anterior = token_anterior
+        self.token_siguiente = token_siguiente
+        self.total_aproximado = total_aproximado
+
+    def has_previous(self):
+        return self.token_anterior is not None
+
+    def has_next(self):
+        return self.token_siguiente is not None
+
+    def has_other_pages(self):
+        return self.has_previous() or self.has_next()
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+
+def _igual(campo, valor):
+    if valor is None:
+        return Q(**{f'{campo}__isnull': True})
+    return Q(**{campo: valor})
+
+
+def filtro_del_cursor(campos, valores, nulos, hacia_atras=False, nulos_al_final=True):
+    """Crea el filtro de las filas posteriores (o anteriores) al cursor.
+
+    El orden es ascendente por cada campo, con los nulos donde los ordena el
+    motor de base de datos, y el ultimo campo debe ser unico para que el orden
+    sea total.
+    """
+    operador = 'lt' if hacia_atras else 'gt'
+    nulos_adelante = nulos_al_final != hacia_atras
+    filtro = None
+    iguales = Q()
+
+    for campo, valor, admite_nulos in zip(campos, valores, nulos):
+        if valor is None:
+            siguiente = None if nulos_adelante else Q(**{f'{campo}__isnull': False})
+        else:
+            siguiente = Q(**{f'{campo}__{operador}': valor})
+            if admite_nulos and nulos_adelante:
+                siguiente |= Q(**{f'{campo}__isnull': True})
+
+        if siguiente is not None:
+            termino = iguales & siguiente
+            filtro = termino if filtro is None else filtro | termino
+
+        iguales &= _igual(campo, valor)
+
+    return filtro
+
+
+def total_aproximado(queryset):
+    """Estima la cantidad de filas: el plan de PostgreSQL o un COUNT(*) guardado en la cache"""
+    connection = connections[queryset.db]
+    sql, params = queryset.order_by().query.sql_with_params()
+
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
+    clave = 'catalogo:total:' + hashlib.md5(f'{sql}{params}'.encode()).hexdigest()
+    return cache.get_or_set(clave, queryset.count, TIEMPO_DE_VIDA_DEL_TOTAL)
+
+
+class PaginacionPorCursorMixin:
+    """Mixin para ListView que pagina por cursor (keyset) en lugar de usar OFFSET.
+
+    'campos_del_cursor' define el orden de la lista; el ultimo campo debe ser unico.
+    El costo de cualquier pagina es el mismo que el de la primera.
+    """
+    campos_del_cursor = ('id',)
+    cursor_kwarg = 'cursor'
+    mostrar_total = False
+
+    def _crear_token(self, objeto, hacia_atras):
+        valores = [campo.value_to_string(objeto) if campo.value_from_object(objeto) is not None else None
+                   for campo in self._campos_del_modelo]
+        return signing.dumps({'a': hacia_atras, 'v': valores}, salt=SAL_DEL_CURSOR, compress=True)
+
+    def _leer_token(self, token):
+        try:
+            datos = signing.loads(token, salt=SAL_DEL_CURSOR)
+            valores = [campo.to_python(valor) if valor is not None else None
+                       for campo, valor in zip(self._campos_del_modelo, datos['v'])]
+        except (signing.BadSignature, KeyError, TypeError, ValueError):
+            raise Http404('Página inválida')
+
+        if len(valores) != len(self._campos_del_modelo):
+            raise Http404('Página inválida')
+
+        return datos['a'], valores
+
+    def _ordenar(self, queryset, hacia_atras):
+        # Se usa el orden natural de los nulos del motor para que los indices sirvan al ORDER BY
+        prefijo = '-' if hacia_atras else ''
+        return queryset.order_by(*[prefijo + campo.attname for campo in self._campos_del_modelo])
+
+    def paginate_queryset(self, queryset, page_size):
+        self._campos_del_modelo = [queryset.model._meta.get_field(campo) for campo in self.campos_del_cursor]
+        token = self.request.GET.get(self.cursor_kwarg)
+        hacia_atras = False
+        total = total_aproximado(queryset) if self.mostrar_total else None
+
+        if token:
+            hacia_atras, valores = self._leer_token(token)
+            filtro = filtro_del_cursor(
+                [campo.attname for campo in self._campos_del_modelo],
+                valores,
+                [campo.null for campo in self._campos_del_modelo],
+                hacia_atras,
+                connections[queryset.db].features.nulls_order_largest,
+            )
+            queryset = queryset.filter(filtro) if filtro is not None else queryset.none()
+
+        objetos = list(self._ordenar(queryset, hacia_atras)[:page_size + 1])
+        hay_mas = len(objetos) > page_size
+        objetos = objetos[:page_size]
+
+        if hacia_atras:
+            objetos.reverse()
+            hay_anterior, hay_siguiente = hay_mas, True
+        else:
+            hay_anterior, hay_siguiente = bool(token), hay_mas
+
+        pagina = PaginaPorCursor(
+            objetos,
+            token_anterior=self._crear_token(objetos[0], True) if hay_anterior and objetos else None,
+            token_siguiente=self._crear_token(objetos[-1], False) if hay_siguiente and objetos else None,
+            total_aproximado=total,
+        )
+
+        return (None, pagina, pagina.object_list, pagina.has_other_pages())
@@ -0,0 +1,116 @@
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import date, timedelta
+from itertools import groupby, islice
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.template.loader import render_to_string
+
+from catalogo.models import InstanciaDeLibro
+
+DIAS_DE_ANTICIPACION = 3
+TAMANO_DE_BLOQUE = 2000
+MENSAJES_POR_LOTE = 100
+HILOS = 4
+
+
+def prestamos_por_usuario(fecha, dias_de_anticipacion=DIAS_DE_ANTICIPACION, tamano_de_bloque=TAMANO_DE_BLOQUE):
+    """Recorre por bloques los prestamos atrasados o por vencer y los agrupa por usuario.
+
+    Genera tuplas (usuario, prestamos) donde 'usuario' es (username, email, nombre)
+    y 'prestamos' una lista de (titulo, fecha_de_devolucion).
+    """
+    filas = InstanciaDeLibro.objects.prestados().filter(
+        fecha_de_devolucion__lte=fecha + timedelta(days=dias_de_anticipacion),
+        prestatario__isnull=False,
+    ).exclude(prestatario__email='').order_by('prestatario_id', 'fecha_de_devolucion', 'id').values_list(
+        'prestatario_id', 'prestatario__username', 'prestatario__email', 'prestatario__first_name',
+        'libro__titulo', 'fecha_de_devolucion',
+    ).iterator(chunk_size=tamano_de_bloque)
+
+    for _, grupo in groupby(filas, key=lambda fila: fila[0]):
+        grupo = list(grupo)
+        usuario = grupo[0][1:4]
+        yield usuario, [(titulo, fecha_de_devolucion) for *_, titulo, fecha_de_devolucion in grupo]
+
+
+def crear_mensaje(usuario, prestamos, fecha):
+    """Arma el resumen de un usuario con sus prestamos atrasados y los que vencen pronto"""
+    username, email, nombre = usuario
+    contexto = {
+        'nombre': nombre or username,
+        'atrasados': [prestamo for prestamo in prestamos if prestamo[1] < fecha],
+        'por_vencer': [prestamo for prestamo in prestamos if prestamo[1] >= fecha],
+    }
+    asunto = 'Tienes libros atrasados' if contexto['atrasados'] else 'Tus libros vencen pronto'
+    cuerpo = render_to_string('libros/recordatorio_de_devolucion.txt', contexto)
+
+    return EmailMessage(asunto, cuerpo, settings.DEFAULT_FROM_EMAIL, [email])
+
+
+class Enviador:
+    """Envia lotes de mensajes desde varios hilos.
+
+    Cada hilo abre una sola conexion al servidor de correo y la reutiliza para
+    todos sus lotes; las conexiones SMTP no se pueden compartir entre hilos.
+    """
+
+    def __init__(self, fail_silently=False):
+        self.fail_silently = fail_silently
+        self.local = threading.local()
+        self.conexiones = []
+        self.candado = threading.Lock()
+
+    def _conexion(self):
+        conexion = getattr(self.local, 'conexion', None)
+        if conexion is None:
+            conexion = get_connection(fail_silently=self.fail_silently)
+            conexion.open()
+            self.local.conexion = conexion
+            with self.candado:
+                self.conexiones.append(conexion)
+        return conexion
+
+    def enviar(self, mensajes):
+        return self._conexion().send_messages(mensajes) or 0
+
+    def cerrar(self):
+        for conexion in self.conexiones:
+            conexion.close()
+
+
+def enviar_recordatorios(fecha=None, dias_de_anticipacion=DIAS_DE_ANTICIPACION, mensajes_por_lote=MENSAJES_POR_LOTE,
+                         hilos=HILOS, fail_silently=False):
+    """Envia un resumen por usuario; devuelve la cantidad de mensajes enviados.
+
+    Los mensajes se generan a medida que se leen los prestamos y nunca hay mas
+    de 2 lotes por hilo esperando a ser enviados.
+    """
+    fecha = fecha or date.today()
+    mensajes = (
+        crear_mensaje(usuario, prestamos, fecha)
+        for usuario, prestamos in prestamos_por_usuario(fecha, dias_de_anticipacion)
+    )
+    enviador = Enviador(fail_silently=fail_silently)
+    enviados = 0
+    pendientes = set()
+
+    try:
+        with ThreadPoolExecutor(max_workers=hilos) as ejecutor:
+            while True:
+                lote = list(islice(mensajes, mensajes_por_lote))
+                if not lote:
+                    break
+
+                if len(pendientes) >= hilos * 2:
+                    terminados, pendientes = wait(pendientes, return_when=FIRST_COMPLETED)
+                    enviados += sum(futuro.result() for futuro in terminados)
+
+                pendientes.add(ejecutor.submit(enviador.enviar, lote))
+
+            enviados += sum(futuro.result() for futuro in pendientes)
+    finally:
+        enviador.cerrar()
+
+    return enviados
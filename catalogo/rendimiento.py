@@ -0,0 +1,320 @@
+import json
+import math
+import threading
+import time
+from datetime import date, timedelta
+from collections import namedtuple
+
+from django.contrib.auth.models import Permission, User
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Exists, OuterRef
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from catalogo.models import Autor, InstanciaDeLibro, Libro, Reserva, actualizar_disponibilidad
+from catalogo.urls import urlpatterns
+
+# 'usuario' es None (anonimo), 'lector' o 'staff'; 'argumentos' y 'datos' reciben las muestras y
+# se evaluan antes de medir, una vez por peticion
+Caso = namedtuple('Caso', 'metodo usuario argumentos datos', defaults=('GET', None, None, None))
+
+
+def _libro(muestras):
+    return (muestras['libro'],)
+
+
+def _autor(muestras):
+    return (muestras['autor'],)
+
+
+def _copia_prestada(muestras):
+    return (muestras['copia_prestada'],)
+
+
+def _reserva_nueva(muestras):
+    # Solo puede haber una reserva pendiente por persona y libro: cada peticion usa otro libro
+    libro_id = Libro.objects.filter(~Exists(Reserva.objects.filter(
+        libro=OuterRef('pk'), usuario_id=muestras['lector'], asignada__isnull=True,
+    ))).order_by('pk').values_list('pk', flat=True).first()
+    if libro_id is None:
+        raise ValueError('No quedan libros sin una reserva pendiente del lector para medir cancelar_reserva')
+
+    return (Reserva.objects.create(libro_id=libro_id, usuario_id=muestras['lector']).pk,)
+
+
+COPIAS_POR_LOTE = 20
+
+
+def _copias_nuevas(muestras, estatus):
+    """Crea copias del libro de muestra en 'estatus' para que cada peticion de un lote procese copias validas"""
+    prestada = estatus == 'p'
+    copias = InstanciaDeLibro.objects.bulk_create([
+        InstanciaDeLibro(
+            libro_id=muestras['libro'],
+            estatus=estatus,
+            prestatario_id=muestras['lector'] if prestada else None,
+            fecha_de_devolucion=date.today() + timedelta(weeks=1) if prestada else None,
+        )
+        for _ in range(COPIAS_POR_LOTE)
+    ])
+    actualizar_disponibilidad([(None, (muestras['libro'], estatus))] * len(copias))
+    return [str(copia.pk) for copia in copias]
+
+
+# Prestar y devolver en lote reciben copias nuevas en cada peticion; renovar no cambia el estatus y
+# puede repetir las mismas
+CASOS = {
+    'index': Caso(),
+    'buscar': Caso(datos={'q': 'sombra'}),
+    'libros': Caso(),
+    'libro_crear': Caso(usuario='staff'),
+    'detalle_del_libro': Caso(argumentos=_libro),
+    'libro_actualizar': Caso(usuario='staff', argumentos=_libro),
+    'libro_eliminar': Caso(usuario='staff', argumentos=_libro),
+    'reservar_libro': Caso('POST', 'lector', _libro),
+    'devolver_libro': Caso(usuario='staff', argumentos=_copia_prestada),
+    'renovar_libro': Caso(usuario='staff', argumentos=_copia_prestada),
+    'autores': Caso(),
+    'autor_crear': Caso(usuario='staff'),
+    'detalle_del_autor': Caso(argumentos=_autor),
+    'autor_actualizar': Caso(usuario='staff', argumentos=_autor),
+    'autor_eliminar': Caso(usuario='staff', argumentos=_autor),
+    'misprestamos': Caso(usuario='lector'),
+    'todoslosprestamos': Caso(usuario='staff'),
+    'prestamosatrasados': Caso(usuario='staff'),
+    'cancelar_reserva': Caso('POST', 'lector', _reserva_nueva),
+    'prestamo_crear': Caso(usuario='staff'),
+    'autocompletar': Caso(usuario='staff', argumentos=lambda muestras: ('libros',), datos={'q': 'som'}),
+    'api_lista': Caso(argumentos=lambda muestras: ('libros',)),
+    'api_detalle': Caso(argumentos=lambda muestras: ('libros', muestras['libro'])),
+    'reportes': Caso(usuario='staff'),
+    'exportar': Caso(usuario='staff', argumentos=lambda muestras: ('prestamos', 'csv')),
+    'prestar_en_lote': Caso('POST', 'staff', datos=lambda muestras: {
+        'ids': _copias_nuevas(muestras, 'd'), 'prestatario': muestras['lector'],
+    }),
+    'devolver_en_lote': Caso('POST', 'staff', datos=lambda muestras: {'ids': _copias_nuevas(muestras, 'p')}),
+    'renovar_en_lote': Caso('POST', 'staff', datos=lambda muestras: {
+        'ids': muestras['copias_prestadas'], 'fecha_de_devolucion': muestras['fecha_de_renovacion'],
+    }),
+}
+
+
+def percentil(valores, porcentaje):
+    """Percentil por el metodo del rango mas cercano; 'valores' debe estar ordenado"""
+    if not valores:
+        return 0
+    return valores[max(math.ceil(porcentaje / 100 * len(valores)) - 1, 0)]
+
+
+def preparar_muestras():
+    """Elige los objetos que usan los casos y crea el usuario de staff del benchmark"""
+    copia = InstanciaDeLibro.objects.filter(estatus='p').order_by('fecha_de_devolucion', 'id').first()
+    libro = Libro.objects.order_by('pk').first()
+    autor = Autor.objects.order_by('pk').first()
+    if copia is None or libro is None or autor is None:
+        raise ValueError('Se necesitan libros, autores y al menos una copia prestada')
+
+    staff, _ = User.objects.get_or_create(username='rendimiento_staff', defaults={'is_staff': True})
+    staff.user_permissions.add(Permission.objects.get(codename='can_mark_returned'))
+
+    def ids(estatus):
+        return [str(pk) for pk in InstanciaDeLibro.objects.filter(estatus=estatus).order_by('id')
+                .values_list('id', flat=True)[:COPIAS_POR_LOTE]]
+
+    return {
+        'libro': libro.pk,
+        'autor': autor.pk,
+        'copia_prestada': copia.pk,
+        'lector': copia.prestatario_id,
+        'staff': staff.pk,
+        'copias_prestadas': ids('p'),
+        'fecha_de_renovacion': (date.today() + timedelta(weeks=2)).isoformat(),
+    }
+
+
+def _cliente(caso, muestras):
+    cliente = Client()
+    if caso.usuario:
+        cliente.force_login(User.objects.get(pk=muestras[caso.usuario]))
+    return cliente
+
+
+def _peticiones(nombre, caso, muestras, cantidad):
+    """Devuelve (url, datos) de cada peticion, preparadas antes de empezar a medir"""
+    peticiones = []
+    for _ in range(cantidad):
+        argumentos = caso.argumentos(muestras) if caso.argumentos else ()
+        datos = caso.datos(muestras) if callable(caso.datos) else caso.datos
+        peticiones.append((reverse(nombre, args=argumentos), datos))
+    return peticiones
+
+
+def _pedir(cliente, caso, url, datos):
+    if caso.metodo == 'POST' and isinstance(datos, dict) and 'ids' in datos:
+        response = cliente.post(url, json.dumps(datos), content_type='application/json')
+    elif caso.metodo == 'POST':
+        response = cliente.post(url, datos or {})
+    else:
+        response = cliente.get(url, datos or {})
+
+    tamano = len(b''.join(response.streaming_content)) if response.streaming else len(response.content)
+    return response.status_code, tamano
+
+
+def _carga(caso, muestras, peticiones, concurrencia):
+    """Reparte las peticiones entre 'concurrencia' hilos, cada uno con su cliente; devuelve (segundos, errores)"""
+    errores = []
+    grupos = [peticiones[hilo::concurrencia] for hilo in range(concurrencia)]
+    clientes = [_cliente(caso, muestras) for _ in grupos]
+
+    def trabajar(cliente, grupo):
+        for url, datos in grupo:
+            try:
+                estado, _ = _pedir(cliente, caso, url, datos)
+            except Exception:
+                estado = 500
+            if estado >= 500:
+                errores.append(estado)
+
+    inicio = time.perf_counter()
+    if concurrencia == 1:
+        trabajar(clientes[0], grupos[0])
+    else:
+        hilos = [threading.Thread(target=trabajar, args=par) for par in zip(clientes, grupos)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+    return time.perf_counter() - inicio, len(errores)
+
+
+def medir_caso(nombre, caso, muestras, peticiones=50, concurrencia=8):
+    """Mide una URL: consultas en frio y en caliente, latencia de peticiones seguidas y rendimiento concurrente"""
+    frio, caliente, *seguidas = _peticiones(nombre, caso, muestras, peticiones + 2)
+    carga = _peticiones(nombre, caso, muestras, peticiones)
+    cliente = _cliente(caso, muestras)
+    cache.clear()
+
+    # Las consultas capturadas se leen del registro de la conexion, que cada peticion siguiente vacia
+    with CaptureQueriesContext(connection) as capturadas:
+        estado, tamano = _pedir(cliente, caso, *frio)
+    consultas_en_frio = len(capturadas)
+    with CaptureQueriesContext(connection) as capturadas:
+        _pedir(cliente, caso, *caliente)
+    consultas = len(capturadas)
+
+    tiempos = []
+    for url, datos in seguidas:
+        inicio = time.perf_counter()
+        _pedir(cliente, caso, url, datos)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    tiempos.sort()
+
+    segundos, errores = _carga(caso, muestras, carga, concurrencia)
+
+    return {
+        'estado': estado,
+        'bytes': tamano,
+        'consultas_en_frio': consultas_en_frio,
+        'consultas': consultas,
+        'latencia_ms': {
+            'p50': round(percentil(tiempos, 50), 2),
+            'p90': round(percentil(tiempos, 90), 2),
+            'p99': round(percentil(tiempos, 99), 2),
+            'media': round(sum(tiempos) / len(tiempos), 2),
+        },
+        'peticiones_por_segundo': round(peticiones / segundos, 1),
+        'errores': errores,
+    }
+
+
+def medir(peticiones=50, concurrencia=8, nombres=None, al_medir=None):
+    """Mide todas las URLs con nombre de catalogo/urls.py (o solo 'nombres'), en el orden en que se declaran"""
+    muestras = preparar_muestras()
+    resultados = {}
+
+    for patron in urlpatterns:
+        if patron.name not in CASOS or (nombres and patron.name not in nombres):
+            continue
+        resultados[patron.name] = medir_caso(patron.name, CASOS[patron.name], muestras, peticiones, concurrencia)
+        if al_medir:
+            al_medir(patron.name, resultados[patron.name])
+
+    return resultados
+
+
+# Vistas de prestamos que se ejecutan a la vez en medir_mezcla
+LECTURAS_DE_PRESTAMOS = ('misprestamos', 'todoslosprestamos', 'prestamosatrasados')
+ESCRITURAS_DE_PRESTAMOS = ('renovar_en_lote', 'reservar_libro')
+
+
+def _resumen(tiempos, errores, segundos):
+    tiempos.sort()
+    return {
+        'peticiones_por_segundo': round(len(tiempos) / segundos, 1) if segundos else 0,
+        'latencia_ms': {
+            'p50': round(percentil(tiempos, 50), 2),
+            'p95': round(percentil(tiempos, 95), 2),
+            'p99': round(percentil(tiempos, 99), 2),
+        },
+        'errores': errores,
+    }
+
+
+def medir_mezcla(peticiones=50, lectores=6, escritores=2):
+    """Ejecuta a la vez las lecturas y las escrituras de prestamos, como varios workers sobre la misma base.
+
+    Cada hilo tiene su cliente y su conexion y hace 'peticiones' peticiones repartidas entre las URLs
+    de su grupo. Devuelve peticiones por segundo, percentiles de latencia y errores de cada grupo;
+    una peticion que tarda mas de lo que la base espera un candado termina en error.
+    """
+    muestras = preparar_muestras()
+    grupos = {'lecturas': (LECTURAS_DE_PRESTAMOS, lectores), 'escrituras': (ESCRITURAS_DE_PRESTAMOS, escritores)}
+    tiempos = {grupo: [] for grupo in grupos}
+    errores = {grupo: 0 for grupo in grupos}
+    fin = {grupo: 0 for grupo in grupos}
+    candado = threading.Lock()
+
+    trabajos = []
+    for grupo, (nombres, hilos) in grupos.items():
+        for hilo in range(hilos):
+            # Un cliente por URL y por hilo, con la sesion iniciada antes de medir
+            clientes = {nombre: _cliente(CASOS[nombre], muestras) for nombre in nombres}
+            lista = []
+            for numero in range(peticiones):
+                nombre = nombres[(hilo + numero) % len(nombres)]
+                lista.append((clientes[nombre], CASOS[nombre], *_peticiones(nombre, CASOS[nombre], muestras, 1)[0]))
+            trabajos.append((grupo, lista))
+    cache.clear()
+    salida = threading.Barrier(len(trabajos) + 1)
+
+    def trabajar(grupo, lista):
+        propios, fallidas = [], 0
+        salida.wait()
+        for cliente, caso, url, datos in lista:
+            inicio = time.perf_counter()
+            try:
+                estado, _ = _pedir(cliente, caso, url, datos)
+            except Exception:
+                estado = 500
+            if estado >= 500:
+                fallidas += 1
+            else:
+                propios.append((time.perf_counter() - inicio) * 1000)
+        with candado:
+            tiempos[grupo] += propios
+            errores[grupo] += fallidas
+            fin[grupo] = max(fin[grupo], time.perf_counter())
+
+    hilos = [threading.Thread(target=trabajar, args=trabajo) for trabajo in trabajos]
+    for hilo in hilos:
+        hilo.start()
+    salida.wait()
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.join()
+
+    return {grupo: _resumen(tiempos[grupo], errores[grupo], fin[grupo] - inicio) for grupo in grupos if grupos[grupo][1]}
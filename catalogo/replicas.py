@@ -0,0 +1,106 @@
+import random
+import time
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Sesiones que escribieron hace poco leen de la primaria hasta este momento (time.time())
+CLAVE_DE_SESION = 'catalogo_primaria_hasta'
+METODOS_DE_LECTURA = ('GET', 'HEAD')
+
+# Estado de la peticion en curso; se copia a los hilos de las vistas asincronas junto con el contexto
+_estado = ContextVar('replicas', default=None)
+
+
+class Estado:
+    def __init__(self, primaria):
+        # 'replica' la activa la vista (en_replica); 'primaria' la fuerza la peticion y tiene prioridad
+        self.replica = False
+        self.primaria = primaria
+        # Replica elegida en la primera lectura: todas las consultas de la peticion ven el mismo atraso
+        self.alias = None
+
+
+class EnrutadorDeReplicas:
+    """Envia las lecturas de los modelos del catalogo de las vistas marcadas con en_replica a una replica.
+
+    Todo lo demas usa la base principal: las escrituras, las lecturas dentro de una transaccion, las
+    peticiones que no son GET o HEAD, las sesiones que escribieron hace menos de RETRASO_DE_REPLICAS
+    segundos y los modelos de otras aplicaciones (sesiones y usuarios recien creados).
+    """
+
+    def db_for_read(self, model, **hints):
+        estado = _estado.get()
+        if (estado is None or not estado.replica or estado.primaria or model._meta.app_label != 'catalogo'
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return None
+        if estado.alias is None:
+            estado.alias = random.choice(settings.REPLICAS_DE_LECTURA)
+        return estado.alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Las replicas tienen los mismos datos que la principal
+        bases = {DEFAULT_DB_ALIAS, *settings.REPLICAS_DE_LECTURA}
+        if obj1._state.db in bases and obj2._state.db in bases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        if db in settings.REPLICAS_DE_LECTURA:
+            return False
+        return None
+
+
+def en_replica(vista):
+    """Decorator para vistas de solo lectura del catalogo cuyas consultas pueden ir a una replica"""
+    @wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        estado = _estado.get()
+        if estado is not None:
+            estado.replica = True
+        return vista(request, *args, **kwargs)
+
+    return envoltura
+
+
+def primaria_si_cambio_desde(marca):
+    """Lee de la principal si los datos cambiaron despues de 'marca' menos el retraso de las replicas.
+
+    Una replica atrasada devolveria el contenido anterior con el ETag y la clave de cache de la
+    version nueva, y esa pagina quedaria guardada hasta el siguiente cambio.
+    """
+    estado = _estado.get()
+    if estado is not None and marca > time.time() - settings.RETRASO_DE_REPLICAS:
+        estado.primaria = True
+
+
+class MiddlewareDeReplicas:
+    """Marca la peticion para el enrutador y fija la sesion a la principal despues de escribir.
+
+    Se considera escritura cualquier peticion que no sea GET o HEAD: Django tambien pide la base de
+    escritura para abrir transacciones en vistas que solo leen, como las del admin.
+    """
+
+    def __init__(self, get_response):
+        if not settings.REPLICAS_DE_LECTURA:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        escritura = request.method not in METODOS_DE_LECTURA
+        estado = Estado(primaria=escritura or request.session.get(CLAVE_DE_SESION, 0) > time.time())
+        token = _estado.set(estado)
+        try:
+            response = self.get_response(request)
+        finally:
+            _estado.reset(token)
+
+        if escritura and response.status_code < 400:
+            request.session[CLAVE_DE_SESION] = time.time() + settings.RETRASO_DE_REPLICAS
+        return response
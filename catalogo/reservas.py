@@ -0,0 +1,62 @@
+from datetime import date, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from catalogo.models import Reserva
+
+PLAZO_PARA_RETIRAR = timedelta(weeks=1)
+
+
+def siguiente_reserva(libro_id):
+    """Bloquea la primera reserva pendiente del libro.
+
+    Con skip_locked, dos devoluciones simultaneas del mismo libro toman
+    reservas distintas en lugar de esperar o asignar la misma dos veces.
+    """
+    return Reserva.objects.select_for_update(skip_locked=True).filter(
+        libro_id=libro_id,
+        asignada__isnull=True,
+    ).order_by('creada', 'id').first()
+
+
+def cambios_para_apartar(reserva):
+    """Campos de la copia que queda apartada para la persona de la reserva"""
+    return {
+        'estatus': 'r',
+        'prestatario_id': reserva.usuario_id,
+        'fecha_de_devolucion': date.today() + PLAZO_PARA_RETIRAR,
+    }
+
+
+def marcar_asignada(reserva, copia):
+    reserva.instancia = copia
+    reserva.asignada = timezone.now()
+    reserva.save(update_fields=['instancia', 'asignada'])
+
+
+def asignar_a_reserva(copia):
+    """Aparta la copia para la primera persona en la fila de su libro.
+
+    Debe llamarse dentro de una transaccion, con la copia ya bloqueada y antes
+    de guardarla. Devuelve la reserva asignada o None si nadie estaba esperando.
+    """
+    if copia.libro_id is None:
+        return None
+
+    reserva = siguiente_reserva(copia.libro_id)
+    if reserva is not None:
+        for campo, valor in cambios_para_apartar(reserva).items():
+            setattr(copia, campo, valor)
+        marcar_asignada(reserva, copia)
+
+    return reserva
+
+
+def posicion_en_la_fila(reserva):
+    """Cantidad de reservas pendientes del libro hasta esta, incluida"""
+    return Reserva.objects.filter(
+        Q(creada__lt=reserva.creada) | Q(creada=reserva.creada, id__lt=reserva.id),
+        libro_id=reserva.libro_id,
+        asignada__isnull=True,
+    ).count() + 1
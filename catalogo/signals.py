@@ -0,0 +1,184 @@
+from django.db.models.signals import post_save, post_delete, pre_save, pre_delete, m2m_changed, post_migrate
+from django.db.backends.signals import connection_created
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.dispatch import receiver, Signal
+
+from catalogo import autocompletar, busqueda, sqlite
+from catalogo.contadores import invalidar_contadores
+from catalogo.models import Libro, Autor, InstanciaDeLibro, Genero, Lenguaje, actualizar_disponibilidad
+from catalogo.versiones import incrementar_version, incrementar_version_de_objetos
+
+# Se envia despues de actualizar copias en bloque (bulk_update no envia post_save)
+prestamos_actualizados = Signal()
+
+
+@receiver(post_save, sender=Libro)
+@receiver(post_delete, sender=Libro)
+@receiver(post_save, sender=Autor)
+@receiver(post_delete, sender=Autor)
+@receiver(post_save, sender=InstanciaDeLibro)
+@receiver(post_delete, sender=InstanciaDeLibro)
+def actualizar_contadores(sender, **kwargs):
+    """Invalida los contadores de la pagina principal cuando cambia alguno de los modelos contados"""
+    invalidar_contadores()
+
+
+@receiver(post_save, sender=Libro)
+@receiver(post_delete, sender=Libro)
+@receiver(post_save, sender=Autor)
+@receiver(post_delete, sender=Autor)
+@receiver(post_save, sender=InstanciaDeLibro)
+@receiver(post_delete, sender=InstanciaDeLibro)
+@receiver(post_save, sender=Genero)
+@receiver(post_delete, sender=Genero)
+@receiver(post_save, sender=Lenguaje)
+@receiver(post_delete, sender=Lenguaje)
+def actualizar_version(sender, **kwargs):
+    """Cambia la version del modelo para invalidar los ETags y las paginas guardadas en la cache"""
+    incrementar_version(sender)
+
+
+@receiver(m2m_changed, sender=Libro.genero.through)
+def actualizar_version_de_generos(sender, action, **kwargs):
+    if action.startswith('post_'):
+        incrementar_version(Libro)
+
+
+@receiver(pre_save, sender=Libro)
+def recordar_autor_anterior(sender, instance, using, update_fields, **kwargs):
+    """Guarda el autor anterior del libro para invalidar tambien su bibliografia si cambia"""
+    if not instance._state.adding and (update_fields is None or 'autor' in update_fields):
+        instance._autor_anterior = sender.objects.using(using).filter(pk=instance.pk).values_list(
+            'autor_id', flat=True,
+        ).first()
+
+
+@receiver(post_save, sender=Libro)
+@receiver(post_delete, sender=Libro)
+def invalidar_fragmentos_del_libro(sender, instance, **kwargs):
+    """Invalida los fragmentos guardados del detalle del libro y de la bibliografia de su autor"""
+    incrementar_version_de_objetos(Libro, [instance.pk])
+    incrementar_version_de_objetos(Autor, {instance.autor_id, getattr(instance, '_autor_anterior', None)})
+
+
+@receiver(post_save, sender=Autor)
+@receiver(post_delete, sender=Autor)
+def invalidar_fragmentos_del_autor(sender, instance, **kwargs):
+    incrementar_version_de_objetos(Autor, [instance.pk])
+
+
+@receiver(post_save, sender=InstanciaDeLibro)
+@receiver(post_delete, sender=InstanciaDeLibro)
+def invalidar_fragmentos_de_la_copia(sender, instance, **kwargs):
+    # InstanciaDeLibro.save recuerda el libro anterior si la copia se cambio de libro
+    incrementar_version_de_objetos(Libro, {instance.libro_id, getattr(instance, '_libro_anterior', None)})
+
+
+@receiver(m2m_changed, sender=Libro.genero.through)
+def invalidar_fragmentos_de_generos(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        if not reverse:
+            ids = [instance.pk]
+        elif pk_set is not None:
+            ids = pk_set
+        else:
+            ids = getattr(instance, '_libros_a_reindexar', [])
+        incrementar_version_de_objetos(Libro, ids)
+
+
+@receiver(post_delete, sender=InstanciaDeLibro)
+def descontar_copia_eliminada(sender, instance, using, **kwargs):
+    actualizar_disponibilidad([((instance.libro_id, instance.estatus), None)], using=using)
+
+
+@receiver(prestamos_actualizados)
+def actualizar_caches_de_prestamos(sender, instancias, **kwargs):
+    invalidar_contadores()
+    incrementar_version(InstanciaDeLibro)
+    incrementar_version_de_objetos(Libro, {instancia.libro_id for instancia in instancias})
+
+
+@receiver(post_migrate)
+def crear_indice_de_busqueda(sender, app_config, using, **kwargs):
+    """Crea las tablas del indice de texto completo y de prefijos, que no son manejadas por los modelos"""
+    if app_config.name == 'catalogo':
+        busqueda.crear_indice(using=using)
+        autocompletar.crear_indice(using=using)
+
+
+@receiver(post_save, sender=Libro)
+def indexar_libro(sender, instance, using, **kwargs):
+    busqueda.indexar_libros([instance.pk], using=using)
+
+
+@receiver(post_delete, sender=Libro)
+def desindexar_libro(sender, instance, using, **kwargs):
+    busqueda.eliminar_libros([instance.pk], using=using)
+
+
+@receiver(pre_delete, sender=Autor)
+@receiver(pre_delete, sender=Genero)
+def recordar_libros_relacionados(sender, instance, using, **kwargs):
+    """Guarda los libros de un autor o genero antes de que la relacion desaparezca"""
+    instance._libros_a_reindexar = list(instance.libro_set.using(using).values_list('pk', flat=True))
+
+
+@receiver(m2m_changed, sender=Libro.genero.through)
+def indexar_generos_del_libro(sender, instance, action, reverse, pk_set, using, **kwargs):
+    if reverse and action == 'pre_clear':
+        recordar_libros_relacionados(sender, instance, using)
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        if not reverse:
+            ids = [instance.pk]
+        elif pk_set is not None:
+            ids = pk_set
+        else:
+            ids = instance._libros_a_reindexar
+        busqueda.indexar_libros(ids, using=using)
+
+
+@receiver(post_save, sender=Autor)
+@receiver(post_save, sender=Genero)
+def indexar_libros_relacionados(sender, instance, using, created, **kwargs):
+    if not created:
+        busqueda.indexar_libros(instance.libro_set.using(using).values_list('pk', flat=True), using=using)
+
+
+@receiver(post_delete, sender=Autor)
+@receiver(post_delete, sender=Genero)
+def indexar_libros_huerfanos(sender, instance, using, **kwargs):
+    busqueda.indexar_libros(getattr(instance, '_libros_a_reindexar', []), using=using)
+
+
+TIPOS_DE_AUTOCOMPLETADO = {modelo: tipo for tipo, (modelo, campos, formato) in autocompletar.FUENTES.items()}
+
+
+@receiver(post_save, sender=Libro)
+@receiver(post_save, sender=Autor)
+@receiver(post_save, sender=Lenguaje)
+@receiver(post_save, sender=User)
+def indexar_prefijos(sender, instance, using, update_fields, **kwargs):
+    # Cada inicio de sesion guarda last_login, que no cambia las sugerencias
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    autocompletar.indexar(TIPOS_DE_AUTOCOMPLETADO[sender], [instance.pk], using=using)
+    if sender is User:
+        incrementar_version(User)
+
+
+@receiver(post_delete, sender=Libro)
+@receiver(post_delete, sender=Autor)
+@receiver(post_delete, sender=Lenguaje)
+@receiver(post_delete, sender=User)
+def eliminar_prefijos(sender, instance, using, **kwargs):
+    autocompletar.eliminar(TIPOS_DE_AUTOCOMPLETADO[sender], [instance.pk], using=using)
+    if sender is User:
+        incrementar_version(User)
+
+
+@receiver(connection_created)
+def configurar_sqlite(sender, connection, **kwargs):
+    """Aplica los pragmas del perfil de rendimiento a cada conexion nueva de SQLite"""
+    if settings.SQLITE_OPTIMIZADO and connection.vendor == 'sqlite':
+        sqlite.aplicar_pragmas(connection)
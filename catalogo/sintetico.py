@@ -0,0 +1,233 @@
+import random
+import uuid
+from datetime import date, timedelta
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from catalogo import autocompletar
+from catalogo.busqueda import reconstruir_indice
+from catalogo.contadores import invalidar_contadores
+from catalogo.models import Autor, Genero, InstanciaDeLibro, Lenguaje, Libro, Prestamo
+from catalogo.versiones import incrementar_version
+
+TAMANO_DE_LOTE = 5000
+CACHE_DE_SQLITE_KB = 256 * 1024
+CONTRASENA = 'usertest'
+
+LENGUAJES = ('Español', 'Inglés', 'Francés', 'Alemán', 'Italiano', 'Portugués', 'Catalán', 'Latín')
+GENEROS = (
+    'Ficción', 'Ciencia Ficción', 'Fantasía', 'Misterio', 'Historia', 'Biografía', 'Poesía', 'Ensayo',
+    'Filosofía', 'Ciencia', 'Infantil', 'Juvenil', 'Terror', 'Romance', 'Viajes', 'Cocina',
+)
+PALABRAS = (
+    'sombra', 'viento', 'ciudad', 'libro', 'memoria', 'noche', 'río', 'tiempo', 'casa', 'mar', 'camino',
+    'silencio', 'fuego', 'jardín', 'luz', 'piedra', 'sueño', 'invierno', 'voz', 'puerta', 'isla', 'norte',
+)
+NOMBRES = ('Ana', 'Carlos', 'Lucía', 'Jorge', 'María', 'Pedro', 'Elena', 'Manuel', 'Sofía', 'Andrés', 'Julia', 'Tomás')
+APELLIDOS = ('García', 'Pérez', 'López', 'Torres', 'Ramírez', 'Flores', 'Castro', 'Vargas', 'Rojas', 'Mendoza')
+
+# Exponentes de Zipf de la cantidad de libros por autor y de prestamos por usuario
+EXPONENTE_DE_AUTORES = 0.7
+EXPONENTE_DE_LECTORES = 0.5
+# La fraccion prestada de las copias de cada libro sigue una Pareto: la mayoria casi no se presta
+# y unos pocos libros tienen casi todas sus copias fuera (en promedio una de cada cuatro)
+ALFA_DE_POPULARIDAD = 2.5
+ESCALA_DE_POPULARIDAD = 0.15
+MAXIMO_PRESTADO = 0.9
+EN_MANTENIMIENTO = 0.05
+# Cada copia prestada se presto este tiempo antes de su fecha de devolucion, como en circulacion.prestar
+DURACION_DE_PRESTAMOS = timedelta(weeks=3)
+
+
+def zipf(cantidad, exponente):
+    """Pesos acumulados de una distribucion de Zipf, para random.choices(cum_weights=...)"""
+    return list(accumulate(1 / rango ** exponente for rango in range(1, cantidad + 1)))
+
+
+def _siguiente_pk(modelo, using):
+    # Los pks se asignan antes de insertar para relacionar los objetos sin volver a consultarlos
+    return (modelo.objects.using(using).aggregate(maximo=Max('pk'))['maximo'] or 0) + 1
+
+
+def _en_lotes(objetos, modelo, tamano_de_lote, using):
+    lote = []
+    for objeto in objetos:
+        lote.append(objeto)
+        if len(lote) >= tamano_de_lote:
+            modelo.objects.using(using).bulk_create(lote)
+            lote = []
+    if lote:
+        modelo.objects.using(using).bulk_create(lote)
+
+
+def _insertar(modelo, campos, filas, using):
+    """Inserta filas ya convertidas a valores de la base de datos con un solo executemany.
+
+    En las tablas grandes es varias veces mas rapido que bulk_create, que crea una instancia del
+    modelo por fila y en SQLite compila una sentencia distinta cada 999 parametros.
+    """
+    conexion = connections[using]
+    columnas = ', '.join(conexion.ops.quote_name(modelo._meta.get_field(campo).column) for campo in campos)
+    sql = (f'INSERT INTO {conexion.ops.quote_name(modelo._meta.db_table)} ({columnas}) '
+           f'VALUES ({", ".join(["%s"] * len(campos))})')
+    with conexion.cursor() as cursor:
+        cursor.executemany(sql, filas)
+
+
+def _nombres(modelo, nombres, using):
+    existentes = dict(modelo.objects.using(using).filter(nombre__in=nombres).values_list('nombre', 'pk'))
+    modelo.objects.using(using).bulk_create([modelo(nombre=nombre) for nombre in nombres if nombre not in existentes])
+    return list(modelo.objects.using(using).filter(nombre__in=nombres).order_by('pk').values_list('pk', flat=True))
+
+
+class Generador:
+    """Genera las filas de libros, generos, copias y prestamos por lotes a partir de una semilla"""
+
+    def __init__(self, azar, copias_por_libro, autores, lectores, lenguajes, generos, using):
+        conexion = connections[using]
+        self.azar = azar
+        self.copias_por_libro = copias_por_libro
+        self.autores = list(autores)
+        self.pesos_de_autores = zipf(len(self.autores), EXPONENTE_DE_AUTORES)
+        self.lectores = list(lectores)
+        self.pesos_de_lectores = zipf(len(self.lectores), EXPONENTE_DE_LECTORES)
+        self.lenguajes = lenguajes
+        self.generos = generos
+        self.preparar_uuid = lambda valor: InstanciaDeLibro._meta.pk.get_db_prep_value(valor, conexion)
+        # Las fechas se convierten una sola vez al formato de la base de datos; cada fecha de devolucion
+        # tiene la fecha de su prestamo en la misma posicion
+        hoy = date.today()
+        ahora = timezone.now()
+        self.fechas = [conexion.ops.adapt_datefield_value(hoy + timedelta(days=dias)) for dias in range(-30, 22)]
+        self.fechas_de_prestamo = [
+            conexion.ops.adapt_datetimefield_value(ahora + timedelta(days=dias) - DURACION_DE_PRESTAMOS)
+            for dias in range(-30, 22)
+        ]
+
+    def lote(self, primer_libro, cantidad):
+        azar = self.azar
+        libros, relaciones, copias, prestamos = [], [], [], []
+        autores = azar.choices(self.autores, cum_weights=self.pesos_de_autores, k=cantidad)
+        # uuid4 tomados del mismo generador para que las copias tambien sean reproducibles; ordenados,
+        # cada lote se inserta en el indice de la clave primaria como un bloque contiguo
+        ids_de_copias = sorted(
+            self.preparar_uuid(uuid.UUID(int=azar.getrandbits(128), version=4))
+            for _ in range(cantidad * self.copias_por_libro)
+        )
+
+        for numero, (pk, autor) in enumerate(zip(range(primer_libro, primer_libro + cantidad), autores)):
+            relaciones += [(pk, genero) for genero in azar.sample(self.generos, azar.randint(1, 3))]
+
+            prestado = min(ESCALA_DE_POPULARIDAD * azar.paretovariate(ALFA_DE_POPULARIDAD), MAXIMO_PRESTADO)
+            conteos = {'d': 0, 'p': 0, 'm': 0}
+            for id_de_copia in ids_de_copias[numero * self.copias_por_libro:(numero + 1) * self.copias_por_libro]:
+                valor = azar.random()
+                if valor < prestado and self.lectores:
+                    lector = azar.choices(self.lectores, cum_weights=self.pesos_de_lectores)[0]
+                    fecha = azar.randrange(len(self.fechas))
+                    copias.append((id_de_copia, pk, 'p', lector, self.fechas[fecha]))
+                    # El historial (y los reportes que lo resumen) deben ver el prestamo de cada copia prestada
+                    prestamos.append((self.fechas_de_prestamo[fecha], id_de_copia, pk, lector, 'd', 'p', self.fechas[fecha]))
+                    conteos['p'] += 1
+                elif valor < prestado + EN_MANTENIMIENTO:
+                    copias.append((id_de_copia, pk, 'm', None, self.fechas[-1]))
+                    conteos['m'] += 1
+                else:
+                    copias.append((id_de_copia, pk, 'd', None, None))
+                    conteos['d'] += 1
+
+            libros.append((
+                pk,
+                ' '.join(azar.choices(PALABRAS, k=azar.randint(2, 5))).capitalize(),
+                ' '.join(azar.choices(PALABRAS, k=30)),
+                str(9780000000000 + pk),
+                autor,
+                azar.choice(self.lenguajes),
+                self.copias_por_libro, conteos['d'], conteos['p'], conteos['m'], 0,
+            ))
+
+        return libros, relaciones, copias, prestamos
+
+
+def generar(libros, copias_por_libro=5, usuarios=1000, semilla=0, tamano_de_lote=TAMANO_DE_LOTE, indexar=True,
+            using=DEFAULT_DB_ALIAS):
+    """Agrega un catalogo sintetico determinista: la misma semilla sobre la misma base genera los mismos datos.
+
+    Los autores mas productivos y los lectores mas activos siguen una distribucion de Zipf y la
+    popularidad de los libros una de Pareto. Con 'indexar' se reconstruyen al final los indices de
+    busqueda y de autocompletado, que en catalogos grandes tardan mas que la generacion.
+    Devuelve la cantidad de objetos creados de cada tipo.
+    """
+    azar = random.Random(semilla)
+    conexion = connections[using]
+
+    with transaction.atomic(using=using):
+        if conexion.vendor == 'sqlite':
+            # Con la cache por defecto (2 MB) los indices de las copias se escriben a disco una y otra vez
+            with conexion.cursor() as cursor:
+                cursor.execute(f'PRAGMA cache_size = -{CACHE_DE_SQLITE_KB}')
+
+        lenguajes = _nombres(Lenguaje, LENGUAJES, using)
+        generos = _nombres(Genero, GENEROS, using)
+
+        # Todos los usuarios comparten la contraseña: el hash, lento a proposito, se calcula una vez
+        primer_usuario = _siguiente_pk(User, using)
+        contrasena = make_password(CONTRASENA)
+        _en_lotes((
+            User(pk=primer_usuario + n, username=f'lector{primer_usuario + n}', password=contrasena)
+            for n in range(usuarios)
+        ), User, tamano_de_lote, using)
+
+        primer_autor = _siguiente_pk(Autor, using)
+        num_autores = max(libros // 8, 1)
+        _en_lotes((
+            Autor(pk=primer_autor + n, nombre=azar.choice(NOMBRES), apellido=f'{azar.choice(APELLIDOS)} {primer_autor + n}')
+            for n in range(num_autores)
+        ), Autor, tamano_de_lote, using)
+
+        generador = Generador(
+            azar,
+            copias_por_libro,
+            autores=range(primer_autor, primer_autor + num_autores),
+            lectores=range(primer_usuario, primer_usuario + usuarios),
+            lenguajes=lenguajes,
+            generos=generos,
+            using=using,
+        )
+        primer_libro = _siguiente_pk(Libro, using)
+        for inicio in range(0, libros, tamano_de_lote):
+            filas, relaciones, copias, prestamos = generador.lote(primer_libro + inicio, min(tamano_de_lote, libros - inicio))
+            _insertar(Libro, (
+                'id', 'titulo', 'resumen', 'isbn', 'autor', 'lenguaje',
+                'num_copias', 'num_disponibles', 'num_prestadas', 'num_en_mantenimiento', 'num_reservadas',
+            ), filas, using)
+            _insertar(Libro.genero.through, ('libro', 'genero'), relaciones, using)
+            _insertar(InstanciaDeLibro, ('id', 'libro', 'estatus', 'prestatario', 'fecha_de_devolucion'), copias, using)
+            _insertar(Prestamo, (
+                'fecha', 'instancia', 'libro', 'prestatario', 'estatus_anterior', 'estatus', 'fecha_de_devolucion',
+            ), prestamos, using)
+
+        # Con pks explicitos las secuencias (PostgreSQL) no avanzan solas
+        with conexion.cursor() as cursor:
+            for sql in conexion.ops.sequence_reset_sql(no_style(), [User, Autor, Libro]):
+                cursor.execute(sql)
+
+    if indexar:
+        reconstruir_indice(using=using)
+        autocompletar.reconstruir(using=using)
+    invalidar_contadores()
+    for modelo in (Libro, Autor, Lenguaje, Genero, InstanciaDeLibro, User):
+        incrementar_version(modelo)
+
+    return {
+        'usuarios': usuarios,
+        'autores': num_autores,
+        'libros': libros,
+        'copias': libros * copias_por_libro,
+    }
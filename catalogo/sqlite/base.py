@@ -0,0 +1,13 @@
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """Backend de SQLite que abre las transacciones con BEGIN IMMEDIATE.
+
+    Con BEGIN la transaccion toma el candado de escritura recien en su primer UPDATE, y si otra
+    conexion escribio mientras tanto SQLite falla de inmediato sin respetar busy_timeout. Tomandolo
+    al empezar, las escrituras concurrentes esperan su turno.
+    """
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN IMMEDIATE')
@@ -0,0 +1,38 @@
+// Agrega un campo de busqueda a cada <select data-autocompletar> y llena sus opciones con el endpoint JSON
+document.addEventListener('DOMContentLoaded', function () {
+  document.querySelectorAll('select[data-autocompletar]').forEach(function (select) {
+    var buscador = document.createElement('input');
+    var espera = null;
+
+    buscador.type = 'search';
+    buscador.placeholder = 'Buscar...';
+    buscador.setAttribute('aria-label', 'Buscar');
+    select.parentNode.insertBefore(buscador, select);
+
+    buscador.addEventListener('input', function () {
+      clearTimeout(espera);
+      espera = setTimeout(function () {
+        var texto = buscador.value.trim();
+        if (!texto) {
+          return;
+        }
+
+        fetch(select.dataset.autocompletar + '?q=' + encodeURIComponent(texto), {credentials: 'same-origin'})
+          .then(function (respuesta) { return respuesta.json(); })
+          .then(function (datos) {
+            var elegido = select.value;
+            Array.from(select.options).forEach(function (opcion) {
+              if (opcion.value && opcion.value !== elegido) {
+                opcion.remove();
+              }
+            });
+            datos.resultados.forEach(function (resultado) {
+              if (String(resultado.id) !== elegido) {
+                select.add(new Option(resultado.texto, resultado.id));
+              }
+            });
+          });
+      }, 200);
+    });
+  });
+});
@@ -0,0 +1,151 @@
+from datetime import date, timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.test import TestCase
+
+from catalogo import circulacion
+from catalogo.circulacion import ConflictoDeEstado, TransicionInvalida
+from catalogo.models import InstanciaDeLibro, Prestamo, Reserva
+from catalogo.tests.test_views import create_book
+
+
+class TransicionesTest(TestCase):
+    def setUp(self):
+        self.usuario = User.objects.create_user(username='testuser')
+        self.otro_usuario = User.objects.create_user(username='otrouser')
+        self.libro = create_book(1)
+        self.copia = InstanciaDeLibro.objects.create(libro=self.libro, estatus='d')
+
+    def test_loan_cycle(self):
+        circulacion.prestar(self.copia, self.usuario)
+        circulacion.renovar(self.copia, date.today() + timedelta(weeks=4))
+        circulacion.devolver(self.copia)
+        circulacion.enviar_a_mantenimiento(self.copia)
+        copia = InstanciaDeLibro.objects.get(pk=self.copia.pk)
+        self.libro.refresh_from_db()
+
+        self.assertEqual((copia.estatus, copia.prestatario), ('m', None))
+        self.assertEqual((self.libro.num_disponibles, self.libro.num_en_mantenimiento), (0, 1))
+
+    def test_transitions_are_recorded(self):
+        circulacion.prestar(self.copia, self.usuario)
+        circulacion.renovar(self.copia, date.today() + timedelta(weeks=4))
+        circulacion.devolver_lote([self.copia.pk])
+        eventos = Prestamo.objects.filter(instancia=self.copia).order_by('id')
+
+        self.assertEqual(
+          [(evento.estatus_anterior, evento.estatus, evento.prestatario_id) for evento in eventos],
+          [('', 'd', None), ('d', 'p', self.usuario.pk), ('p', 'm', self.usuario.pk)],
+        )
+
+    def test_stale_copy_reports_conflict(self):
+        otra_vista = InstanciaDeLibro.objects.get(pk=self.copia.pk)
+        circulacion.prestar(self.copia, self.usuario)
+
+        with self.assertRaises(ConflictoDeEstado):
+            circulacion.prestar(otra_vista, self.otro_usuario)
+
+        self.copia.refresh_from_db()
+        self.libro.refresh_from_db()
+        self.assertEqual(self.copia.prestatario, self.usuario)
+        self.assertEqual((self.libro.num_disponibles, self.libro.num_prestadas), (0, 1))
+
+    def test_invalid_transitions(self):
+        with self.assertRaises(TransicionInvalida):
+            circulacion.devolver(self.copia)
+
+        reserva = Reserva.objects.create(libro=self.libro, usuario=self.usuario)
+        circulacion.apartar(self.copia, reserva)
+
+        with self.assertRaises(TransicionInvalida):
+            circulacion.prestar(self.copia, self.otro_usuario)
+
+        circulacion.prestar(self.copia, self.usuario)
+        self.assertEqual(InstanciaDeLibro.objects.get(pk=self.copia.pk).estatus, 'p')
+
+
+class FilaDeReservasTest(TestCase):
+    def setUp(self):
+        self.usuario = User.objects.create_user(username='testuser')
+        self.otro_usuario = User.objects.create_user(username='otrouser')
+        self.libro = create_book(1)
+        self.copia = InstanciaDeLibro.objects.create(libro=self.libro, estatus='m')
+
+    def test_copy_back_from_maintenance_goes_to_the_queue(self):
+        reserva = circulacion.reservar(self.libro, self.usuario)
+        self.assertIsNone(reserva.asignada)
+
+        self.copia.estatus = 'd'
+        self.copia.save()
+        self.copia.refresh_from_db()
+        reserva.refresh_from_db()
+        self.libro.refresh_from_db()
+
+        self.assertEqual((self.copia.estatus, self.copia.prestatario), ('r', self.usuario))
+        self.assertEqual(reserva.instancia, self.copia)
+        self.assertEqual((self.libro.num_disponibles, self.libro.num_reservadas), (0, 1))
+
+    def test_new_copy_goes_to_the_queue(self):
+        reserva = circulacion.reservar(self.libro, self.usuario)
+        copia = InstanciaDeLibro.objects.create(libro=self.libro, estatus='d')
+        reserva.refresh_from_db()
+
+        self.assertEqual((copia.estatus, reserva.instancia), ('r', copia))
+
+    def test_waiting_reservation_is_served_before_a_new_one(self):
+        disponible = InstanciaDeLibro.objects.create(libro=self.libro, estatus='d')
+        # Una fila detenida: alguien espera aunque hay una copia en el estante
+        primera = Reserva.objects.create(libro=self.libro, usuario=self.otro_usuario)
+
+        segunda = circulacion.reservar(self.libro, self.usuario)
+        primera.refresh_from_db()
+
+        self.assertEqual(primera.instancia, disponible)
+        self.assertIsNone(segunda.asignada)
+
+    def test_one_pending_reservation_per_user(self):
+        Reserva.objects.create(libro=self.libro, usuario=self.usuario, asignada=date.today())
+        Reserva.objects.create(libro=self.libro, usuario=self.usuario)
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Reserva.objects.create(libro=self.libro, usuario=self.usuario)
+
+    def test_concurrent_duplicate_reservation(self):
+        existente = circulacion.reservar(self.libro, self.usuario)
+
+        # La otra peticion hizo la comprobacion antes de que se guardara esta reserva
+        with mock.patch.object(Reserva.objects, 'filter') as filtro:
+            filtro.return_value.first.return_value = None
+            reserva = circulacion.reservar(self.libro, self.usuario)
+
+        self.assertEqual(reserva, existente)
+        self.assertEqual(Reserva.objects.count(), 1)
+
+    def test_overdue_copy_goes_to_the_next_reservation(self):
+        circulacion.reservar(self.libro, self.usuario)
+        siguiente = circulacion.reservar(self.libro, self.otro_usuario)
+        self.copia.estatus = 'd'
+        self.copia.save()
+
+        self.assertEqual(circulacion.liberar_apartadas_vencidas(date.today() + timedelta(weeks=2)), 1)
+        self.copia.refresh_from_db()
+        siguiente.refresh_from_db()
+
+        self.assertEqual((self.copia.estatus, self.copia.prestatario), ('r', self.otro_usuario))
+        self.assertEqual(self.copia.fecha_de_devolucion, date.today() + timedelta(weeks=1))
+        self.assertEqual(siguiente.instancia, self.copia)
+
+    def test_overdue_copy_without_queue_becomes_available(self):
+        circulacion.reservar(self.libro, self.usuario)
+        self.copia.estatus = 'd'
+        self.copia.save()
+
+        self.assertEqual(circulacion.liberar_apartadas_vencidas(), 0)
+        self.assertEqual(circulacion.liberar_apartadas_vencidas(date.today() + timedelta(weeks=2)), 1)
+        self.copia.refresh_from_db()
+        self.libro.refresh_from_db()
+
+        self.assertEqual((self.copia.estatus, self.copia.prestatario, self.copia.fecha_de_devolucion), ('d', None, None))
+        self.assertEqual((self.libro.num_disponibles, self.libro.num_reservadas), (1, 0))
@@ -0,0 +1,317 @@
+import gzip
+import json
+import os
+import tempfile
+from datetime import date, timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.db.models import QuerySet
+from django.utils import timezone
+from django.test import TestCase
+
+from catalogo import recordatorios
+from catalogo.autocompletar import sugerencias
+from catalogo.busqueda import buscar_libros
+from catalogo.contadores import CLAVE_CONTADORES, obtener_contadores
+from catalogo.models import Libro, Autor, Genero, Lenguaje, InstanciaDeLibro, Prestamo, ResumenDeAtrasos, CirculacionDiaria
+from catalogo.tests.test_views import create_book
+from catalogo.versiones import version_de
+
+
+def marc_record(campos):
+    """Crea un registro MARC 21 (ISO 2709) a partir de {etiqueta: {subcampo: valor}}"""
+    directorio = b''
+    datos = b''
+    for etiqueta, subcampos in campos.items():
+        campo = b'  ' + b''.join(b'\x1f' + codigo.encode() + valor.encode() for codigo, valor in subcampos.items()) + b'\x1e'
+        directorio += etiqueta.encode() + b'%04d%05d' % (len(campo), len(datos))
+        datos += campo
+    base = 24 + len(directorio) + 1
+    largo = base + len(datos) + 1
+    lider = b'%05dnam a22%05d   4500' % (largo, base)
+    return lider + directorio + b'\x1e' + datos + b'\x1d'
+
+
+def write_temp_file(test, extension, contenido):
+    modo = 'wb' if isinstance(contenido, bytes) else 'w'
+    descriptor, ruta = tempfile.mkstemp(suffix=extension)
+    with os.fdopen(descriptor, modo) as archivo:
+        archivo.write(contenido)
+    test.addCleanup(lambda: os.path.exists(ruta) and os.remove(ruta))
+    test.addCleanup(lambda: os.path.exists(f'{ruta}.progreso') and os.remove(f'{ruta}.progreso'))
+    return ruta
+
+
+class ExplicarConsultasCommandTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_book(1)
+
+    def test_reports_every_view(self):
+        salida = StringIO()
+        call_command('explicar_consultas', stdout=salida)
+
+        for nombre in ['index', 'VistaDeListaDeLibros', 'VistaDePrestamosStaff', 'VistaDeDetallesDeAutores']:
+            self.assertIn(f'{nombre}: usa índice', salida.getvalue())
+
+        self.assertIn('0 consultas sin índice', salida.getvalue())
+
+
+class ImportarCatalogoCommandTest(TestCase):
+    def import_file(self, ruta, *args):
+        salida = StringIO()
+        call_command('importar_catalogo', ruta, '--lote', '2', *args, stdout=salida)
+        return salida.getvalue()
+
+    def test_import_csv(self):
+        Autor.objects.create(nombre='Gabriel', apellido='García Márquez')
+        ruta = write_temp_file(self, '.csv', (
+          'titulo,resumen,isbn,autor,lenguaje,generos\n'
+          'Cien años de soledad,Macondo,978-0307474728,"García Márquez, Gabriel",Español,Novela;Realismo mágico\n'
+          'El amor en los tiempos del cólera,Florentino,9780307387264,"García Márquez, Gabriel",Español,Novela\n'
+          'Ficciones,Laberintos,9788420633121,"Borges, Jorge Luis",Español,Cuento\n'
+        ))
+
+        salida = self.import_file(ruta)
+        libro = Libro.objects.get(titulo='Cien años de soledad')
+
+        self.assertIn('3 registros importados', salida)
+        self.assertEqual(Autor.objects.count(), 2)
+        self.assertEqual(Lenguaje.objects.count(), 1)
+        self.assertEqual(libro.isbn, '9780307474728')
+        self.assertEqual(str(libro.autor), 'García Márquez, Gabriel')
+        self.assertEqual(sorted(str(genero) for genero in libro.genero.all()), ['Novela', 'Realismo mágico'])
+        self.assertEqual(buscar_libros('laberintos'), [Libro.objects.get(titulo='Ficciones')])
+        self.assertEqual([texto for pk, texto in sugerencias('autores', 'garc')], ['García Márquez, Gabriel'])
+        self.assertEqual([texto for pk, texto in sugerencias('libros', 'ficc')], ['Ficciones'])
+        self.assertFalse(os.path.exists(f'{ruta}.progreso'))
+
+    def test_import_jsonl_and_resume(self):
+        registros = [{'titulo': f'Libro {numero}', 'autor': 'Perez, Carlos', 'generos': ['Ficción']} for numero in range(5)]
+        ruta = write_temp_file(self, '.jsonl', '\n'.join(json.dumps(registro) for registro in registros))
+        with open(f'{ruta}.progreso', 'w') as progreso:
+            progreso.write('3')
+
+        salida = self.import_file(ruta, '--reanudar')
+
+        self.assertIn('2 registros importados', salida)
+        self.assertEqual(list(Libro.objects.order_by('titulo').values_list('titulo', flat=True)), ['Libro 3', 'Libro 4'])
+        self.assertEqual(Genero.objects.get().libro_set.count(), 2)
+
+    def test_import_marc(self):
+        ruta = write_temp_file(self, '.mrc', b''.join([
+          marc_record({
+            '020': {'a': '9788437604947'},
+            '041': {'a': 'spa'},
+            '100': {'a': 'Cervantes, Miguel de,'},
+            '245': {'a': 'Don Quijote de la Mancha /'},
+            '520': {'a': 'Un hidalgo.'},
+            '650': {'a': 'Novela.'},
+          }),
+          marc_record({'245': {'a': 'La Celestina'}}),
+        ]))
+
+        self.import_file(ruta)
+        libro = Libro.objects.get(isbn='9788437604947')
+
+        self.assertEqual(libro.titulo, 'Don Quijote de la Mancha')
+        self.assertEqual(str(libro.autor), 'Cervantes, Miguel de')
+        self.assertEqual(str(libro.lenguaje), 'spa')
+        self.assertEqual(str(libro.genero.get()), 'Novela')
+        self.assertTrue(Libro.objects.filter(titulo='La Celestina', autor=None).exists())
+
+
+class RepararDisponibilidadCommandTest(TestCase):
+    def test_fixes_counters_that_drifted(self):
+        libro = create_book(1)
+        InstanciaDeLibro.objects.create(libro=libro, estatus='d')
+        InstanciaDeLibro.objects.create(libro=libro, estatus='p')
+        create_book(2)
+        Libro.objects.filter(pk=libro.pk).update(num_copias=7, num_disponibles=0)
+
+        salida = StringIO()
+        call_command('reparar_disponibilidad', '--lote', '1', stdout=salida)
+        libro.refresh_from_db()
+
+        self.assertIn('2 libros revisados, 1 corregidos', salida.getvalue())
+        self.assertEqual((libro.num_copias, libro.num_disponibles, libro.num_prestadas), (2, 1, 1))
+
+    def test_corrections_invalidate_cached_counters(self):
+        libro = create_book(1)
+        InstanciaDeLibro.objects.create(libro=libro, estatus='d')
+        Libro.objects.filter(pk=libro.pk).update(num_disponibles=0)
+        cache.clear()
+        obtener_contadores()
+        version = version_de(Libro)
+
+        call_command('reparar_disponibilidad', stdout=StringIO())
+
+        self.assertIsNone(cache.get(CLAVE_CONTADORES))
+        self.assertGreater(version_de(Libro), version)
+
+
+class CalcularAtrasosCommandTest(TestCase):
+    def test_summarizes_overdue_loans_per_borrower(self):
+        libro = create_book(1)
+        puntual = User.objects.create_user(username='puntual')
+        atrasado = User.objects.create_user(username='atrasado')
+        for usuario, dias in ((puntual, 5), (atrasado, -2), (atrasado, -9), (atrasado, 1)):
+            InstanciaDeLibro.objects.create(
+              libro=libro,
+              estatus='p',
+              prestatario=usuario,
+              fecha_de_devolucion=date.today() + timedelta(days=dias),
+            )
+        ResumenDeAtrasos.objects.create(
+          prestatario=puntual, prestamos_atrasados=1, dias_de_atraso_maximo=1,
+          fecha_mas_antigua=date.today(), fecha_de_calculo=date.today(),
+        )
+
+        salida = StringIO()
+        call_command('calcular_atrasos', stdout=salida)
+        resumen = ResumenDeAtrasos.objects.get()
+
+        self.assertIn('1 usuarios con préstamos atrasados', salida.getvalue())
+        self.assertEqual(resumen.prestatario, atrasado)
+        self.assertEqual((resumen.prestamos_atrasados, resumen.dias_de_atraso_maximo), (2, 9))
+
+
+
+class LiberarReservasVencidasCommandTest(TestCase):
+    def test_releases_only_overdue_copies(self):
+        libro = create_book(1)
+        usuario = User.objects.create_user(username='testuser')
+        for dias in (-1, 0):
+            InstanciaDeLibro.objects.create(
+              libro=libro,
+              estatus='r',
+              prestatario=usuario,
+              fecha_de_devolucion=date.today() + timedelta(days=dias),
+            )
+
+        salida = StringIO()
+        call_command('liberar_reservas_vencidas', stdout=salida)
+
+        self.assertIn('1 copias apartadas liberadas', salida.getvalue())
+        self.assertEqual(
+            sorted(InstanciaDeLibro.objects.values_list('estatus', flat=True)), ['d', 'r'],
+        )
+
+class EnviarRecordatoriosCommandTest(TestCase):
+    def test_sends_one_digest_per_borrower(self):
+        libro = create_book(1)
+        ana = User.objects.create_user(username='ana', email='ana@example.com', first_name='Ana')
+        luis = User.objects.create_user(username='luis', email='luis@example.com')
+        sin_correo = User.objects.create_user(username='sin_correo')
+        for usuario, dias in ((ana, -4), (ana, 2), (ana, 30), (luis, 1), (sin_correo, -1)):
+            InstanciaDeLibro.objects.create(
+              libro=libro,
+              estatus='p',
+              prestatario=usuario,
+              fecha_de_devolucion=date.today() + timedelta(days=dias),
+            )
+
+        salida = StringIO()
+        call_command('enviar_recordatorios', '--lote', '1', '--hilos', '2', stdout=salida)
+        mensajes = {mensaje.to[0]: mensaje for mensaje in mail.outbox}
+
+        self.assertIn('2 recordatorios enviados', salida.getvalue())
+        self.assertEqual(sorted(mensajes), ['ana@example.com', 'luis@example.com'])
+        self.assertEqual(mensajes['ana@example.com'].subject, 'Tienes libros atrasados')
+        self.assertEqual(mensajes['ana@example.com'].body.count(libro.titulo), 2)
+        self.assertEqual(mensajes['luis@example.com'].subject, 'Tus libros vencen pronto')
+
+    def test_plain_text_is_not_html_escaped(self):
+        mensaje = recordatorios.crear_mensaje(
+            ('obrien', 'obrien@example.com', "O'Brien"), [("Harry & Sally's <book>", date.today())], date.today(),
+        )
+
+        self.assertIn("Hola O'Brien:", mensaje.body)
+        self.assertIn("- Harry & Sally's <book> (hasta el", mensaje.body)
+
+
+class ArchivarPrestamosCommandTest(TestCase):
+    def test_moves_old_months_to_compressed_files(self):
+        libro = create_book(1)
+        usuario = User.objects.create_user(username='testuser')
+        copia = InstanciaDeLibro.objects.create(libro=libro, estatus='d')
+        copia.estatus = 'p'
+        copia.prestatario = usuario
+        copia.save()
+        Prestamo.objects.filter(estatus='d').update(fecha=timezone.now() - timedelta(days=800))
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(lambda: [os.remove(os.path.join(directorio, nombre)) for nombre in os.listdir(directorio)])
+
+        salida = StringIO()
+        call_command('archivar_prestamos', directorio, '--conservar', '12', stdout=salida)
+        archivos = os.listdir(directorio)
+        with gzip.open(os.path.join(directorio, archivos[0]), 'rt') as archivo:
+            lineas = archivo.read().splitlines()
+
+        self.assertIn('1 eventos archivados', salida.getvalue())
+        self.assertEqual(len(archivos), 1)
+        self.assertEqual(len(lineas), 2)
+        self.assertIn(str(copia.pk), lineas[1])
+        self.assertEqual(list(Prestamo.objects.values_list('estatus_anterior', 'estatus', 'prestatario_id')), [('d', 'p', usuario.pk)])
+
+    def test_failed_delete_does_not_archive_twice(self):
+        copia = InstanciaDeLibro.objects.create(libro=create_book(1), estatus='d')
+        Prestamo.objects.update(fecha=timezone.now() - timedelta(days=800))
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(lambda: [os.remove(os.path.join(directorio, nombre)) for nombre in os.listdir(directorio)])
+
+        with mock.patch.object(QuerySet, 'delete', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                call_command('archivar_prestamos', directorio, stdout=StringIO())
+        self.assertEqual(os.listdir(directorio), [])
+
+        # El archivo se reemplazo pero el DELETE no llego a confirmarse
+        with mock.patch.object(QuerySet, 'delete', return_value=(0, {})):
+            call_command('archivar_prestamos', directorio, stdout=StringIO())
+        call_command('archivar_prestamos', directorio, stdout=StringIO())
+        with gzip.open(os.path.join(directorio, os.listdir(directorio)[0]), 'rt') as archivo:
+            lineas = archivo.read().splitlines()
+
+        self.assertEqual(len(lineas), 2)
+        self.assertIn(str(copia.pk), lineas[1])
+        self.assertFalse(Prestamo.objects.exists())
+
+
+class CalcularCirculacionCommandTest(TestCase):
+    def test_rolls_up_each_day_once(self):
+        libro = create_book(1)
+        usuario = User.objects.create_user(username='testuser')
+        copia = InstanciaDeLibro.objects.create(libro=libro, estatus='d')
+        ahora = timezone.now()
+        for estatus, dias_atras in (('p', 5), ('m', 2)):
+            copia.estatus = estatus
+            copia.prestatario = usuario if estatus == 'p' else None
+            copia.save()
+            Prestamo.objects.filter(estatus=estatus).update(fecha=ahora - timedelta(days=dias_atras))
+
+        call_command('calcular_circulacion', '--hilos', '1', '--dias-por-lote', '2', stdout=StringIO())
+        call_command('calcular_circulacion', '--hilos', '1', '--desde', str(date.today() - timedelta(days=10)), stdout=StringIO())
+        filas = CirculacionDiaria.objects.order_by('dia')
+
+        self.assertEqual([(fila.prestamos, fila.devoluciones) for fila in filas], [(1, 0), (0, 1)])
+        self.assertEqual(filas[1].tiempo_prestado, timedelta(days=3))
+
+
+class GenerarCatalogoCommandTest(TestCase):
+    def test_generates_searchable_catalogue(self):
+        salida = StringIO()
+        call_command('generar_catalogo', '--libros', '40', '--copias', '3', '--usuarios', '6', '--lote', '15', stdout=salida)
+
+        self.assertIn('40 libros', salida.getvalue())
+        self.assertEqual(Libro.objects.count(), 40)
+        self.assertEqual(InstanciaDeLibro.objects.count(), 120)
+        self.assertEqual(User.objects.count(), 6)
+        self.assertTrue(User.objects.first().check_password('usertest'))
+        self.assertTrue(buscar_libros('sombra'))
+        self.assertTrue(sugerencias('libros', Libro.objects.first().titulo[:3]))
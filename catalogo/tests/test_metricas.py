@@ -0,0 +1,89 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from catalogo import metricas
+from catalogo.metricas import Registro
+from catalogo.tests.test_views import create_book
+
+
+@override_settings(METRICAS_ACTIVAS=True, PRESUPUESTO_DE_CONSULTAS=100, TOKEN_DE_METRICAS='Tq8!vX2m')
+class MetricasTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        create_book(1)
+        parche = mock.patch.object(metricas, 'registro', Registro())
+        self.registro = parche.start()
+        self.addCleanup(parche.stop)
+
+    def test_server_timing(self):
+        response = self.client.get(reverse('libros'))
+        partes = dict(parte.split(';', 1) for parte in response['Server-Timing'].split(', '))
+
+        self.assertEqual(set(partes), {'total', 'db', 'tpl'})
+        self.assertNotIn('"0 consultas"', partes['db'])
+        self.assertNotEqual(partes['tpl'], 'dur=0.0')
+
+    def test_prometheus_endpoint(self):
+        self.client.get(reverse('libros'))
+        self.client.get(reverse('libros'))
+        texto = self.client.get(reverse('metricas'), HTTP_AUTHORIZATION='Bearer Tq8!vX2m').content.decode()
+
+        self.assertIn('# TYPE catalogo_peticion_segundos histogram', texto)
+        self.assertIn('catalogo_peticion_segundos_count{vista="libros"} 2', texto)
+        self.assertIn('catalogo_respuesta_bytes_bucket{vista="libros",le="+Inf"} 2', texto)
+
+    def test_endpoint_requires_staff_or_token(self):
+        self.assertEqual(self.client.get(reverse('metricas')).status_code, 403)
+        self.assertEqual(self.client.get(reverse('metricas'), HTTP_AUTHORIZATION='Bearer otro').status_code, 403)
+
+        User.objects.create_user(username='testuser', password='Jn6@rW4k!sP1')
+        self.client.login(username='testuser', password='Jn6@rW4k!sP1')
+        self.assertEqual(self.client.get(reverse('metricas')).status_code, 403)
+
+        User.objects.create_user(username='teststaff', password='Jn6@rW4k!sP1', is_staff=True)
+        self.client.login(username='teststaff', password='Jn6@rW4k!sP1')
+        self.assertEqual(self.client.get(reverse('metricas')).status_code, 200)
+
+    @override_settings(TOKEN_DE_METRICAS='')
+    def test_empty_token_is_not_accepted(self):
+        self.assertEqual(self.client.get(reverse('metricas'), HTTP_AUTHORIZATION='Bearer ').status_code, 403)
+
+    @override_settings(PRESUPUESTO_DE_CONSULTAS=0)
+    def test_query_budget(self):
+        with self.assertLogs('catalogo.metricas', 'WARNING') as registros:
+            self.client.get(reverse('libros'))
+
+        self.assertIn('el presupuesto es 0', registros.output[0])
+        self.assertEqual(self.registro.sobre_presupuesto, {'libros': 1})
+
+    def test_histogram_buckets_are_cumulative(self):
+        self.registro.observar('x', {'total': 0.02, 'consultas': 3, 'tiempo_de_consultas': 0, 'tiempo_de_plantillas': 0,
+                                     'bytes': 10}, False)
+        self.registro.observar('x', {'total': 3, 'consultas': 3, 'tiempo_de_consultas': 0, 'tiempo_de_plantillas': 0,
+                                     'bytes': 10}, False)
+        texto = self.registro.como_texto()
+
+        self.assertIn('catalogo_peticion_segundos_bucket{vista="x",le="0.01"} 0', texto)
+        self.assertIn('catalogo_peticion_segundos_bucket{vista="x",le="0.025"} 1', texto)
+        self.assertIn('catalogo_peticion_segundos_bucket{vista="x",le="5"} 2', texto)
+        self.assertIn('catalogo_consultas_sum{vista="x"} 6', texto)
+
+
+class MetricasDesactivadasTest(TestCase):
+    def test_disabled(self):
+        response = self.client.get(reverse('index'))
+
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(self.client.get(reverse('metricas')).status_code, 404)
+
+
+@override_settings(METRICAS_ACTIVAS=True, ROOT_URLCONF='librerialocal.urls_asgi')
+class MetricasAsgiTest(TransactionTestCase):
+    async def test_queries_in_thread_pool_are_counted(self):
+        response = await AsyncClient().get(reverse('api_lista', args=['autores']))
+
+        self.assertIn('desc="1 consultas"', response['Server-Timing'])
@@ -121,6 +121,55 @@ class InstanciaDeLibroModelTest(TestCase):
         self.assertEqual(expected_object_name, str(instancia_de_libro))
 
 
+def contadores(libro):
+    libro.refresh_from_db()
+    return (libro.num_copias, libro.num_disponibles, libro.num_prestadas, libro.num_en_mantenimiento, libro.num_reservadas)
+
+
+class DisponibilidadDeLibroTest(TestCase):
+    def setUp(self):
+        self.libro = Libro.objects.create(titulo='Mi libro de prueba')
+        self.otro_libro = Libro.objects.create(titulo='Otro libro')
+
+    def test_counters_follow_copies(self):
+        copia = InstanciaDeLibro.objects.create(libro=self.libro, estatus='d')
+        InstanciaDeLibro.objects.create(libro=self.libro, estatus='m')
+
+        self.assertEqual(contadores(self.libro), (2, 1, 0, 1, 0))
+
+        copia.estatus = 'p'
+        copia.save()
+        self.assertEqual(contadores(self.libro), (2, 0, 1, 1, 0))
+
+        copia.libro = self.otro_libro
+        copia.save()
+        self.assertEqual(contadores(self.libro), (1, 0, 0, 1, 0))
+        self.assertEqual(contadores(self.otro_libro), (1, 0, 1, 0, 0))
+
+        copia.delete()
+        self.assertEqual(contadores(self.otro_libro), (0, 0, 0, 0, 0))
+
+    def test_drifted_counter_does_not_go_negative(self):
+        copia = InstanciaDeLibro.objects.create(libro=self.libro, estatus='d')
+        Libro.objects.filter(pk=self.libro.pk).update(num_disponibles=0)
+
+        copia.estatus = 'p'
+        copia.save()
+
+        self.assertEqual(contadores(self.libro), (1, 0, 1, 0, 0))
+
+    def test_saving_a_stale_book_keeps_the_counters(self):
+        # El formulario de edicion carga el libro antes de que se agregue una copia
+        libro = Libro.objects.get(pk=self.libro.pk)
+        InstanciaDeLibro.objects.create(libro=self.libro, estatus='d')
+
+        libro.titulo = 'Titulo nuevo'
+        libro.save()
+
+        self.assertEqual(contadores(self.libro), (1, 1, 0, 0, 0))
+        self.assertEqual(self.libro.titulo, 'Titulo nuevo')
+
+
 class AutorModelTest(TestCase):
     @classmethod
     def setUpTestData(cls):
@@ -0,0 +1,117 @@
+import json
+import os
+import sqlite3
+import tempfile
+
+from django.db import connection
+from django.db.models import Count, Q
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from catalogo import rendimiento, sintetico
+from catalogo.sqlite.base import DatabaseWrapper
+from catalogo.models import InstanciaDeLibro, Libro, Prestamo
+from catalogo.urls import urlpatterns
+
+
+class SinteticoTest(TestCase):
+    def test_generates_consistent_counters(self):
+        escala = sintetico.generar(30, copias_por_libro=4, usuarios=10, tamano_de_lote=7)
+
+        self.assertEqual(escala, {'usuarios': 10, 'autores': 3, 'libros': 30, 'copias': 120})
+        self.assertEqual(InstanciaDeLibro.objects.count(), 120)
+
+        conteos = Libro.objects.annotate(
+            disponibles=Count('instanciadelibro', filter=Q(instanciadelibro__estatus='d')),
+            prestadas=Count('instanciadelibro', filter=Q(instanciadelibro__estatus='p')),
+        )
+        for libro in conteos:
+            self.assertEqual((libro.num_disponibles, libro.num_prestadas), (libro.disponibles, libro.prestadas))
+
+    def test_loans_are_in_the_history(self):
+        sintetico.generar(30, copias_por_libro=4, usuarios=10)
+        prestadas = InstanciaDeLibro.objects.filter(estatus='p')
+
+        self.assertGreater(prestadas.count(), 0)
+        self.assertEqual(
+            set(Prestamo.objects.values_list('instancia_id', 'libro_id', 'prestatario_id', 'estatus', 'fecha_de_devolucion')),
+            set((copia.id, copia.libro_id, copia.prestatario_id, 'p', copia.fecha_de_devolucion) for copia in prestadas),
+        )
+        self.assertFalse(Prestamo.objects.filter(fecha__gt=timezone.now()).exists())
+
+    def test_zipf_weights(self):
+        pesos = sintetico.zipf(4, 1)
+
+        self.assertEqual(pesos, [1, 1.5, 1.5 + 1 / 3, 1.5 + 1 / 3 + 0.25])
+
+    def test_same_seed_same_data(self):
+        sintetico.generar(5, usuarios=2, semilla=3)
+        primeros = list(Libro.objects.order_by('pk').values_list('titulo', flat=True))
+        InstanciaDeLibro.objects.all().delete()
+        Libro.objects.all().delete()
+        sintetico.generar(5, usuarios=2, semilla=3)
+
+        self.assertEqual(list(Libro.objects.order_by('pk').values_list('titulo', flat=True)), primeros)
+
+
+class RendimientoTest(TestCase):
+    def test_every_url_has_a_case(self):
+        self.assertEqual({patron.name for patron in urlpatterns}, set(rendimiento.CASOS))
+
+    def test_medir(self):
+        sintetico.generar(20, usuarios=5)
+        resultados = rendimiento.medir(peticiones=2, concurrencia=1, nombres=['libros', 'misprestamos', 'cancelar_reserva'])
+
+        self.assertEqual(list(resultados), ['libros', 'misprestamos', 'cancelar_reserva'])
+        self.assertEqual(resultados['misprestamos']['estado'], 200)
+        self.assertEqual(resultados['cancelar_reserva']['estado'], 302)
+        self.assertGreater(resultados['libros']['consultas_en_frio'], 0)
+        self.assertEqual(resultados['libros']['consultas'], 0)
+        self.assertEqual(resultados['misprestamos']['errores'], 0)
+
+
+    def test_batch_cases_take_the_successful_path(self):
+        sintetico.generar(20, usuarios=5)
+        muestras = rendimiento.preparar_muestras()
+
+        for nombre in ('prestar_en_lote', 'devolver_en_lote'):
+            caso = rendimiento.CASOS[nombre]
+            cliente = rendimiento._cliente(caso, muestras)
+            for url, datos in rendimiento._peticiones(nombre, caso, muestras, 2):
+                response = cliente.post(url, json.dumps(datos), content_type='application/json')
+                self.assertEqual(response.json()['procesados'], rendimiento.COPIAS_POR_LOTE)
+
+
+class SqliteOptimizadoTest(SimpleTestCase):
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.nombre = os.path.join(directorio.name, 'perfil.sqlite3')
+        self.conexion = DatabaseWrapper({**connection.settings_dict, 'NAME': self.nombre}, 'perfil')
+        self.addCleanup(self.conexion.close)
+
+    @override_settings(SQLITE_OPTIMIZADO=True)
+    def test_pragmas_applied_on_connect(self):
+        with self.conexion.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+
+    @override_settings(SQLITE_OPTIMIZADO=False)
+    def test_pragmas_not_applied_when_disabled(self):
+        with self.conexion.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'delete')
+
+    def test_transactions_take_the_write_lock(self):
+        self.conexion.ensure_connection()
+        self.conexion._start_transaction_under_autocommit()
+        self.addCleanup(self.conexion.connection.rollback)
+
+        otra = sqlite3.connect(self.nombre, timeout=0)
+        self.addCleanup(otra.close)
+        with self.assertRaisesMessage(sqlite3.OperationalError, 'database is locked'):
+            otra.execute('BEGIN IMMEDIATE')
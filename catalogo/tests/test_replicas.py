@@ -0,0 +1,83 @@
+import time
+
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.signed_cookies import SessionStore
+from django.db import router, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from catalogo.models import Autor, InstanciaDeLibro, Libro
+from catalogo.replicas import CLAVE_DE_SESION, MiddlewareDeReplicas, en_replica, primaria_si_cambio_desde
+
+REPLICAS = ['replica1', 'replica2']
+
+
+def base_de_lectura(request):
+    return HttpResponse(router.db_for_read(Libro))
+
+
+@override_settings(REPLICAS_DE_LECTURA=REPLICAS, RETRASO_DE_REPLICAS=5)
+class EnrutadorDeReplicasTest(SimpleTestCase):
+    def pedir(self, vista, metodo='get', session=None):
+        request = getattr(RequestFactory(), metodo)('/')
+        request.session = session if session is not None else SessionStore()
+        return MiddlewareDeReplicas(vista)(request).content.decode()
+
+    def test_read_only_views_use_replicas(self):
+        self.assertIn(self.pedir(en_replica(base_de_lectura)), REPLICAS)
+
+    def test_one_replica_per_request(self):
+        vista = en_replica(lambda request: HttpResponse(
+            ' '.join(router.db_for_read(modelo) for modelo in (Libro, Autor, Libro, InstanciaDeLibro) * 5)
+        ))
+
+        for _ in range(5):
+            self.assertEqual(len(set(self.pedir(vista).split())), 1)
+
+    def test_other_views_use_primary(self):
+        self.assertEqual(self.pedir(base_de_lectura), 'default')
+        self.assertEqual(self.pedir(en_replica(base_de_lectura), metodo='post'), 'default')
+
+    def test_other_apps_use_primary(self):
+        vista = en_replica(lambda request: HttpResponse(router.db_for_read(User)))
+
+        self.assertEqual(self.pedir(vista), 'default')
+
+    def test_session_sticks_to_primary_after_write(self):
+        session = SessionStore()
+        self.pedir(lambda request: HttpResponse(), metodo='post', session=session)
+
+        self.assertGreater(session[CLAVE_DE_SESION], time.time())
+        self.assertEqual(self.pedir(en_replica(base_de_lectura), session=session), 'default')
+
+        session[CLAVE_DE_SESION] = time.time() - 1
+        self.assertIn(self.pedir(en_replica(base_de_lectura), session=session), REPLICAS)
+
+    def test_failed_writes_do_not_stick(self):
+        session = SessionStore()
+        self.pedir(lambda request: HttpResponse(status=403), metodo='post', session=session)
+
+        self.assertNotIn(CLAVE_DE_SESION, session)
+
+    def test_recent_changes_read_from_primary(self):
+        def vista(request):
+            primaria_si_cambio_desde(time.time() - 1)
+            return base_de_lectura(request)
+
+        self.assertEqual(self.pedir(en_replica(vista)), 'default')
+
+    def test_replicas_are_not_migrated(self):
+        self.assertFalse(router.allow_migrate('replica1', 'catalogo'))
+        self.assertTrue(router.allow_migrate('default', 'catalogo'))
+
+
+@override_settings(REPLICAS_DE_LECTURA=REPLICAS)
+class EnrutadorEnTransaccionTest(TestCase):
+    def test_reads_inside_a_transaction_use_primary(self):
+        request = RequestFactory().get('/')
+        request.session = SessionStore()
+
+        with transaction.atomic():
+            response = MiddlewareDeReplicas(en_replica(base_de_lectura))(request)
+
+        self.assertEqual(response.content.decode(), 'default')
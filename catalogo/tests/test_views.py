@@ -1,11 +1,18 @@
+import json
+import time
 from datetime import date, timedelta
 import uuid
+from unittest import mock
 
-from django.test import TestCase
+from django.core.cache import cache
+from django.db import connection
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.contrib.auth.models import User, Permission
 
-from catalogo.models import Libro, Autor, InstanciaDeLibro, Genero, Lenguaje
+from catalogo import circulacion
+from catalogo.models import Libro, Autor, InstanciaDeLibro, Genero, Lenguaje, Reserva, CirculacionDiaria
 
 
 def create_book(*args):
@@ -128,6 +135,29 @@ def pagination_is_ten(
     obj.assertEqual(len(response.context[context_object_name]), 10)
 
 
+def within_query_budget(
+  obj,
+  budget,
+  path,
+  **kwargs,
+):
+    if kwargs:
+        obj.client.login(username=kwargs['username'], password=kwargs['password'])
+
+    with CaptureQueriesContext(connection) as queries:
+        response = obj.client.get(path)
+
+    obj.assertEqual(response.status_code, 200)
+    obj.assertLessEqual(
+      len(queries),
+      budget,
+      f'{path} ejecutó {len(queries)} consultas (presupuesto: {budget}):\n'
+      + '\n'.join(query['sql'] for query in queries.captured_queries),
+    )
+
+    return response
+
+
 def redirect_if_not_logged_in(
   obj,
   path,
@@ -144,6 +174,91 @@ def redirect_if_not_logged_in(
       obj.assertTrue(response.url.startswith('/accounts/login/'))
 
 
+class IndexViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_book('Harry')
+        create_book(2)
+        InstanciaDeLibro.objects.create(libro=Libro.objects.first(), estatus='d')
+        InstanciaDeLibro.objects.create(libro=Libro.objects.first(), estatus='p')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_contadores(self):
+        response = self.client.get(reverse('index'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['num_libros'], 2)
+        self.assertEqual(response.context['num_instancias'], 2)
+        self.assertEqual(response.context['num_instancias_disponibles'], 1)
+        self.assertEqual(response.context['num_autores'], 2)
+        self.assertEqual(response.context['num_libros_con_la_palabra'], 1)
+        self.assertEqual(list(response.context['num_libros_palabra']), [('Mi libro de pruebas Harry',)])
+
+    def test_contadores_en_una_sola_consulta(self):
+        with self.assertNumQueries(1):
+            self.client.get(reverse('index'))
+
+        with self.assertNumQueries(0):
+            self.client.get(reverse('index'))
+
+    def test_contadores_invalidados_al_guardar(self):
+        self.client.get(reverse('index'))
+        Autor.objects.create(nombre='Jose', apellido='Perez')
+        response = self.client.get(reverse('index'))
+
+        self.assertEqual(response.context['num_autores'], 3)
+
+
+class BusquedaViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_book('Canción')
+        create_book('Hielo')
+
+    def setUp(self):
+        self.test_libro = Libro.objects.get(titulo='Mi libro de pruebas Canción')
+
+    def buscar(self, consulta):
+        response = self.client.get(reverse('buscar'), {'q': consulta})
+        self.assertEqual(response.status_code, 200)
+        return response.context['lista_de_libros']
+
+    def test_uses_correct_template(self):
+        response = self.client.get(reverse('buscar'), {'q': 'libro'})
+
+        self.assertTemplateUsed(response, 'libros/busqueda.html')
+
+    def test_busca_por_titulo_autor_y_genero(self):
+        self.assertEqual(self.buscar('cancion'), [self.test_libro])
+        self.assertEqual(self.buscar('Perez Canción'), [self.test_libro])
+        self.assertEqual(len(self.buscar('ficción')), 2)
+        self.assertEqual(self.buscar(''), [])
+
+    def test_indice_actualizado_al_modificar(self):
+        self.test_libro.titulo = 'Otro título'
+        self.test_libro.save()
+        self.assertEqual(self.buscar('Otro'), [self.test_libro])
+
+        self.test_libro.autor.apellido = 'Gonzalez'
+        self.test_libro.autor.save()
+        self.assertEqual(self.buscar('Gonzalez'), [self.test_libro])
+
+        Genero.objects.all().delete()
+        self.assertEqual(self.buscar('ficción'), [])
+
+        self.test_libro.delete()
+        self.assertEqual(self.buscar('Otro'), [])
+
+    def test_ordenado_por_relevancia(self):
+        otro_libro = create_book('Otro')
+        otro_libro.resumen = 'Resumen que menciona Canción'
+        otro_libro.save()
+
+        self.assertEqual(self.buscar('canción'), [self.test_libro, otro_libro])
+
+
 class ListaDeLibrosViewTest(TestCase):
     @classmethod
     def setUpTestData(cls):
@@ -152,6 +267,9 @@ class ListaDeLibrosViewTest(TestCase):
         for libro_id in range(numero_de_libros):
             create_book(libro_id)
 
+    def setUp(self):
+        cache.clear()
+
     def test_exists_at_location(self):
         exists_at_location(self, '/catalogo/libros/')
 
@@ -164,6 +282,31 @@ class ListaDeLibrosViewTest(TestCase):
     def test_pagination_is_ten(self):
         pagination_is_ten(self, 'lista_de_libros', path_name='libros')
 
+    def test_cursor_pagination(self):
+        primera = self.client.get(reverse('libros'))
+        token_siguiente = primera.context['page_obj'].token_siguiente
+
+        self.assertFalse(primera.context['page_obj'].has_previous())
+        self.assertEqual(primera.context['page_obj'].total_aproximado, 15)
+
+        segunda = self.client.get(reverse('libros'), {'cursor': token_siguiente})
+        titulos = [libro.titulo for libro in primera.context['lista_de_libros']]
+        titulos += [libro.titulo for libro in segunda.context['lista_de_libros']]
+
+        self.assertEqual(len(segunda.context['lista_de_libros']), 5)
+        self.assertFalse(segunda.context['page_obj'].has_next())
+        self.assertEqual(titulos, sorted(Libro.objects.values_list('titulo', flat=True)))
+
+        anterior = self.client.get(reverse('libros'), {'cursor': segunda.context['page_obj'].token_anterior})
+
+        self.assertEqual(list(anterior.context['lista_de_libros']), list(primera.context['lista_de_libros']))
+        self.assertFalse(anterior.context['page_obj'].has_previous())
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('libros'), {'cursor': 'invalido'})
+
+        self.assertEqual(response.status_code, 404)
+
 
 class ListaDeAutoresViewTest(TestCase):
     @classmethod
@@ -173,6 +316,9 @@ class ListaDeAutoresViewTest(TestCase):
         for autor_id in range(numero_de_autores):
             Autor.objects.create(nombre=f'Carlos {autor_id}', apellido=f'Perez {autor_id}',)
 
+    def setUp(self):
+        cache.clear()
+
     def test_exists_at_location(self):
         exists_at_location(self, '/catalogo/autores/')
 
@@ -371,6 +517,68 @@ class PrestamosStaffViewTest(TestCase):
                 ultima_fecha = copia.fecha_de_devolucion
 
 
+    def test_cursor_pagination_with_ties_and_nulls(self):
+        InstanciaDeLibro.objects.create(libro=Libro.objects.first(), estatus='p')
+        log_in_assertion(self, 'teststaff', '9@nG5!kcffe$', 'todoslosprestamos')
+
+        vistos = []
+        parametros = {}
+        while True:
+            response = self.client.get(reverse('todoslosprestamos'), parametros)
+            vistos += [copia.id for copia in response.context['instanciadelibro_lista_staff']]
+            if not response.context['page_obj'].has_next():
+                break
+            parametros = {'cursor': response.context['page_obj'].token_siguiente}
+
+        esperados = InstanciaDeLibro.objects.filter(estatus='p').values_list('id', flat=True)
+
+        self.assertEqual(len(vistos), 16)
+        self.assertEqual(set(vistos), set(esperados))
+
+
+class PrestamosAtrasadosViewTest(TestCase):
+    def setUp(self):
+        test_user = User.objects.create_user(username='testuser', password='$KN9vq4PlrXM')
+        test_staff = User.objects.create_user(username='teststaff', password='9@nG5!kcffe$')
+        test_permission = Permission.objects.get(name='Can set book as returned')
+        test_staff.user_permissions.add(test_permission)
+
+        test_libro = create_book(1)
+        for dias, estatus in ((-3, 'p'), (-10, 'p'), (-1, 'p'), (2, 'p'), (-20, 'm')):
+            InstanciaDeLibro.objects.create(
+              libro=test_libro,
+              fecha_de_devolucion=date.today() + timedelta(days=dias),
+              prestatario=test_user,
+              estatus=estatus,
+            )
+
+    def test_lists_overdue_loans_by_severity(self):
+        self.client.login(username='teststaff', password='9@nG5!kcffe$')
+        response = self.client.get(reverse('prestamosatrasados'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'libros/prestamos_atrasados.html')
+        self.assertEqual([instancia.dias_de_atraso.days for instancia in response.context['prestamos_atrasados']], [10, 3, 1])
+
+    def test_copy_without_book(self):
+        InstanciaDeLibro.objects.create(
+          fecha_de_devolucion=date.today() - timedelta(days=5),
+          prestatario=User.objects.get(username='testuser'),
+          estatus='p',
+        )
+        self.client.login(username='teststaff', password='9@nG5!kcffe$')
+        response = self.client.get(reverse('prestamosatrasados'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Copia sin libro')
+
+    def test_forbidden_without_permission(self):
+        self.client.login(username='testuser', password='$KN9vq4PlrXM')
+        response = self.client.get(reverse('prestamosatrasados'))
+
+        self.assertEqual(response.status_code, 403)
+
+
 class RenovarLibroViewTest(TestCase):
     def setUp(self):
         test_user = User.objects.create_user(username='testuser', password='Irdw8@1F5Il^')
@@ -588,3 +796,561 @@ class DevolverLibroViewTest(TestCase):
         response = self.client.post(reverse('devolver_libro', kwargs={'pk': self.test_instancia.id}))
 
         self.assertRedirects(response, reverse('todoslosprestamos'))
+
+    def test_conflict_if_already_returned(self):
+        self.client.login(username='teststaff', password='QZ7v1%lv3Wpc')
+        self.client.post(reverse('devolver_libro', kwargs={'pk': self.test_instancia.id}))
+        response = self.client.post(reverse('devolver_libro', kwargs={'pk': self.test_instancia.id}))
+
+        self.assertEqual(response.status_code, 409)
+        self.assertTrue(response.context['error'])
+
+
+class QueryBudgetViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        test_user = User.objects.create_user(username='testuser', password='Vq3#kL9p!xZ2')
+        test_staff = User.objects.create_superuser(username='teststaff', email='', password='Tn8$wE4r@bY6')
+        test_permission = Permission.objects.get(name='Can set book as returned')
+        test_staff.user_permissions.add(test_permission)
+
+        test_autor = Autor.objects.create(nombre='Carlos', apellido='Perez')
+        for libro_id in range(12):
+            test_libro = create_book(libro_id)
+            test_libro.autor = test_autor
+            test_libro.save()
+
+            for copia in range(3):
+                InstanciaDeLibro.objects.create(
+                  libro=test_libro,
+                  fecha_de_devolucion=date.today() + timedelta(days=copia),
+                  prestatario=[test_user, test_staff][copia % 2],
+                  estatus='p',
+                )
+
+        cls.test_libro = test_libro
+        cls.test_autor = test_autor
+        cls.test_instancia = InstanciaDeLibro.objects.first()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_public_views(self):
+        within_query_budget(self, 1, reverse('index'))
+        within_query_budget(self, 2, reverse('libros'))
+        within_query_budget(self, 2, reverse('autores'))
+        within_query_budget(self, 3, reverse('detalle_del_libro', args=[self.test_libro.pk]))
+        within_query_budget(self, 2, reverse('detalle_del_autor', args=[self.test_autor.pk]))
+        within_query_budget(self, 1, reverse('api_lista', args=['autores']))
+        within_query_budget(self, 2, reverse('api_lista', args=['libros']) + '?campos=titulo,generos')
+
+    def test_user_views(self):
+        within_query_budget(self, 6, reverse('misprestamos'), username='testuser', password='Vq3#kL9p!xZ2')
+
+    def test_staff_views(self):
+        credentials = {'username': 'teststaff', 'password': 'Tn8$wE4r@bY6'}
+
+        within_query_budget(self, 4, reverse('todoslosprestamos'), **credentials)
+        within_query_budget(self, 5, reverse('prestamosatrasados'), **credentials)
+        within_query_budget(self, 3, reverse('renovar_libro', args=[self.test_instancia.pk]), **credentials)
+        within_query_budget(self, 3, reverse('devolver_libro', args=[self.test_instancia.pk]), **credentials)
+        within_query_budget(self, 7, reverse('libro_actualizar', args=[self.test_libro.pk]), **credentials)
+
+    def test_admin_views(self):
+        credentials = {'username': 'teststaff', 'password': 'Tn8$wE4r@bY6'}
+
+        within_query_budget(self, 6, reverse('admin:catalogo_libro_changelist'), **credentials)
+        within_query_budget(self, 5, reverse('admin:catalogo_instanciadelibro_changelist'), **credentials)
+        within_query_budget(self, 18, reverse('admin:catalogo_autor_change', args=[self.test_autor.pk]), **credentials)
+        within_query_budget(self, 16, reverse('admin:catalogo_libro_change', args=[self.test_libro.pk]), **credentials)
+
+
+class CachePublicaViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_book(1)
+        User.objects.create_user(username='testuser', password='Hm5&vR2q!oW8')
+
+    def setUp(self):
+        cache.clear()
+        self.test_libro = Libro.objects.get()
+
+    def test_not_modified_with_etag(self):
+        response = self.client.get(self.test_libro.get_absolute_url())
+        etag = response['ETag']
+
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        response = self.client.get(self.test_libro.get_absolute_url(), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_anonymous_page_served_from_cache(self):
+        self.client.get(reverse('libros'))
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('libros'))
+
+        self.assertContains(response, self.test_libro.titulo)
+
+    def test_change_invalidates_etag_and_page(self):
+        response = self.client.get(self.test_libro.get_absolute_url())
+        etag = response['ETag']
+
+        InstanciaDeLibro.objects.create(libro=self.test_libro, estatus='d')
+        response = self.client.get(self.test_libro.get_absolute_url(), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertContains(response, 'Disponible')
+
+    @override_settings(VIDA_DE_VERSIONES=60)
+    def test_version_stamps_expire(self):
+        response = self.client.get(self.test_libro.get_absolute_url())
+        etag = response['ETag']
+
+        # Un worker con su propia cache no ve los cambios de otro: a lo sumo sirve la version vieja hasta que expire
+        with mock.patch('time.time', return_value=time.time() + 61):
+            response = self.client.get(self.test_libro.get_absolute_url(), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_evicted_version_stamp(self):
+        cache.clear()
+
+        # La marca desaparece entre guardarla y leerla (eviccion o expiracion)
+        with mock.patch.object(cache, 'add', return_value=True):
+            response = self.client.get(self.test_libro.get_absolute_url())
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.has_header('ETag'))
+
+    def test_authenticated_users_bypass_cache(self):
+        self.client.get(reverse('libros'))
+        self.client.login(username='testuser', password='Hm5&vR2q!oW8')
+        response = self.client.get(reverse('libros'))
+
+        self.assertFalse(response.has_header('ETag'))
+        self.assertContains(response, 'testuser')
+
+
+class FragmentosViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_book(1)
+        User.objects.create_user(username='testuser', password='Hm5&vR2q!oW8')
+        staff = User.objects.create_user(username='teststaff', password='Tn8$wE4r@bY6')
+        staff.user_permissions.add(Permission.objects.get(codename='can_mark_returned'))
+
+    def setUp(self):
+        cache.clear()
+        self.test_libro = Libro.objects.get()
+        self.test_copia = InstanciaDeLibro.objects.create(libro=self.test_libro, estatus='d')
+        # Los usuarios con sesion no usan la cache de paginas, solo la de fragmentos
+        self.client.login(username='testuser', password='Hm5&vR2q!oW8')
+
+    def test_cached_fragments_skip_related_queries(self):
+        with CaptureQueriesContext(connection) as primera:
+            self.client.get(self.test_libro.get_absolute_url())
+        consultas = len(primera)
+        with CaptureQueriesContext(connection) as segunda:
+            response = self.client.get(self.test_libro.get_absolute_url())
+
+        self.assertEqual(len(segunda), consultas - 2)
+        self.assertContains(response, 'Ficción')
+        self.assertContains(response, 'Disponible')
+
+    def test_staff_and_public_share_fragments(self):
+        self.client.get(self.test_libro.get_absolute_url())
+        circulacion.prestar(self.test_copia, User.objects.get(username='testuser'))
+
+        response = self.client.get(self.test_libro.get_absolute_url())
+        self.assertContains(response, 'Prestado')
+        self.assertNotContains(response, 'Devolver')
+
+        self.client.login(username='teststaff', password='Tn8$wE4r@bY6')
+        response = self.client.get(self.test_libro.get_absolute_url())
+        self.assertContains(response, reverse('devolver_libro', args=[self.test_copia.pk]))
+
+    def test_related_changes_invalidate_fragments(self):
+        self.client.get(self.test_libro.get_absolute_url())
+        self.client.get(self.test_libro.autor.get_absolute_url())
+
+        self.test_libro.genero.add(Genero.objects.create(nombre='Poesía'))
+        self.test_copia.estatus = 'm'
+        self.test_copia.save()
+        self.assertContains(self.client.get(self.test_libro.get_absolute_url()), 'Poesía')
+        self.assertContains(self.client.get(self.test_libro.get_absolute_url()), 'Mantenimiento')
+
+        self.test_libro.titulo = 'Titulo nuevo'
+        self.test_libro.save()
+        self.assertContains(self.client.get(self.test_libro.autor.get_absolute_url()), 'Titulo nuevo')
+
+    def test_moved_book_leaves_previous_author(self):
+        autor_anterior = self.test_libro.autor
+        self.client.get(autor_anterior.get_absolute_url())
+
+        self.test_libro.autor = Autor.objects.create(nombre='Ana', apellido='Torres')
+        self.test_libro.save()
+
+        self.assertNotContains(self.client.get(autor_anterior.get_absolute_url()), self.test_libro.titulo)
+
+
+class PrestamosEnLoteViewTest(TestCase):
+    def setUp(self):
+        self.test_user = User.objects.create_user(username='testuser', password='Lp4!zQ8m#eR1')
+        test_staff = User.objects.create_user(username='teststaff', password='Wd7@kN3x$tB5')
+        test_permission = Permission.objects.get(name='Can set book as returned')
+        test_staff.user_permissions.add(test_permission)
+
+        test_libro = create_book(1)
+        self.disponibles = [InstanciaDeLibro.objects.create(libro=test_libro, estatus='d') for copia in range(3)]
+        self.prestadas = [
+          InstanciaDeLibro.objects.create(
+            libro=test_libro,
+            estatus='p',
+            prestatario=self.test_user,
+            fecha_de_devolucion=date.today() + timedelta(days=3),
+          )
+          for copia in range(2)
+        ]
+
+        self.client.login(username='teststaff', password='Wd7@kN3x$tB5')
+
+    def post(self, path_name, datos):
+        return self.client.post(reverse(path_name), json.dumps(datos), content_type='application/json')
+
+    def test_prestar_en_lote(self):
+        ids = [str(copia.id) for copia in self.disponibles]
+        no_existe = str(uuid.uuid4())
+        response = self.post('prestar_en_lote', {
+          'ids': ids + [str(self.prestadas[0].id), no_existe, 'abc'],
+          'prestatario': self.test_user.pk,
+        })
+
+        resultados = response.json()['resultados']
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['procesados'], 3)
+        self.assertEqual(resultados[str(self.prestadas[0].id)], 'estado inválido')
+        self.assertEqual(resultados[no_existe], 'no encontrado')
+        self.assertEqual(resultados['abc'], 'id inválido')
+        for copia in InstanciaDeLibro.objects.filter(id__in=ids):
+            self.assertEqual(copia.estatus, 'p')
+            self.assertEqual(copia.prestatario, self.test_user)
+            self.assertEqual(copia.fecha_de_devolucion, date.today() + timedelta(weeks=3))
+
+    def test_devolver_en_lote(self):
+        response = self.post('devolver_en_lote', {'ids': [str(copia.id) for copia in self.prestadas]})
+
+        self.assertEqual(response.json()['procesados'], 2)
+        self.assertFalse(InstanciaDeLibro.objects.filter(estatus='p').exists())
+        self.assertFalse(InstanciaDeLibro.objects.filter(prestatario__isnull=False).exists())
+        libro = Libro.objects.get()
+        self.assertEqual((libro.num_copias, libro.num_disponibles, libro.num_prestadas, libro.num_en_mantenimiento), (5, 3, 0, 2))
+
+    def test_renovar_en_lote(self):
+        fecha = date.today() + timedelta(weeks=2)
+        response = self.post('renovar_en_lote', {'ids': [str(copia.id) for copia in self.prestadas], 'fecha_de_devolucion': str(fecha)})
+
+        self.assertEqual(response.json()['procesados'], 2)
+        self.assertEqual(InstanciaDeLibro.objects.filter(fecha_de_devolucion=fecha).count(), 2)
+
+        response = self.post('renovar_en_lote', {'ids': [str(self.prestadas[0].id)], 'fecha_de_devolucion': str(date.today())})
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_prestar_en_lote_reserved_copies(self):
+        otro_usuario = User.objects.create_user(username='otrouser', password='Mz3#pV9q!kL2')
+        libro = Libro.objects.get()
+        circulacion.reservar(libro, self.test_user)
+        circulacion.reservar(libro, otro_usuario)
+        apartadas = list(InstanciaDeLibro.objects.filter(estatus='r').order_by('prestatario__username'))
+
+        response = self.post('prestar_en_lote', {'ids': [str(copia.id) for copia in apartadas], 'prestatario': self.test_user.pk})
+        resultados = response.json()['resultados']
+
+        self.assertEqual(response.json()['procesados'], 1)
+        self.assertEqual(resultados[str(apartadas[0].id)], 'estado inválido')
+        self.assertEqual(resultados[str(apartadas[1].id)], 'ok')
+        apartadas[1].refresh_from_db()
+        self.assertEqual((apartadas[1].estatus, apartadas[1].prestatario), ('p', self.test_user))
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.post('devolver_en_lote', {'ids': []}).status_code, 400)
+        self.assertEqual(self.post('prestar_en_lote', {'ids': [str(self.disponibles[0].id)]}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('devolver_en_lote')).status_code, 405)
+
+    def test_forbidden_user(self):
+        self.client.login(username='testuser', password='Lp4!zQ8m#eR1')
+
+        self.assertEqual(self.post('devolver_en_lote', {'ids': [str(self.prestadas[0].id)]}).status_code, 403)
+
+
+class ReservasViewTest(TestCase):
+    def setUp(self):
+        self.usuarios = [User.objects.create_user(username=f'testuser{numero}', password='Hx5!mQ2w@rT8') for numero in range(3)]
+        test_staff = User.objects.create_user(username='teststaff', password='Wd7@kN3x$tB5')
+        test_permission = Permission.objects.get(name='Can set book as returned')
+        test_staff.user_permissions.add(test_permission)
+
+        self.test_libro = create_book(1)
+        self.copia = InstanciaDeLibro.objects.create(libro=self.test_libro, estatus='d')
+        self.prestadas = [
+          InstanciaDeLibro.objects.create(
+            libro=self.test_libro,
+            estatus='p',
+            prestatario=test_staff,
+            fecha_de_devolucion=date.today() + timedelta(days=3),
+          )
+          for copia in range(2)
+        ]
+
+    def reservar(self, usuario):
+        self.client.login(username=usuario.username, password='Hx5!mQ2w@rT8')
+        return self.client.post(reverse('reservar_libro', args=[self.test_libro.pk]))
+
+    def test_available_copy_is_set_aside(self):
+        response = self.reservar(self.usuarios[0])
+        self.copia.refresh_from_db()
+
+        self.assertRedirects(response, reverse('misprestamos'))
+        self.assertEqual((self.copia.estatus, self.copia.prestatario), ('r', self.usuarios[0]))
+        self.assertEqual(Reserva.objects.get().instancia, self.copia)
+
+    def test_returned_copies_go_to_the_queue_in_order(self):
+        for usuario in self.usuarios:
+            self.reservar(usuario)
+
+        response = self.client.get(reverse('misprestamos'))
+        self.assertEqual(response.context['reservas'][0].posicion, 2)
+
+        self.client.login(username='teststaff', password='Wd7@kN3x$tB5')
+        self.client.post(reverse('devolver_libro', args=[self.prestadas[0].pk]))
+        self.client.post(reverse('devolver_en_lote'), json.dumps({'ids': [str(self.prestadas[1].pk)]}), content_type='application/json')
+
+        for copia, usuario in zip(self.prestadas, self.usuarios[1:]):
+            copia.refresh_from_db()
+            self.assertEqual((copia.estatus, copia.prestatario), ('r', usuario))
+        self.assertFalse(Reserva.objects.filter(asignada__isnull=True).exists())
+        self.test_libro.refresh_from_db()
+        self.assertEqual(self.test_libro.num_reservadas, 3)
+
+    def test_cancel_reservation(self):
+        self.reservar(self.usuarios[0])
+        self.reservar(self.usuarios[1])
+        reserva = Reserva.objects.get(usuario=self.usuarios[1])
+
+        self.client.post(reverse('cancelar_reserva', args=[reserva.pk]))
+        self.client.login(username='teststaff', password='Wd7@kN3x$tB5')
+        self.client.post(reverse('devolver_libro', args=[self.prestadas[0].pk]))
+        self.prestadas[0].refresh_from_db()
+
+        self.assertFalse(Reserva.objects.filter(pk=reserva.pk).exists())
+        self.assertEqual(self.prestadas[0].estatus, 'm')
+
+
+class ReportesViewTest(TestCase):
+    def setUp(self):
+        test_staff = User.objects.create_user(username='teststaff', password='Wd7@kN3x$tB5')
+        test_permission = Permission.objects.get(name='Can set book as returned')
+        test_staff.user_permissions.add(test_permission)
+
+        test_libro = create_book(1)
+        CirculacionDiaria.objects.create(
+          dia=date.today() - timedelta(days=1), libro=test_libro, prestamos=3,
+          devoluciones=2, devoluciones_con_duracion=2, tiempo_prestado=timedelta(days=10),
+        )
+        CirculacionDiaria.objects.create(dia=date.today() - timedelta(days=90), libro=test_libro, prestamos=7)
+        self.client.login(username='teststaff', password='Wd7@kN3x$tB5')
+
+    def test_reports_read_the_rollups(self):
+        response = self.client.get(reverse('reportes'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['prestamos'], 3)
+        self.assertEqual(response.context['duracion_promedio'], timedelta(days=5))
+        self.assertEqual([fila['total'] for fila in response.context['libros_mas_prestados']], [3])
+        self.assertEqual(
+          [(fila['libro__genero__nombre'], fila['total']) for fila in response.context['prestamos_por_genero']],
+          [('Ficción', 3)],
+        )
+
+        response = self.client.get(reverse('reportes'), {'dias': 365})
+        self.assertEqual(response.context['prestamos'], 10)
+
+
+class AutocompletarViewTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        test_staff = User.objects.create_user(username='teststaff', password='Wd7@kN3x$tB5')
+        test_permission = Permission.objects.get(name='Can set book as returned')
+        test_staff.user_permissions.add(test_permission)
+
+        self.test_autor = Autor.objects.create(nombre='Gabriel', apellido='García Márquez')
+        Libro.objects.create(titulo='Cien años de soledad', autor=self.test_autor)
+        Libro.objects.create(titulo='El amor en los tiempos del cólera', autor=self.test_autor)
+        for numero in range(20):
+            User.objects.create_user(username=f'lector{numero}')
+
+        self.client.login(username='teststaff', password='Wd7@kN3x$tB5')
+
+    def sugerencias(self, tipo, texto):
+        response = self.client.get(reverse('autocompletar', args=[tipo]), {'q': texto})
+        return [resultado['texto'] for resultado in response.json()['resultados']]
+
+    def test_prefix_suggestions(self):
+        self.assertEqual(self.sugerencias('libros', 'cien'), ['Cien años de soledad'])
+        self.assertEqual(self.sugerencias('libros', 'COLE'), ['El amor en los tiempos del cólera'])
+        self.assertEqual(self.sugerencias('autores', 'marq'), ['García Márquez, Gabriel'])
+        self.assertEqual(len(self.sugerencias('usuarios', 'lector')), 10)
+        self.assertEqual(self.sugerencias('libros', ''), [])
+
+    def test_changes_invalidate_cached_suggestions(self):
+        self.assertEqual(self.sugerencias('libros', 'cien'), ['Cien años de soledad'])
+        Libro.objects.create(titulo='Cien sonetos de amor')
+
+        self.assertEqual(self.sugerencias('libros', 'cien'), ['Cien años de soledad', 'Cien sonetos de amor'])
+
+    def test_unknown_type_and_forbidden_user(self):
+        self.assertEqual(self.client.get(reverse('autocompletar', args=['generos'])).status_code, 404)
+
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('autocompletar', args=['libros'])).status_code, 403)
+
+    def test_forms_only_render_selected_options(self):
+        response = self.client.get(reverse('prestamo_crear'))
+
+        self.assertNotContains(response, 'lector1')
+        self.assertContains(response, 'data-autocompletar="%s"' % reverse('autocompletar', args=['usuarios']))
+
+        libro = Libro.objects.get(titulo='Cien años de soledad')
+        response = self.client.get(reverse('libro_actualizar', args=[libro.pk]))
+
+        self.assertContains(response, '<option value="%s" selected>García Márquez, Gabriel</option>' % self.test_autor.pk, html=True)
+
+
+class ApiViewTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.test_libros = [create_book(numero) for numero in range(3)]
+        self.test_copia = InstanciaDeLibro.objects.create(libro=self.test_libros[0], estatus='d')
+
+    def test_sparse_fieldsets_and_cursor(self):
+        response = self.client.get(reverse('api_lista', args=['libros']), {'campos': 'titulo,generos', 'limite': 2})
+        datos = response.json()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(datos['resultados'][0]), ['id', 'titulo', 'generos'])
+        self.assertEqual(len(datos['resultados']), 2)
+        self.assertEqual(len(datos['resultados'][0]['generos']), 1)
+
+        datos = self.client.get(datos['siguiente']).json()
+
+        self.assertEqual([fila['id'] for fila in datos['resultados']], [self.test_libros[2].pk])
+        self.assertIsNone(datos['siguiente'])
+
+    def test_detail(self):
+        response = self.client.get(reverse('api_detalle', args=['copias', self.test_copia.pk]))
+
+        self.assertEqual(response.json(), {
+          'id': str(self.test_copia.pk), 'libro': self.test_libros[0].pk, 'estatus': 'd', 'fecha_de_devolucion': None,
+        })
+        self.assertEqual(self.client.get(reverse('api_detalle', args=['copias', 'abc'])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('api_detalle', args=['libros', 999])).status_code, 404)
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.client.get(reverse('api_lista', args=['usuarios'])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('api_lista', args=['libros']), {'campos': 'prestatario'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('api_lista', args=['libros']), {'cursor': 'abc'}).status_code, 400)
+        self.assertEqual(self.client.post(reverse('api_lista', args=['libros'])).status_code, 405)
+
+    def test_conditional_get(self):
+        url = reverse('api_lista', args=['autores'])
+        response = self.client.get(url)
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        Autor.objects.create(nombre='Nuevo', apellido='Autor')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+
+class ExportarViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        test_user = User.objects.create_user(username='testuser', password='Xe2#pM7q!jK4')
+        test_staff = User.objects.create_user(username='teststaff', password='Fb9$uT1w@nC6')
+        test_permission = Permission.objects.get(name='Can set book as returned')
+        test_staff.user_permissions.add(test_permission)
+
+        for libro_id in range(3):
+            test_libro = create_book(libro_id)
+            InstanciaDeLibro.objects.create(
+              libro=test_libro,
+              prestatario=test_user,
+              fecha_de_devolucion=date(2020, 10, libro_id + 1),
+              estatus='p',
+            )
+
+    def export(self, nombre, formato):
+        self.client.login(username='teststaff', password='Fb9$uT1w@nC6')
+        response = self.client.get(reverse('exportar', args=[nombre, formato]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+
+        return b''.join(response.streaming_content).decode()
+
+    def test_export_prestamos_csv(self):
+        lineas = self.export('prestamos', 'csv').splitlines()
+
+        self.assertEqual(lineas[0], 'id,titulo,prestatario,fecha_de_devolucion,estatus')
+        self.assertEqual(len(lineas), 4)
+        self.assertIn('Mi libro de pruebas 0,testuser,2020-10-01,p', self.export('prestamos', 'csv'))
+
+    def test_export_libros_json(self):
+        libros = json.loads(self.export('libros', 'json'))
+
+        self.assertEqual(len(libros), 3)
+        self.assertEqual(libros[0]['titulo'], 'Mi libro de pruebas 0')
+        self.assertEqual(libros[0]['generos'], 'Ficción')
+
+    def test_forbidden_and_unknown_exports(self):
+        self.client.login(username='testuser', password='Xe2#pM7q!jK4')
+
+        self.assertEqual(self.client.get(reverse('exportar', args=['libros', 'csv'])).status_code, 302)
+
+        self.client.login(username='teststaff', password='Fb9$uT1w@nC6')
+
+        self.assertEqual(self.client.get(reverse('exportar', args=['usuarios', 'csv'])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('exportar', args=['libros', 'xml'])).status_code, 404)
+
+
+@override_settings(ROOT_URLCONF='librerialocal.urls_asgi')
+class AsgiViewTest(TransactionTestCase):
+    # Las vistas asincronas consultan desde otros hilos, que solo ven datos confirmados
+    def setUp(self):
+        cache.clear()
+        self.test_libro = create_book(1)
+        self.async_client = AsyncClient()
+
+    async def test_read_only_views_are_async(self):
+        response = await self.async_client.get(reverse('index'))
+
+        self.assertContains(response, '<strong>Libros:</strong> 1')
+
+        for url in (
+          reverse('libros'),
+          self.test_libro.get_absolute_url(),
+          reverse('api_detalle', args=['libros', self.test_libro.pk]),
+        ):
+            response = await self.async_client.get(url)
+
+            self.assertEqual(response.status_code, 200)
+            self.assertContains(response, self.test_libro.titulo)
+
+    async def test_write_views_stay_sync(self):
+        response = await self.async_client.get(reverse('libro_crear'))
+
+        self.assertRedirects(response, '/accounts/login/?next=/catalogo/libros/crear/', fetch_redirect_response=False)
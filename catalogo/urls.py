@@ -1,14 +1,16 @@
-from . import views
+from . import api, views
 
 from django.urls import path
 
 urlpatterns = [
     path('', views.index, name='index'),
+    path('buscar/', views.buscar, name='buscar'),
     path('libros/', views.VistaDeListaDeLibros.as_view(), name='libros'),
     path('libros/crear/', views.CrearLibro.as_view(), name='libro_crear'),
     path('libros/<int:pk>', views.VistaDeDetallesDeLibros.as_view(), name='detalle_del_libro'),
     path('libros/<int:pk>/actualizar/', views.ActualizarLibro.as_view(), name='libro_actualizar'),
     path('libros/<int:pk>/eliminar/', views.EliminarLibro.as_view(), name='libro_eliminar'),
+    path('libros/<int:pk>/reservar/', views.reservar_libro, name='reservar_libro'),
     path('libros/<uuid:pk>/devolver/', views.devolver_libro, name='devolver_libro'),
     path('libros/<uuid:pk>/renovar/', views.renovar_libro, name='renovar_libro'),
     path('autores/', views.VistaDeListaDeAutores.as_view(), name='autores'),
@@ -18,5 +20,15 @@ urlpatterns = [
     path('autores/<int:pk>/eliminar/', views.EliminarAutor.as_view(), name='autor_eliminar'),
     path('mislibros/', views.VistaDeListaDeLibrosPrestados.as_view(), name='misprestamos'),
     path('prestamos/', views.VistaDePrestamosStaff.as_view(), name='todoslosprestamos'),
+    path('prestamos/atrasados/', views.VistaDePrestamosAtrasados.as_view(), name='prestamosatrasados'),
+    path('reservas/<int:pk>/cancelar/', views.cancelar_reserva, name='cancelar_reserva'),
     path('prestamos/crear/', views.CrearPrestamo.as_view(), name='prestamo_crear'),
+    path('autocompletar/<str:tipo>/', views.autocompletar, name='autocompletar'),
+    path('api/<str:recurso>/', api.lista, name='api_lista'),
+    path('api/<str:recurso>/<str:pk>/', api.detalle, name='api_detalle'),
+    path('reportes/', views.ver_reportes, name='reportes'),
+    path('exportar/<str:nombre>.<str:formato>', views.exportar, name='exportar'),
+    path('prestamos/lote/prestar/', views.prestar_en_lote, name='prestar_en_lote'),
+    path('prestamos/lote/devolver/', views.devolver_en_lote, name='devolver_en_lote'),
+    path('prestamos/lote/renovar/', views.renovar_en_lote, name='renovar_en_lote'),
 ]
@@ -0,0 +1,15 @@
+from django.urls import URLPattern
+
+from catalogo.asincrono import asincrona
+from catalogo.urls import urlpatterns as urlpatterns_wsgi
+
+# Vistas de solo lectura que se sirven de forma asincrona con ASGI; el resto se mantiene sincrono
+VISTAS_ASINCRONAS = (
+    'index', 'libros', 'detalle_del_libro', 'autores', 'detalle_del_autor', 'api_lista', 'api_detalle',
+)
+
+urlpatterns = [
+    URLPattern(patron.pattern, asincrona(patron.callback), patron.default_args, patron.name)
+    if patron.name in VISTAS_ASINCRONAS else patron
+    for patron in urlpatterns_wsgi
+]
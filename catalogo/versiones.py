@@ -0,0 +1,147 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import (
+    get_cache_key, get_conditional_response, learn_cache_key, patch_cache_control, patch_vary_headers,
+)
+from django.utils.http import http_date, quote_etag
+
+from catalogo.replicas import primaria_si_cambio_desde
+
+TIEMPO_DE_VIDA_DE_PAGINAS = 60 * 60
+
+
+def _vida_de_versiones():
+    # Una marca que expira se vuelve a crear con la hora actual, lo que invalida las paginas y
+    # fragmentos guardados; asi un worker que no vio un cambio (cache por proceso) no los sirve para siempre
+    return min(settings.VIDA_DE_VERSIONES, TIEMPO_DE_VIDA_DE_PAGINAS)
+
+
+def _clave_de_version(modelo):
+    return f'catalogo:version:{modelo._meta.label_lower}'
+
+
+def incrementar_version(modelo):
+    """Marca que el contenido de un modelo cambio (se llama al guardar o eliminar)"""
+    cache.set(_clave_de_version(modelo), time.time(), _vida_de_versiones())
+
+
+def _clave_de_version_de_objeto(modelo, pk):
+    return f'{_clave_de_version(modelo)}:{pk}'
+
+
+def incrementar_version_de_objetos(modelo, pks):
+    """Marca que cambiaron los objetos indicados; invalida sus fragmentos de templates"""
+    ahora = time.time()
+    cache.set_many({_clave_de_version_de_objeto(modelo, pk): ahora for pk in pks if pk is not None}, _vida_de_versiones())
+
+
+def _ultima_version(claves):
+    versiones = cache.get_many(claves)
+
+    for clave in claves:
+        if clave not in versiones:
+            # Sin marca guardada no se sabe cuando cambio: se asume que ahora. Si la marca expira o se
+            # elimina justo despues de guardarla, get_or_set devuelve la generada aqui en lugar de None
+            versiones[clave] = cache.get_or_set(clave, time.time, _vida_de_versiones())
+
+    return max(versiones.values())
+
+
+def version_de(*modelos):
+    """Devuelve la marca de tiempo del ultimo cambio entre los modelos indicados"""
+    return _ultima_version([_clave_de_version(modelo) for modelo in modelos])
+
+
+def version_de_fragmento(objetos, modelos=()):
+    """Version para la clave de un fragmento de template que depende de 'objetos' (pares (modelo, pk)) y 'modelos'"""
+    version = _ultima_version(
+        [_clave_de_version_de_objeto(modelo, pk) for modelo, pk in objetos] + [_clave_de_version(m) for m in modelos]
+    )
+    primaria_si_cambio_desde(version)
+    return version
+
+
+def validadores(request, *modelos):
+    """Devuelve (version, etag, ultima_modificacion) de la respuesta a 'request' segun la version de los modelos"""
+    version = version_de(*modelos)
+    primaria_si_cambio_desde(version)
+    etag = quote_etag(hashlib.md5(f'{version}:{request.get_full_path()}'.encode()).hexdigest())
+    return version, etag, int(version)
+
+
+def agregar_validadores(response, etag, ultima_modificacion):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(ultima_modificacion)
+
+
+def condicional(*modelos):
+    """Decorator que responde 304 con ETag/Last-Modified a cualquier usuario; para vistas que no dependen de la sesion"""
+    def decorador(vista):
+        @wraps(vista)
+        def envoltura(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return vista(request, *args, **kwargs)
+
+            version, etag, ultima_modificacion = validadores(request, *modelos)
+            response = get_conditional_response(request, etag=etag, last_modified=ultima_modificacion)
+            if response is None:
+                response = vista(request, *args, **kwargs)
+                if response.status_code == 200:
+                    agregar_validadores(response, etag, ultima_modificacion)
+                    patch_cache_control(response, max_age=0, public=True)
+
+            return response
+
+        return envoltura
+
+    return decorador
+
+
+def cache_publica(*modelos, timeout=TIEMPO_DE_VIDA_DE_PAGINAS):
+    """Decorator para paginas publicas que solo dependen de 'modelos'.
+
+    A los usuarios anonimos se les responde con ETag/Last-Modified (304 si no
+    hubo cambios) y con la pagina completa guardada en la cache, cuya clave
+    incluye la version de los modelos y respeta los encabezados Vary.
+    """
+    def decorador(vista):
+        @wraps(vista)
+        def envoltura(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or request.user.is_authenticated:
+                return vista(request, *args, **kwargs)
+
+            version, etag, ultima_modificacion = validadores(request, *modelos)
+
+            response = get_conditional_response(request, etag=etag, last_modified=ultima_modificacion)
+            if response is not None:
+                return response
+
+            prefijo = f'catalogo:{version}'
+            clave = get_cache_key(request, prefijo, 'GET', cache=cache)
+            response = cache.get(clave) if clave else None
+
+            if response is None:
+                response = vista(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+
+                agregar_validadores(response, etag, ultima_modificacion)
+                patch_cache_control(response, max_age=0, public=True)
+                # La vista consulta request.user, por lo que la respuesta depende de la sesion
+                patch_vary_headers(response, ('Cookie',))
+                clave = learn_cache_key(request, response, timeout, prefijo, cache=cache)
+
+                if hasattr(response, 'render') and callable(response.render):
+                    response.add_post_render_callback(lambda r: cache.set(clave, r, timeout))
+                else:
+                    cache.set(clave, response, timeout)
+
+            return response
+
+        return envoltura
+
+    return decorador
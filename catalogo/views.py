@@ -1,89 +1,206 @@
+import json
 from datetime import date, timedelta
 
 from django.shortcuts import render, get_object_or_404
 from django.views import generic
 from django.views.generic.edit import CreateView, UpdateView, DeleteView
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
-from django.contrib.auth.decorators import permission_required
+from django.contrib.auth.decorators import login_required, permission_required
+from django.contrib.auth.models import User
 from django.forms import ModelForm
-from django.http import HttpResponseRedirect
+from django.http import Http404, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
 from django.urls import reverse, reverse_lazy
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import require_POST
 from django.core.exceptions import ValidationError
-
-from catalogo.models import Libro, Autor, InstanciaDeLibro, Genero, Lenguaje
-
-
+from django.db import router
+from django.db.models import Q
+
+from catalogo import circulacion, reservas
+from catalogo.autocompletar import FUENTES, SeleccionPerezosa, sugerencias
+from catalogo.circulacion import TransicionInvalida
+from catalogo.busqueda import buscar_libros
+from catalogo.contadores import PALABRA_BUSCADA, obtener_contadores
+from catalogo.estadisticas import reportes
+from catalogo.exportacion import EXPORTACIONES, FORMATOS
+from catalogo.models import Libro, Autor, InstanciaDeLibro, Genero, Lenguaje, Reserva, ResumenDeAtrasos
+from catalogo.paginacion import PaginacionPorCursorMixin
+from catalogo.replicas import en_replica
+from catalogo.versiones import cache_publica, version_de_fragmento
+
+
+@en_replica
+@cache_publica(Libro, Autor, InstanciaDeLibro)
 def index(request):
     """View function para la pagina principal"""
-    num_libros = Libro.objects.all().count()
-    num_instancias = InstanciaDeLibro.objects.all().count()
-    num_autores = Autor.objects.count() # 'all()' esta implicito
+    contexto = {
+        **obtener_contadores(),
+        # Los titulos que contienen la palabra, como antes de guardar los contadores en la cache; el
+        # template muestra el conteo. Es un queryset perezoso: solo se consulta si un template lo usa
+        'num_libros_palabra': Libro.objects.filter(titulo__icontains=PALABRA_BUSCADA).values_list('titulo'),
+    }
 
-    num_instancias_disponibles = InstanciaDeLibro.objects.filter(estatus__exact='d').count()
-    
-    palabra = 'Harry' # input('Ingresa el título o una palabra del título para ser buscada:')
-    num_libros_palabra = list(Libro.objects.filter(titulo__icontains=palabra).values_list('titulo'))
+    return render(request, 'index.html', context=contexto)
+
+
+@en_replica
+def buscar(request):
+    """View function para buscar libros por titulo, resumen, autor o genero"""
+    consulta = request.GET.get('q', '')
 
     contexto = {
-        'num_libros': num_libros,
-        'num_instancias': num_instancias,
-        'num_autores': num_autores,
-        'num_instancias_disponibles': num_instancias_disponibles,
-        'num_libros_palabra': num_libros_palabra,
+        'consulta': consulta,
+        # El indice de busqueda se consulta con SQL propio, que no pasa por el enrutador
+        'lista_de_libros': buscar_libros(consulta, using=router.db_for_read(Libro)),
     }
 
-    return render(request, 'index.html', context=contexto)
+    return render(request, 'libros/busqueda.html', context=contexto)
 
 
-class VistaDeListaDeLibros(generic.ListView):
+@method_decorator(en_replica, name='dispatch')
+@method_decorator(cache_publica(Libro, Autor, InstanciaDeLibro), name='dispatch')
+class VistaDeListaDeLibros(PaginacionPorCursorMixin, generic.ListView):
     """View function para todos los libros"""
     model = Libro
+    queryset = Libro.objects.select_related('autor').only(
+        'titulo', 'num_copias', 'num_disponibles', 'autor__nombre', 'autor__apellido',
+    )
     context_object_name = 'lista_de_libros'
     template_name = 'libros/lista_de_libros.html'
     paginate_by = 10
+    campos_del_cursor = ('titulo', 'id')
+    mostrar_total = True
+
 
+class FragmentoVersionadoMixin:
+    """Mixin para DetailView que pasa al template la version de sus fragmentos guardados en la cache.
 
-class VistaDeDetallesDeLibros(generic.DetailView):
+    La version depende del objeto y de los modelos de 'dependencias_del_fragmento'. Se lee antes
+    que el objeto para que, si cambio hace poco, el objeto tambien se lea de la base principal.
+    Las relaciones que solo usa el fragmento no se deben precargar: se consultan si no esta guardado.
+    """
+    dependencias_del_fragmento = ()
+
+    def get_object(self, queryset=None):
+        self.version_del_fragmento = version_de_fragmento(
+            [(self.model, self.kwargs[self.pk_url_kwarg])], self.dependencias_del_fragmento,
+        )
+        return super().get_object(queryset)
+
+    def get_context_data(self, **kwargs):
+        return super().get_context_data(version_del_fragmento=self.version_del_fragmento, **kwargs)
+
+
+@method_decorator(en_replica, name='dispatch')
+@method_decorator(cache_publica(Libro, Autor, Lenguaje, Genero, InstanciaDeLibro), name='dispatch')
+class VistaDeDetallesDeLibros(FragmentoVersionadoMixin, generic.DetailView):
     """View function para los detalles de un libro"""
     model = Libro
+    queryset = Libro.objects.select_related('autor', 'lenguaje')
     template_name = 'libros/detalle_del_libro.html'
+    dependencias_del_fragmento = (Autor, Genero, Lenguaje)
+
+    def get_context_data(self, **kwargs):
+        # Los atrasos de las copias guardadas cambian con la fecha
+        return super().get_context_data(hoy=date.today(), **kwargs)
 
 
-class VistaDeListaDeAutores(generic.ListView):
+@method_decorator(en_replica, name='dispatch')
+@method_decorator(cache_publica(Autor), name='dispatch')
+class VistaDeListaDeAutores(PaginacionPorCursorMixin, generic.ListView):
     """View function para todos los autores"""
     model = Autor
     context_object_name = 'lista_de_autores'
     template_name = 'autores/lista_de_autores.html'
     paginate_by = 10
+    campos_del_cursor = ('apellido', 'nombre', 'id')
+    mostrar_total = True
 
 
-class VistaDeDetallesDeAutores(generic.DetailView):
+@method_decorator(en_replica, name='dispatch')
+@method_decorator(cache_publica(Autor, Libro), name='dispatch')
+class VistaDeDetallesDeAutores(FragmentoVersionadoMixin, generic.DetailView):
     """View function para los detalles de un autor"""
     model = Autor
     template_name = 'autores/detalle_del_autor.html'
 
+    def get_context_data(self, **kwargs):
+        contexto = super().get_context_data(**kwargs)
+        # Perezoso: solo se consulta si el fragmento con los libros no esta en la cache
+        contexto['libros_del_autor'] = self.object.libro_set.only('titulo', 'resumen', 'autor_id')
+        return contexto
+
 
-class VistaDeListaDeLibrosPrestados(LoginRequiredMixin, generic.ListView):
+class VistaDeListaDeLibrosPrestados(LoginRequiredMixin, PaginacionPorCursorMixin, generic.ListView):
     """View function para mis prestamos"""
     model = InstanciaDeLibro
     context_object_name = 'instanciadelibro_lista'
     template_name = 'libros/instanciadelibro_lista_prestados_usuario.html'
     paginate_by = 10
+    campos_del_cursor = ('fecha_de_devolucion', 'id')
     
     def get_queryset(self):
-        return InstanciaDeLibro.objects.filter(prestatario=self.request.user).filter(estatus__exact='p').order_by('fecha_de_devolucion')
-
-
-class VistaDePrestamosStaff(PermissionRequiredMixin, generic.ListView):
+        return InstanciaDeLibro.objects.filter(prestatario=self.request.user).filter(estatus__exact='p').select_related('libro')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Las reservas pendientes y las copias apartadas que todavia no se retiran
+        context['reservas'] = list(Reserva.objects.filter(
+            Q(asignada__isnull=True) | Q(instancia__estatus='r', instancia__prestatario=self.request.user),
+            usuario=self.request.user,
+        ).select_related('libro', 'instancia'))
+        for reserva in context['reservas']:
+            if reserva.asignada is None:
+                reserva.posicion = reservas.posicion_en_la_fila(reserva)
+        return context
+
+
+class VistaDePrestamosStaff(PermissionRequiredMixin, PaginacionPorCursorMixin, generic.ListView):
     """View function para todos los prestamos"""
     permission_required = 'catalogo.can_mark_returned'
     model = InstanciaDeLibro
     context_object_name = 'instanciadelibro_lista_staff'
     template_name = 'libros/instanciadelibro_lista_prestados_staff.html'
     paginate_by = 10
+    campos_del_cursor = ('fecha_de_devolucion', 'id')
     
     def get_queryset(self):
-        return InstanciaDeLibro.objects.filter(estatus__exact='p').order_by('fecha_de_devolucion')
+        return InstanciaDeLibro.objects.filter(estatus__exact='p').select_related('libro', 'prestatario')
+
+
+class VistaDePrestamosAtrasados(PermissionRequiredMixin, PaginacionPorCursorMixin, generic.ListView):
+    """View function para los prestamos atrasados, empezando por los de mayor atraso"""
+    permission_required = 'catalogo.can_mark_returned'
+    model = InstanciaDeLibro
+    context_object_name = 'prestamos_atrasados'
+    template_name = 'libros/prestamos_atrasados.html'
+    paginate_by = 20
+    campos_del_cursor = ('fecha_de_devolucion', 'id')
+    mostrar_total = True
+
+    def get_queryset(self):
+        return InstanciaDeLibro.objects.atrasados().con_dias_de_atraso().select_related('libro', 'prestatario')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['resumenes'] = ResumenDeAtrasos.objects.select_related('prestatario')[:10]
+        return context
+
+
+@permission_required('catalogo.can_mark_returned')
+def ver_reportes(request):
+    """View function para los reportes de circulacion, calculados con los resumenes diarios"""
+    try:
+        dias = min(max(int(request.GET.get('dias', 30)), 1), 3660)
+    except ValueError:
+        dias = 30
+
+    hasta = date.today()
+    desde = hasta - timedelta(days=dias - 1)
+    context = reportes(desde, hasta)
+    context.update({'dias': dias, 'desde': desde, 'hasta': hasta})
+
+    return render(request, 'libros/reportes.html', context)
 
 
 class FormDevolverLibro(ModelForm):
@@ -96,27 +213,30 @@ class FormDevolverLibro(ModelForm):
 
 @permission_required('catalogo.can_mark_returned')
 def devolver_libro(request, pk):
-    instancia_de_libro = get_object_or_404(InstanciaDeLibro, pk=pk)
+    instancia_de_libro = get_object_or_404(InstanciaDeLibro.objects.select_related('libro', 'prestatario'), pk=pk)
+    error = None
 
     if request.method == 'POST':
         form = FormDevolverLibro(request.POST)
 
-        instancia_de_libro.fecha_de_devolucion = date.today() + timedelta(weeks=2)
-        instancia_de_libro.estatus = 'm'
-        instancia_de_libro.prestatario = None
-        instancia_de_libro.save()
-
-        return HttpResponseRedirect(reverse('todoslosprestamos'))
+        try:
+            # Si alguien espera este libro, la copia queda apartada para esa persona
+            circulacion.devolver(instancia_de_libro)
+        except TransicionInvalida as conflicto:
+            error = str(conflicto)
+        else:
+            return HttpResponseRedirect(reverse('todoslosprestamos'))
 
     else:
         form = FormRenovarLibro()
 
-        context = {
-          'form': form,
-          'instancia_de_libro': instancia_de_libro,
-        }
+    context = {
+      'form': form,
+      'instancia_de_libro': instancia_de_libro,
+      'error': error,
+    }
 
-        return render(request, 'libros/devolver_libro.html', context)
+    return render(request, 'libros/devolver_libro.html', context, status=409 if error else 200)
 
 
 class FormRenovarLibro(ModelForm):
@@ -142,7 +262,7 @@ class FormRenovarLibro(ModelForm):
 
 @permission_required('catalogo.can_mark_returned')
 def renovar_libro(request, pk):
-    instancia_de_libro = get_object_or_404(InstanciaDeLibro, pk=pk)
+    instancia_de_libro = get_object_or_404(InstanciaDeLibro.objects.select_related('libro', 'prestatario'), pk=pk)
     fecha_de_renovacion_propuesta = date.today() + timedelta(weeks=3)
     form = FormRenovarLibro(initial={'fecha_de_devolucion': fecha_de_renovacion_propuesta})
 
@@ -151,10 +271,12 @@ def renovar_libro(request, pk):
         form = FormRenovarLibro(request.POST, initial={'fecha_de_devolucion': fecha_de_renovacion_propuesta})
 
         if form.is_valid():
-            instancia_de_libro.fecha_de_devolucion = form.cleaned_data['fecha_de_devolucion']
-            instancia_de_libro.save()
-
-            return HttpResponseRedirect(reverse('todoslosprestamos'))
+            try:
+                circulacion.renovar(instancia_de_libro, form.cleaned_data['fecha_de_devolucion'])
+            except TransicionInvalida as error:
+                form.add_error(None, str(error))
+            else:
+                return HttpResponseRedirect(reverse('todoslosprestamos'))
 
     context = {
       'form': form,
@@ -164,11 +286,147 @@ def renovar_libro(request, pk):
     return render(request, 'libros/renovar_libro.html', context)
 
 
+@login_required
+@require_POST
+def reservar_libro(request, pk):
+    """View function para reservar un libro o entrar en su fila de espera"""
+    libro = get_object_or_404(Libro, pk=pk)
+    circulacion.reservar(libro, request.user)
+
+    return HttpResponseRedirect(reverse('misprestamos'))
+
+
+@login_required
+@require_POST
+def cancelar_reserva(request, pk):
+    """View function para salir de la fila de espera de un libro"""
+    reserva = get_object_or_404(Reserva, pk=pk, usuario=request.user, asignada__isnull=True)
+    reserva.delete()
+
+    return HttpResponseRedirect(reverse('misprestamos'))
+
+
+def _procesar_lote(request, procesar):
+    """Lee los ids de copias del cuerpo JSON y responde con el resultado de cada una"""
+    try:
+        datos = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'error': 'JSON inválido'}, status=400)
+
+    ids = datos.get('ids') if isinstance(datos, dict) else None
+    if not isinstance(ids, list) or not ids:
+        return JsonResponse({'error': 'Se requiere una lista de ids'}, status=400)
+    if len(ids) > circulacion.MAXIMO_POR_LOTE:
+        return JsonResponse({'error': f'Máximo {circulacion.MAXIMO_POR_LOTE} copias por lote'}, status=400)
+
+    try:
+        resultados = procesar(ids, datos)
+    except ValidationError as error:
+        return JsonResponse({'error': error.messages}, status=400)
+
+    return JsonResponse({
+        'resultados': resultados,
+        'procesados': sum(resultado == circulacion.OK for resultado in resultados.values()),
+    })
+
+
+def _fecha_del_lote(datos, requerida):
+    if 'fecha_de_devolucion' not in datos and not requerida:
+        return None
+
+    form = FormRenovarLibro(data={'fecha_de_devolucion': datos.get('fecha_de_devolucion')})
+    if not form.is_valid():
+        raise ValidationError(form.errors['fecha_de_devolucion'])
+
+    return form.cleaned_data['fecha_de_devolucion']
+
+
+@require_POST
+@permission_required('catalogo.can_mark_returned', raise_exception=True)
+def prestar_en_lote(request):
+    """View function para prestar varias copias disponibles a un usuario en una sola transaccion"""
+    def procesar(ids, datos):
+        try:
+            prestatario = User.objects.get(pk=datos.get('prestatario'))
+        except (User.DoesNotExist, ValueError, TypeError):
+            raise ValidationError('Prestatario inválido')
+
+        return circulacion.prestar_lote(ids, prestatario, _fecha_del_lote(datos, requerida=False))
+
+    return _procesar_lote(request, procesar)
+
+
+@require_POST
+@permission_required('catalogo.can_mark_returned', raise_exception=True)
+def devolver_en_lote(request):
+    """View function para recibir varias copias prestadas en una sola transaccion"""
+    return _procesar_lote(request, lambda ids, datos: circulacion.devolver_lote(ids))
+
+
+@require_POST
+@permission_required('catalogo.can_mark_returned', raise_exception=True)
+def renovar_en_lote(request):
+    """View function para renovar varias copias prestadas en una sola transaccion"""
+    def procesar(ids, datos):
+        return circulacion.renovar_lote(ids, _fecha_del_lote(datos, requerida=True))
+
+    return _procesar_lote(request, procesar)
+
+
+@permission_required('catalogo.can_mark_returned')
+def exportar(request, nombre, formato):
+    """View function para descargar los prestamos o el catalogo completo en CSV o JSON sin cargarlos en memoria"""
+    if nombre not in EXPORTACIONES or formato not in FORMATOS:
+        raise Http404('Exportación inválida')
+
+    columnas, filas = EXPORTACIONES[nombre]
+    generar, tipo = FORMATOS[formato]
+
+    response = StreamingHttpResponse(generar(columnas, filas()), content_type=f'{tipo}; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{nombre}.{formato}"'
+
+    return response
+
+
+@permission_required('catalogo.can_mark_returned', raise_exception=True)
+def autocompletar(request, tipo):
+    """View function que sugiere libros, autores, lenguajes o usuarios a partir de las primeras letras"""
+    if tipo not in FUENTES:
+        raise Http404('Tipo desconocido')
+
+    resultados = sugerencias(tipo, request.GET.get('q', ''))
+    return JsonResponse({'resultados': [{'id': pk, 'texto': texto} for pk, texto in resultados]})
+
+
+class FormLibro(ModelForm):
+    """Form function para libros que no carga todos los autores y lenguajes en la pagina"""
+
+    class Meta:
+        model = Libro
+        fields = '__all__'
+        widgets = {
+            'autor': SeleccionPerezosa('autores'),
+            'lenguaje': SeleccionPerezosa('lenguajes'),
+        }
+
+
+class FormPrestamo(ModelForm):
+    """Form function para copias que no carga todos los libros y usuarios en la pagina"""
+
+    class Meta:
+        model = InstanciaDeLibro
+        fields = '__all__'
+        widgets = {
+            'libro': SeleccionPerezosa('libros'),
+            'prestatario': SeleccionPerezosa('usuarios'),
+        }
+
+
 class CrearLibro(PermissionRequiredMixin, CreateView):
     """View function para que staff pueda añadir un libro a la base de datos"""
     permission_required = 'catalogo.can_mark_returned'
     model = Libro
-    fields = '__all__'
+    form_class = FormLibro
     template_name = 'generic_form.html'
 
 
@@ -176,7 +434,7 @@ class ActualizarLibro(PermissionRequiredMixin, UpdateView):
     """View function para que staff pueda modificar un libro en la base de datos"""
     permission_required = 'catalogo.can_mark_returned'
     model = Libro
-    fields = '__all__'
+    form_class = FormLibro
     template_name = 'generic_form.html'
 
 
@@ -216,5 +474,5 @@ class CrearPrestamo(PermissionRequiredMixin, CreateView):
     """View function para que staff pueda añadir una instancia de libro a la base de datos"""
     permission_required = 'catalogo.can_mark_returned'
     model = InstanciaDeLibro
-    fields = '__all__'
+    form_class = FormPrestamo
     template_name = 'generic_form.html'
@@ -4,10 +4,10 @@ Django settings for librerialocal project.
 Generated by 'django-admin startproject' using Django 2.2.5.
 
 For more information on this file, see
-https://docs.djangoproject.com/en/2.2/topics/settings/
+https://docs.djangoproject.com/en/3.2/topics/settings/
 
 For the full list of settings and their values, see
-https://docs.djangoproject.com/en/2.2/ref/settings/
+https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
 import os
@@ -19,7 +19,7 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 
 # Quick-start development settings - unsuitable for production
-# See https://docs.djangoproject.com/en/2.2/howto/deployment/checklist/
+# See https://docs.djangoproject.com/en/3.2/howto/deployment/checklist/
 
 # SECURITY WARNING: keep the secret key used in production secret!
 # SECRET_KEY = 'u!+wb)ekn8+!@lczfzp8msnkqoyh)kd7rrt(9h4g8q*lzmaxra'
@@ -42,25 +42,29 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
-    'catalogo',
+    'catalogo.apps.CatalogoConfig',
 ]
 
 MIDDLEWARE = [
+    'catalogo.metricas.MiddlewareDeMetricas',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'catalogo.replicas.MiddlewareDeReplicas',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'librerialocal.urls'
+# asgi.py usa 'librerialocal.urls_asgi', con variantes asincronas de las vistas de solo lectura
+ROOT_URLCONF = os.environ.get('DJANGO_ROOT_URLCONF', 'librerialocal.urls')
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates que ademas mide el tiempo de renderizado para catalogo.metricas
+        'BACKEND': 'catalogo.metricas.PlantillasMedidas',
         'DIRS': [
             os.path.join(BASE_DIR, 'templates'),
         ],
@@ -77,10 +81,21 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'librerialocal.wsgi.application'
+ASGI_APPLICATION = 'librerialocal.asgi.application'
+
+# Metricas por peticion (encabezado Server-Timing y /metrics); desactivadas el middleware no se carga
+METRICAS_ACTIVAS = os.environ.get('DJANGO_METRICAS', '') == 'True'
+# Las peticiones con mas consultas que estas se registran como advertencia
+PRESUPUESTO_DE_CONSULTAS = int(os.environ.get('DJANGO_PRESUPUESTO_DE_CONSULTAS', 30))
+# /metrics solo responde al personal del sitio o a peticiones con 'Authorization: Bearer <token>'
+TOKEN_DE_METRICAS = os.environ.get('DJANGO_METRICAS_TOKEN', '')
+
+# Hilos en los que las vistas asincronas ejecutan el ORM; cada hilo mantiene su propia conexion
+HILOS_DE_VISTAS_ASINCRONAS = int(os.environ.get('DJANGO_HILOS_ASINCRONOS', 8))
 
 
 # Database
-# https://docs.djangoproject.com/en/2.2/ref/settings/#databases
+# https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
 DATABASES = {
     'default': {
@@ -89,9 +104,34 @@ DATABASES = {
     }
 }
 
+# Default primary key field type
+# https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
+# AutoField conserva el esquema de las migraciones existentes
+DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+# Con varios workers de gunicorn se debe usar una cache compartida (ejemplo: memcached)
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('DJANGO_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('DJANGO_CACHE_LOCATION', 'librerialocal'),
+    }
+}
+
+# Las marcas de version de catalogo/versiones.py (ETags, paginas y fragmentos guardados) viven en esta
+# cache. Con LocMemCache cada worker tiene las suyas y no se entera de los cambios guardados por otro,
+# por lo que las marcas expiran a los DJANGO_VIDA_DE_VERSIONES segundos: ese es el tiempo maximo que un
+# worker puede servir una pagina vieja. Con una cache compartida duran lo mismo que las paginas (1 hora).
+VIDA_DE_VERSIONES = int(os.environ.get(
+    'DJANGO_VIDA_DE_VERSIONES', 60 if CACHES['default']['BACKEND'].endswith('LocMemCache') else 60 * 60,
+))
+
 
 # Password validation
-# https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
+# https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -110,7 +150,7 @@ AUTH_PASSWORD_VALIDATORS = [
 
 
 # Internationalization
-# https://docs.djangoproject.com/en/2.2/topics/i18n/
+# https://docs.djangoproject.com/en/3.2/topics/i18n/
 
 LANGUAGE_CODE = 'es'
 
@@ -124,7 +164,7 @@ USE_TZ = True
 
 
 # Static files (CSS, JavaScript, Images)
-# https://docs.djangoproject.com/en/3.1/howto/static-files/
+# https://docs.djangoproject.com/en/3.2/howto/static-files/
 
 # The absolute path to the directory where collectstatic will collect static files for deployment.
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
@@ -142,3 +182,22 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 # Heroku: Update database configuration from $DATABASE_URL.
 db_from_env = dj_database_url.config(conn_max_age=500)
 DATABASES['default'].update(db_from_env)
+
+# Replicas de solo lectura: URLs de base de datos separadas por espacios en $DJANGO_REPLICAS. Las vistas
+# de consulta del catalogo leen de ellas (catalogo/replicas.py); con una sola base todo va a 'default'
+REPLICAS_DE_LECTURA = []
+for numero, url in enumerate(os.environ.get('DJANGO_REPLICAS', '').split(), start=1):
+    DATABASES[f'replica{numero}'] = {**dj_database_url.parse(url, conn_max_age=500), 'TEST': {'MIRROR': 'default'}}
+    REPLICAS_DE_LECTURA.append(f'replica{numero}')
+DATABASE_ROUTERS = ['catalogo.replicas.EnrutadorDeReplicas']
+# Segundos que una sesion lee de la principal despues de escribir (el atraso maximo esperado de las replicas)
+RETRASO_DE_REPLICAS = int(os.environ.get('DJANGO_RETRASO_DE_REPLICAS', 5))
+
+# Perfil de rendimiento de SQLite: WAL y pragmas por conexion (catalogo/sqlite), transacciones que
+# toman el candado de escritura al empezar y conexiones persistentes en cada worker
+SQLITE_OPTIMIZADO = os.environ.get('DJANGO_SQLITE_OPTIMIZADO', '') == 'True'
+if SQLITE_OPTIMIZADO and DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    DATABASES['default']['ENGINE'] = 'catalogo.sqlite'
+    DATABASES['default']['CONN_MAX_AGE'] = None
+    # Segundos que el modulo sqlite3 espera un candado (el busy_timeout de la conexion)
+    DATABASES['default'].setdefault('OPTIONS', {})['timeout'] = 5
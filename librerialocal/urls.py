@@ -1,7 +1,7 @@
 """librerialocal URL Configuration
 
 The `urlpatterns` list routes URLs to views. For more information please see:
-    https://docs.djangoproject.com/en/2.2/topics/http/urls/
+    https://docs.djangoproject.com/en/3.2/topics/http/urls/
 Examples:
 Function views
     1. Add an import:  from my_app import views
@@ -19,9 +19,12 @@ from django.views.generic import RedirectView
 from django.conf import settings
 from django.conf.urls.static import static
 
+from catalogo.metricas import metricas
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('catalogo/', include('catalogo.urls')),
     path('', RedirectView.as_view(url='catalogo/')),
     path('accounts/', include('django.contrib.auth.urls')),
+    path('metrics', metricas, name='metricas'),
 ] + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
@@ -0,0 +1,11 @@
+"""URL Configuration usada por asgi.py
+
+Igual a librerialocal.urls, pero con las variantes asincronas de las vistas del catalogo.
+"""
+from django.urls import include, path
+
+from librerialocal.urls import urlpatterns as urlpatterns_wsgi
+
+urlpatterns = [path('catalogo/', include('catalogo.urls_asgi'))] + [
+    patron for patron in urlpatterns_wsgi if str(patron.pattern) != 'catalogo/'
+]